@@ -0,0 +1,94 @@
+"""
+Routes for request analytics
+Syncs the current portal's requests into the local mirror and serves
+workload/SLA aggregations computed from it (request_analytics)
+"""
+import time
+
+from flask import jsonify, request
+from flask_login import login_required
+from app import app, get_user_api_config
+from sdp_client import PortalCredential, credential_key
+from request_analytics import (sync_requests, load_columns, summary, open_counts, age_distribution,
+                               daily_trend, GROUP_FIELDS)
+from config import ANALYTICS_TREND_DAYS, ANALYTICS_MAX_TREND_DAYS
+
+
+def _portal():
+    """(credential, portal key) of the current user's API settings"""
+    api_base_url, api_key = get_user_api_config()
+    credential = PortalCredential(api_key, api_base_url)
+    return credential, credential_key(credential)
+
+
+def _group_field():
+    """Validated ?by= parameter (None when absent)"""
+    by = request.args.get('by')
+    if by and by not in GROUP_FIELDS:
+        raise ValueError(f"by must be one of: {', '.join(GROUP_FIELDS)}")
+    return by
+
+
+def _timed(started, **payload):
+    """Success response with the computation time"""
+    return jsonify({'success': True, 'elapsed_ms': round((time.perf_counter() - started) * 1000, 2), **payload})
+
+
+@app.route('/api/analytics/requests/sync', methods=['POST'])
+@login_required
+def sync_request_mirror():
+    """
+    Pull requests updated since the last sync into the local mirror
+
+    Body: {full?: bool} - full re-reads every request
+    """
+    credential, portal_key = _portal()
+    result = sync_requests(credential, portal_key, full=bool((request.json or {}).get('full')))
+    return jsonify(result), (200 if result['success'] else 502)
+
+
+@app.route('/api/analytics/requests/summary', methods=['GET'])
+@login_required
+def request_summary():
+    """Total, open, closed and overdue counts plus counts by status"""
+    started = time.perf_counter()
+    _, portal_key = _portal()
+    return _timed(started, summary=summary(load_columns(portal_key)))
+
+
+@app.route('/api/analytics/requests/open', methods=['GET'])
+@login_required
+def request_open_counts():
+    """Open and overdue counts by technician, site, status or priority (?by=, default technician)"""
+    started = time.perf_counter()
+    try:
+        by = _group_field() or 'technician'
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    _, portal_key = _portal()
+    return _timed(started, by=by, groups=open_counts(load_columns(portal_key), by))
+
+
+@app.route('/api/analytics/requests/age', methods=['GET'])
+@login_required
+def request_age_distribution():
+    """Age histogram of open requests, optionally split ?by= a field"""
+    started = time.perf_counter()
+    try:
+        by = _group_field()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    _, portal_key = _portal()
+    return _timed(started, **age_distribution(load_columns(portal_key), by=by))
+
+
+@app.route('/api/analytics/requests/trend', methods=['GET'])
+@login_required
+def request_trend():
+    """Created/closed counts per day for the last ?days= days"""
+    started = time.perf_counter()
+    days = min(max(request.args.get('days', ANALYTICS_TREND_DAYS, type=int), 1), ANALYTICS_MAX_TREND_DAYS)
+    _, portal_key = _portal()
+    return _timed(started, days=daily_trend(portal_key, days))
@@ -3,27 +3,65 @@ from flask import Flask, render_template, request, jsonify, redirect, url_for, f
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 import requests
 import json
+import asyncio
 from datetime import datetime
 import os
 from models import db, User, RequestHistory, SavedQuery, UserPreferences
 from forms import LoginForm, RegistrationForm, ProfileForm, ChangePasswordForm, SaveQueryForm
+from config import HISTORY_BIND, HISTORY_DATABASE_URI
+from storage import init_storage, migrate_history, migrate_history_blobs
+from history_blobs import store_body
+import json_codec
 
 app = Flask(__name__)
+app.json = json_codec.FastJSONProvider(app)
 
 # Configuration
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///sdp_explorer.db'
+app.config['SQLALCHEMY_BINDS'] = {HISTORY_BIND: HISTORY_DATABASE_URI}
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Initialize extensions
 db.init_app(app)
+init_storage(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 
+# Shared state backend, hashed static assets, response compression, upstream deadlines,
+# cassettes and the response spool
+from shared_state import init_shared_state
+from assets import init_assets
+from compression import init_compression
+from upstream_guard import init_upstream_guard
+from cassette import init_cassettes
+from response_spool import init_spool
+from query_scheduler import init_scheduler
+init_shared_state(app)
+init_assets(app)
+init_compression(app)
+init_upstream_guard(app)
+init_cassettes(app)
+init_spool(app)
+init_scheduler(app)
+
 # Import config for default values (fallback)
-from config import API_BASE_URL as DEFAULT_API_BASE_URL, API_KEY as DEFAULT_API_KEY, ENDPOINTS
+from config import API_BASE_URL as DEFAULT_API_BASE_URL, API_KEY as DEFAULT_API_KEY, ENDPOINTS, SDP_MAX_EXPORT_ROWS
+from config import BATCH_MAX_ITEMS, BATCH_ITEM_TIMEOUT, BATCH_METHODS
+from config import SPOOL_PAGE_SIZE, SPOOL_MAX_PAGE
+from sdp_client import (PortalCredential, run_async, client_session, fetch_all_pages,
+                        async_api_call_with_credential, gather_bounded, prepare_api_call, credential_key)
+from upstream_guard import (UpstreamUnavailable, guarded_request, remaining_budget, remember_result, stale_result,
+                            is_failure, breaker_states)
+from query_scheduler import snapshots_for_queries, query_channels
+from worklog_summary import invalidate_for_call
+from field_catalog import observe_response, get_catalog, catalog_fields
+from live_events import event_stream, sse_response
+from http_cache import conditional_json
+from response_spool import (spool_if_oversized, spool_response, spool_info, read_items, first_page, history_note,
+                            public_info)
 
 
 @login_manager.user_loader
@@ -43,6 +81,28 @@ def get_user_api_config():
     return api_base_url, api_key
 
 
+def new_log_entry(method, url, params=None, data=None):
+    """Prepare a request history entry for an upstream call"""
+    return {
+        "timestamp": datetime.utcnow(),
+        "method": method.upper(),
+        "url": url,
+        "params": json_codec.dumps(params) if params else None,
+        "data": json_codec.dumps(data) if data else None,
+    }
+
+
+def record_history(log_entry):
+    """Save a request history entry if user is authenticated"""
+    if current_user.is_authenticated:
+        entry = dict(log_entry)
+        # Identical bodies are stored once (history_blobs)
+        entry['response_hash'] = store_body(entry.pop('response', None))
+        history = RequestHistory(user_id=current_user.id, **entry)
+        db.session.add(history)
+        db.session.commit()
+
+
 def api_call(method, endpoint, params=None, data=None):
     """Make API call to ME SDP MSP"""
     api_base_url, api_key = get_user_api_config()
@@ -50,69 +110,69 @@ def api_call(method, endpoint, params=None, data=None):
     headers = {"authtoken": api_key}
 
     # Prepare log entry
-    log_entry = {
-        "timestamp": datetime.utcnow(),
-        "method": method.upper(),
-        "url": url,
-        "params": json.dumps(params) if params else None,
-        "data": json.dumps(data) if data else None,
-    }
+    log_entry = new_log_entry(method, url, params, data)
+    credential = PortalCredential(api_key, api_base_url)
+    stale_key = (credential_key(credential), endpoint, json_codec.dumps(params or {}, sort_keys=True))
 
     try:
         if method.upper() == "GET":
-            response = requests.get(url, headers=headers, params=params, verify=False)
+            response = guarded_request("GET", url, api_base_url, headers=headers, params=params, stream=True)
         elif method.upper() == "POST":
-            response = requests.post(url, headers=headers, data=data, verify=False)
+            response = guarded_request("POST", url, api_base_url, headers=headers, data=data, stream=True)
         elif method.upper() == "PUT":
-            response = requests.put(url, headers=headers, data=data, verify=False)
+            response = guarded_request("PUT", url, api_base_url, headers=headers, data=data, stream=True)
         elif method.upper() == "DELETE":
-            response = requests.delete(url, headers=headers, verify=False)
+            response = guarded_request("DELETE", url, api_base_url, headers=headers, stream=True)
+
+        # Bodies too large to hold go to disk and are paged through /api/spool/<handle>
+        spool_path = spool_if_oversized(response, budget=remaining_budget())
+        spooled = spool_response(spool_path, current_user.get_id(), endpoint) if spool_path else None
 
         # Log response
         log_entry["status_code"] = response.status_code
-        log_entry["response"] = response.text
-
-        # Save to database if user is authenticated
-        if current_user.is_authenticated:
-            history = RequestHistory(
-                user_id=current_user.id,
-                timestamp=log_entry["timestamp"],
-                method=log_entry["method"],
-                url=log_entry["url"],
-                params=log_entry["params"],
-                data=log_entry["data"],
-                status_code=log_entry["status_code"],
-                response=log_entry["response"]
-            )
-            db.session.add(history)
-            db.session.commit()
+        log_entry["response"] = history_note(spooled) if spooled else response.text
+        record_history(log_entry)
 
-        return {
-            "success": True,
-            "status_code": response.status_code,
-            "data": response.json() if response.text else {},
-            "raw": response.text
-        }
+        # Writes to a request make its cached worklog summary stale
+        invalidate_for_call(credential, method, endpoint)
+
+        if spooled:
+            result = {
+                "success": True,
+                "status_code": response.status_code,
+                "data": first_page(spooled)
+            }
+        else:
+            result = {
+                "success": True,
+                "status_code": response.status_code,
+                "data": json_codec.loads(response.content) if response.content else {},
+                "raw": response.text
+            }
+        if method.upper() == "GET":
+            if response.status_code < 400:
+                if not spooled:
+                    remember_result(stale_key, result)
+                observe_response(credential, endpoint, result['data'])
+            elif is_failure(response.status_code):
+                return stale_result(stale_key, f"HTTP {response.status_code}") or result
+        return result
     except Exception as e:
-        log_entry["error"] = str(e)
+        error = f"SDP call timed out: {e}" if isinstance(e, requests.Timeout) else str(e)
 
         # Save error to database
-        if current_user.is_authenticated:
-            history = RequestHistory(
-                user_id=current_user.id,
-                timestamp=log_entry["timestamp"],
-                method=log_entry["method"],
-                url=log_entry["url"],
-                params=log_entry["params"],
-                data=log_entry["data"],
-                error=str(e)
-            )
-            db.session.add(history)
-            db.session.commit()
+        log_entry["error"] = error
+        record_history(log_entry)
+
+        # A failing portal still answers reads it has answered before
+        stale = stale_result(stale_key, error) if method.upper() == "GET" else None
+        if stale:
+            return stale
 
         return {
             "success": False,
-            "error": str(e)
+            "error": error,
+            "unavailable": isinstance(e, UpstreamUnavailable)
         }
 
 
@@ -228,6 +288,13 @@ def test_connection():
     return jsonify(result)
 
 
+@app.route('/api/upstream/status', methods=['GET'])
+@login_required
+def upstream_status():
+    """Circuit breaker state of every SDP portal this process has called"""
+    return jsonify({'success': True, 'portals': breaker_states()})
+
+
 @app.route('/api/call', methods=['POST'])
 @login_required
 def make_api_call():
@@ -236,23 +303,169 @@ def make_api_call():
     method = data.get('method', 'GET')
     endpoint = data.get('endpoint', '')
     input_data = data.get('input_data', {})
-
-    # Replace placeholders in endpoint
     placeholders = data.get('placeholders', {})
-    for key, value in placeholders.items():
-        endpoint = endpoint.replace(f"{{{key}}}", str(value))
 
-    # Prepare request
-    if method.upper() == "GET":
-        params = {'input_data': json.dumps(input_data)} if input_data else None
-        result = api_call(method, endpoint, params=params)
-    else:
-        data_param = {'input_data': json.dumps(input_data)} if input_data else None
-        result = api_call(method, endpoint, data=data_param)
+    endpoint, params, data_param = prepare_api_call(method, endpoint, placeholders, input_data)
+    result = api_call(method, endpoint, params=params, data=data_param)
 
     return jsonify(result)
 
 
+@app.route('/api/fields', methods=['GET'])
+@login_required
+def field_catalog():
+    """
+    Fields seen so far in responses of an endpoint on the user's portal
+
+    Query: endpoint (IDs or {placeholders} allowed, e.g. /requests/{request_id}/notes)
+    """
+    endpoint = request.args.get('endpoint', '')
+    if not endpoint:
+        return jsonify({'success': False, 'error': 'Endpoint is required'}), 400
+
+    api_base_url, api_key = get_user_api_config()
+    catalog = get_catalog(PortalCredential(api_key, api_base_url), endpoint)
+    if not catalog:
+        return jsonify({'success': True, 'endpoint': endpoint, 'sampled': 0, 'fields': []})
+
+    return conditional_json(
+        (catalog.id, catalog.sampled),
+        lambda: {
+            'success': True,
+            'endpoint': catalog.endpoint,
+            'sampled': catalog.sampled,
+            'updated_at': catalog.updated_at.isoformat(),
+            'fields': catalog_fields(catalog)
+        }
+    )
+
+
+@app.route('/api/spool/<handle>', methods=['GET'])
+@login_required
+def spooled_page(handle):
+    """
+    A page of a response too large to send at once (see response_spool)
+
+    Query: start_index (1-based), row_count (up to SPOOL_MAX_PAGE)
+    """
+    info = spool_info(handle)
+    if not info or info['owner'] != current_user.get_id():
+        return jsonify({'success': False, 'error': 'Spooled response not found or expired'}), 404
+
+    start_index = request.args.get('start_index', 1, type=int)
+    row_count = min(request.args.get('row_count', SPOOL_PAGE_SIZE, type=int), SPOOL_MAX_PAGE)
+    return jsonify({
+        'success': True,
+        **public_info(info),
+        'start_index': start_index,
+        'row_count': row_count,
+        'items': read_items(info, start_index, row_count)
+    })
+
+
+async def _run_batch_reads(credential, reads):
+    """Run batch GET items concurrently, each bounded by its own timeout"""
+    async with client_session() as session:
+        async def run_one(read):
+            try:
+                return await asyncio.wait_for(
+                    async_api_call_with_credential(session, credential, 'GET', read['endpoint'],
+                                                   params=read['params']),
+                    read['timeout']
+                )
+            except asyncio.TimeoutError:
+                return {
+                    "success": False,
+                    "error": f"Timed out after {read['timeout']}s"
+                }
+
+        return await gather_bounded(run_one(read) for read in reads)
+
+
+@app.route('/api/batch', methods=['POST'])
+@login_required
+def batch_api_call():
+    """
+    Run several API calls in one request
+    Each item has the same shape as /api/call. GET items run concurrently,
+    other methods run one by one in order. Results come back in item order
+    and a failing item does not fail the batch.
+    """
+    data = request.json or {}
+    items = data.get('items', [])
+
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': 'No items provided'}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({
+            'success': False,
+            'error': f'Too many items (max {BATCH_MAX_ITEMS})'
+        }), 400
+
+    api_base_url, api_key = get_user_api_config()
+    credential = PortalCredential(api_key, api_base_url)
+
+    results = [None] * len(items)
+    reads = []
+    writes = []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('endpoint'):
+            results[index] = {'success': False, 'error': 'Endpoint is required'}
+            continue
+
+        method = item.get('method', 'GET')
+        if not isinstance(method, str) or method.upper() not in BATCH_METHODS:
+            results[index] = {'success': False, 'error': f"Method must be one of {', '.join(BATCH_METHODS)}"}
+            continue
+        method = method.upper()
+        timeout = item.get('timeout')
+        if timeout is None:
+            timeout = BATCH_ITEM_TIMEOUT
+        elif isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+            results[index] = {'success': False, 'error': 'Timeout must be a positive number of seconds'}
+            continue
+
+        endpoint, params, data_param = prepare_api_call(
+            method, item['endpoint'], item.get('placeholders', {}), item.get('input_data', {})
+        )
+        call = {
+            'index': index,
+            'method': method,
+            'endpoint': endpoint,
+            'params': params,
+            'data': data_param,
+            'timeout': min(timeout, BATCH_ITEM_TIMEOUT)
+        }
+        if method == 'GET':
+            reads.append(call)
+        else:
+            writes.append(call)
+
+    if reads:
+        responses = run_async(_run_batch_reads(credential, reads))
+        for read, response in zip(reads, responses):
+            log_entry = new_log_entry('GET', f"{api_base_url}{read['endpoint']}", read['params'])
+            if response['success']:
+                log_entry['status_code'] = response['status_code']
+                log_entry['response'] = response['raw']
+            else:
+                log_entry['error'] = response['error']
+            record_history(log_entry)
+            results[read['index']] = response
+
+    for write in writes:
+        results[write['index']] = api_call(write['method'], write['endpoint'],
+                                           params=write['params'], data=write['data'])
+
+    return jsonify({
+        'success': True,
+        'results': results,
+        'succeeded': sum(1 for r in results if r['success']),
+        'failed': sum(1 for r in results if not r['success'])
+    })
+
+
 @app.route('/api/quick/requests', methods=['GET'])
 @login_required
 def quick_requests():
@@ -287,59 +500,118 @@ def quick_technicians():
     return jsonify(result)
 
 
+@app.route('/api/export', methods=['POST'])
+@login_required
+def export_list():
+    """
+    Export every page of a list endpoint in one response
+    Pages after the first are fetched concurrently
+    """
+    data = request.json or {}
+    endpoint = data.get('endpoint', '')
+    input_data = data.get('input_data', {})
+    max_rows = min(data.get('max_rows') or SDP_MAX_EXPORT_ROWS, SDP_MAX_EXPORT_ROWS)
+
+    placeholders = data.get('placeholders', {})
+    for key, value in placeholders.items():
+        endpoint = endpoint.replace(f"{{{key}}}", str(value))
+
+    if not endpoint:
+        return jsonify({'success': False, 'error': 'Endpoint is required'}), 400
+
+    # Paging is controlled by the export, only keep filters/sorting
+    list_info = dict(input_data.get('list_info', {}))
+    list_info.pop('row_count', None)
+    list_info.pop('start_index', None)
+    list_info.pop('get_total_count', None)
+
+    api_base_url, api_key = get_user_api_config()
+    credential = PortalCredential(api_key, api_base_url)
+
+    async def fetch():
+        async with client_session() as session:
+            return await fetch_all_pages(session, credential, endpoint,
+                                         list_info=list_info, max_rows=max_rows)
+
+    result = run_async(fetch())
+    if not result['success']:
+        return jsonify(result), 502
+
+    return jsonify({
+        'success': True,
+        'endpoint': endpoint,
+        'list_key': result['list_key'],
+        'items': result['items'],
+        'exported': len(result['items']),
+        'total_count': result['total_count']
+    })
+
+
 @app.route('/api/history', methods=['GET'])
 @login_required
 def get_history():
-    """Get request history for current user"""
+    """Get request history for current user (conditional on the latest entry)"""
     limit = request.args.get('limit', 50, type=int)
-    history = RequestHistory.query.filter_by(user_id=current_user.id)\
-        .order_by(RequestHistory.timestamp.desc())\
-        .limit(limit)\
-        .all()
-
-    result = []
-    for h in history:
-        result.append({
-            'id': h.id,
-            'timestamp': h.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-            'method': h.method,
-            'url': h.url,
-            'params': h.params,
-            'data': h.data,
-            'status_code': h.status_code,
-            'response': h.response,
-            'error': h.error
-        })
-
-    return jsonify(result)
+    version = db.session.query(db.func.max(RequestHistory.id), db.func.count(RequestHistory.id))\
+        .filter(RequestHistory.user_id == current_user.id).one()
+
+    def build():
+        history = RequestHistory.query.filter_by(user_id=current_user.id)\
+            .options(db.joinedload(RequestHistory.blob))\
+            .order_by(RequestHistory.timestamp.desc())\
+            .limit(limit)\
+            .all()
+
+        result = []
+        for h in history:
+            result.append({
+                'id': h.id,
+                'timestamp': h.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                'method': h.method,
+                'url': h.url,
+                'params': h.params,
+                'data': h.data,
+                'status_code': h.status_code,
+                'response': h.response_body,
+                'error': h.error
+            })
+        return result
+
+    return conditional_json((limit, *version), build)
 
 
 # Saved Queries routes
 @app.route('/api/queries', methods=['GET'])
 @login_required
 def get_saved_queries():
-    """Get all saved queries for current user"""
-    queries = SavedQuery.query.filter_by(user_id=current_user.id)\
-        .order_by(SavedQuery.is_favorite.desc(), SavedQuery.updated_at.desc())\
-        .all()
-
-    result = []
-    for q in queries:
-        result.append({
-            'id': q.id,
-            'name': q.name,
-            'description': q.description,
-            'category': q.category,
-            'endpoint': q.endpoint,
-            'method': q.method,
-            'input_data': json.loads(q.input_data) if q.input_data else {},
-            'placeholders': json.loads(q.placeholders) if q.placeholders else {},
-            'is_favorite': q.is_favorite,
-            'created_at': q.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-            'updated_at': q.updated_at.strftime("%Y-%m-%d %H:%M:%S")
-        })
-
-    return jsonify(result)
+    """Get all saved queries for current user (conditional on the latest change)"""
+    version = db.session.query(db.func.count(SavedQuery.id), db.func.max(SavedQuery.id),
+                               db.func.max(SavedQuery.updated_at))\
+        .filter(SavedQuery.user_id == current_user.id).one()
+
+    def build():
+        queries = SavedQuery.query.filter_by(user_id=current_user.id)\
+            .order_by(SavedQuery.is_favorite.desc(), SavedQuery.updated_at.desc())\
+            .all()
+
+        result = []
+        for q in queries:
+            result.append({
+                'id': q.id,
+                'name': q.name,
+                'description': q.description,
+                'category': q.category,
+                'endpoint': q.endpoint,
+                'method': q.method,
+                'input_data': json_codec.loads(q.input_data) if q.input_data else {},
+                'placeholders': json_codec.loads(q.placeholders) if q.placeholders else {},
+                'is_favorite': q.is_favorite,
+                'created_at': q.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+                'updated_at': q.updated_at.strftime("%Y-%m-%d %H:%M:%S")
+            })
+        return result
+
+    return conditional_json(version, build)
 
 
 @app.route('/api/queries', methods=['POST'])
@@ -355,8 +627,8 @@ def save_query():
         category=data.get('category'),
         endpoint=data.get('endpoint'),
         method=data.get('method'),
-        input_data=json.dumps(data.get('input_data', {})),
-        placeholders=json.dumps(data.get('placeholders', {})),
+        input_data=json_codec.dumps(data.get('input_data', {})),
+        placeholders=json_codec.dumps(data.get('placeholders', {})),
         is_favorite=data.get('is_favorite', False)
     )
 
@@ -390,6 +662,71 @@ def toggle_favorite(query_id):
     return jsonify({'success': False, 'error': 'Query not found'}), 404
 
 
+def snapshot_summary(query_id, snapshot):
+    """Serialize a scheduler snapshot (without its body)"""
+    return {
+        'query_id': query_id,
+        'version': snapshot.version,
+        'status_code': snapshot.status_code,
+        'error': snapshot.error,
+        'fetched_at': snapshot.fetched_at.strftime("%Y-%m-%d %H:%M:%S") if snapshot.fetched_at else None
+    }
+
+
+@app.route('/api/queries/snapshots', methods=['GET'])
+@login_required
+def get_query_snapshots():
+    """
+    Versions of the scheduler snapshots for the current user's saved queries
+    Clients poll this and only fetch the snapshots whose version changed
+    """
+    prefs = current_user.preferences
+    queries = SavedQuery.query.filter_by(user_id=current_user.id, method='GET').all()
+    snapshots = snapshots_for_queries(current_user, queries)
+
+    return jsonify({
+        'success': True,
+        'auto_refresh': bool(prefs and prefs.auto_refresh),
+        'auto_refresh_interval': prefs.auto_refresh_interval if prefs else None,
+        'snapshots': [snapshot_summary(query_id, snapshot) for query_id, snapshot in snapshots.items()]
+    })
+
+
+@app.route('/api/queries/events', methods=['GET'])
+@login_required
+def query_events():
+    """
+    Server-Sent Events stream of snapshot changes for the current user's saved queries
+    Each 'snapshot' event carries the query IDs, the new version and, when
+    it is small, a JSON diff against base_version
+    """
+    queries = SavedQuery.query.filter_by(user_id=current_user.id, method='GET').all()
+    channels = query_channels(current_user, queries)
+
+    def for_user(channel, event):
+        return dict(event, query_ids=channels[channel])
+
+    return sse_response(event_stream(set(channels), request.headers.get('Last-Event-ID'), for_user))
+
+
+@app.route('/api/queries/<int:query_id>/snapshot', methods=['GET'])
+@login_required
+def get_query_snapshot(query_id):
+    """Latest scheduler result of a saved query (read instead of calling SDP)"""
+    query = SavedQuery.query.filter_by(id=query_id, user_id=current_user.id).first()
+    if not query:
+        return jsonify({'success': False, 'error': 'Query not found'}), 404
+
+    snapshot = snapshots_for_queries(current_user, [query]).get(query.id)
+    if not snapshot or not snapshot.fetched_at:
+        return jsonify({'success': False, 'error': 'No snapshot yet (enable auto-refresh to schedule this query)'}), 404
+
+    result = snapshot_summary(query.id, snapshot)
+    result['success'] = True
+    result['data'] = json_codec.loads(snapshot.response) if snapshot.response else {}
+    return jsonify(result)
+
+
 # User preferences routes
 @app.route('/api/preferences', methods=['GET'])
 @login_required
@@ -401,14 +738,16 @@ def get_preferences():
         db.session.add(prefs)
         db.session.commit()
 
-    return jsonify({
+    # One small row, so the values themselves are the version
+    result = {
         'theme': prefs.theme,
         'default_view_mode': prefs.default_view_mode,
         'rows_per_page': prefs.rows_per_page,
         'show_request_history': prefs.show_request_history,
         'auto_refresh': prefs.auto_refresh,
         'auto_refresh_interval': prefs.auto_refresh_interval
-    })
+    }
+    return conditional_json(sorted(result.items()), lambda: result)
 
 
 @app.route('/api/preferences', methods=['POST'])
@@ -441,11 +780,29 @@ def update_preferences():
 # Import site matrix routes
 import site_matrix_routes
 
+# Import report run routes
+import report_routes
+
+# Import request analytics routes
+import analytics_routes
+
+# Import bulk worklog summary routes
+import worklog_routes
+
+# Import cross-portal fan-out routes
+import fanout_routes
+
 
 def init_db():
     """Initialize database"""
     with app.app_context():
         db.create_all()
+        moved = migrate_history()
+        if moved:
+            print(f"Moved {moved} history entries to the history database")
+        moved = migrate_history_blobs()
+        if moved:
+            print(f"Moved {moved} history response bodies to the blob store")
         print("Database initialized successfully!")
 
 
@@ -454,9 +811,11 @@ if __name__ == '__main__':
     import urllib3
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-    # Initialize database if it doesn't exist
-    db_path = os.path.join(app.instance_path, 'sdp_explorer.db')
-    if not os.path.exists(db_path):
+    # Initialize databases if they don't exist (the history database was added later)
+    with app.app_context():
+        db_paths = [engine.url.database for engine in (db.engines[None], db.engines[HISTORY_BIND])
+                    if engine.dialect.name == 'sqlite']
+    if not all(os.path.exists(path) for path in db_paths):
         print("Database not found. Initializing...")
         os.makedirs(app.instance_path, exist_ok=True)
         init_db()
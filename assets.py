@@ -0,0 +1,211 @@
+"""
+Static asset pipeline
+Minifies the CSS/JS sources in static/ into content-hashed files under
+static/dist (plus .gz/.br variants) and records them in a manifest.
+Templates link assets through asset_url(), and /assets/ serves the built
+files with immutable cache headers.
+
+Build with: python assets.py
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from flask import abort, current_app, request, send_from_directory, url_for
+
+from config import ASSET_SOURCES
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s*([{};,>])\s*')
+JS_LINE_COMMENT = re.compile(r'^\s*//.*$')
+
+_manifest = None
+
+
+def minify_css(source):
+    """Drop comments and whitespace around CSS punctuation"""
+    source = CSS_COMMENT.sub('', source)
+    source = CSS_SPACE.sub(r'\1', source)
+    return re.sub(r'\s+', ' ', source).replace(';}', '}').strip()
+
+
+def _template_lines(lines):
+    """
+    (starts inside a template literal, ends inside one) for each line, or
+    None if the scan doesn't end back in plain code (something it can't
+    follow, such as a backtick in a regex literal)
+    """
+    stack = []  # '`' for an open template literal, a brace depth for each ${...} inside one
+    in_comment = False
+    spans = []
+    for line in lines:
+        starts = bool(stack) and stack[-1] == '`'
+        quote = None
+        i = 0
+        while i < len(line):
+            char = line[i]
+            if in_comment:
+                if line.startswith('*/', i):
+                    in_comment = False
+                    i += 1
+            elif stack and stack[-1] == '`':
+                if char == '\\':
+                    i += 1
+                elif char == '`':
+                    stack.pop()
+                elif line.startswith('${', i):
+                    stack.append(0)
+                    i += 1
+            elif quote:
+                if char == '\\':
+                    i += 1
+                elif char == quote:
+                    quote = None
+            elif line.startswith('//', i):
+                break
+            elif line.startswith('/*', i):
+                in_comment = True
+                i += 1
+            elif char in '\'"':
+                quote = char
+            elif char == '`':
+                stack.append('`')
+            elif char == '{' and stack:
+                stack[-1] += 1
+            elif char == '}' and stack:
+                if stack[-1]:
+                    stack[-1] -= 1
+                else:
+                    stack.pop()  # end of a ${...}
+            i += 1
+        spans.append((starts, bool(stack) and stack[-1] == '`'))
+    return None if stack or in_comment else spans
+
+
+def minify_js(source):
+    """
+    Conservative JS minification: drop indentation, blank lines and
+    whole-line // comments. Statements and literals are left alone, so no
+    semicolon insertion rules or regex literals can be broken; lines of
+    multi-line template literals keep their whitespace. A source the
+    template scan can't follow is only hashed and compressed.
+    """
+    lines = source.splitlines()
+    spans = _template_lines(lines)
+    if spans is None:
+        return source
+    kept = []
+    for line, (starts, ends) in zip(lines, spans):
+        if starts:
+            kept.append(line if ends else line.rstrip())
+            continue
+        stripped = line.lstrip() if ends else line.strip()
+        if stripped and not JS_LINE_COMMENT.match(stripped):
+            kept.append(stripped)
+    return '\n'.join(kept) + '\n'
+
+
+def build_assets():
+    """
+    Minify, hash and precompress every source in ASSET_SOURCES
+
+    Returns:
+        the manifest {source name: built file name}
+    """
+    os.makedirs(DIST_DIR, exist_ok=True)
+    manifest = {}
+    for name in ASSET_SOURCES:
+        with open(os.path.join(STATIC_DIR, name), encoding='utf-8') as f:
+            source = f.read()
+        minified = minify_css(source) if name.endswith('.css') else minify_js(source)
+        data = minified.encode('utf-8')
+
+        stem, ext = os.path.splitext(name)
+        built = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        path = os.path.join(DIST_DIR, built)
+        with open(path, 'wb') as f:
+            f.write(data)
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, 9))
+        if brotli:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+        manifest[name] = built
+
+    # Remove outputs of earlier builds
+    current = set(manifest.values())
+    for filename in os.listdir(DIST_DIR):
+        built = filename[:-3] if filename.endswith(('.gz', '.br')) else filename
+        if filename != 'manifest.json' and built not in current:
+            os.remove(os.path.join(DIST_DIR, filename))
+
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_manifest():
+    """Built asset names, or None if the build hasn't been run"""
+    global _manifest
+    if _manifest is None and os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH) as f:
+            _manifest = json.load(f)
+    return _manifest
+
+
+def asset_url(name):
+    """
+    URL of a static asset: the hashed build when there is one (outside
+    debug mode), otherwise the source file versioned by its modification time
+    """
+    manifest = load_manifest()
+    if manifest and name in manifest and not current_app.debug:
+        return url_for('built_asset', filename=manifest[name])
+    version = int(os.path.getmtime(os.path.join(STATIC_DIR, name)))
+    return url_for('static', filename=name, v=version)
+
+
+def serve_asset(filename):
+    """Send a built asset, precompressed when the client accepts it"""
+    if '/' in filename or filename.endswith(('.gz', '.br', '.json')):
+        abort(404)
+
+    accepted = request.accept_encodings
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[encoding] and os.path.exists(os.path.join(DIST_DIR, filename + suffix)):
+            response = send_from_directory(DIST_DIR, filename + suffix, mimetype=_mimetype(filename))
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(DIST_DIR, filename)
+
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def _mimetype(filename):
+    """Content type of a built asset"""
+    return 'text/css' if filename.endswith('.css') else 'application/javascript'
+
+
+def init_assets(app):
+    """Register asset_url() for templates and the /assets/ route"""
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.add_url_rule('/assets/<filename>', 'built_asset', serve_asset)
+
+
+if __name__ == '__main__':
+    for source, built in build_assets().items():
+        print(f"{source} -> dist/{built}")
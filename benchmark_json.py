@@ -0,0 +1,103 @@
+"""
+Benchmark for the JSON codec layer (json_codec)
+
+Builds a ~1 MB SDP /requests list payload and times parsing, history
+serialization and Flask responses with the standard library and with the
+configured fast codec.
+
+Usage: python benchmark_json.py [--size-mb 1] [--repeat 20]
+"""
+import argparse
+import json
+import time
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import json_codec
+
+
+def sdp_request(i):
+    """One /requests list entry shaped like an SDP v3 response"""
+    created = 1700000000000 + i * 3600000
+    return {
+        "id": str(100000 + i),
+        "display_id": str(i),
+        "subject": f"Printer on floor {i % 12} not responding - ticket {i} – follow-up",
+        "status": {"id": str(i % 6), "name": ["Open", "On Hold", "In Progress", "Resolved", "Closed", "Cancelled"][i % 6],
+                   "color": "#0066ff"},
+        "priority": {"id": str(i % 4), "name": ["Low", "Medium", "High", "Urgent"][i % 4], "color": "#ff0000"},
+        "technician": {"id": str(5000 + i % 50), "name": f"Technician {i % 50}",
+                       "email_id": f"tech{i % 50}@example.com"},
+        "requester": {"id": str(9000 + i % 300), "name": f"Requester {i % 300}", "email_id": f"user{i}@example.com",
+                      "is_vipuser": i % 17 == 0},
+        "site": {"id": str(700 + i % 20), "name": f"Site {i % 20}"},
+        "account": {"id": str(800 + i % 8), "name": f"Account {i % 8}"},
+        "group": {"id": str(i % 5), "name": f"Group {i % 5}"},
+        "created_time": {"value": str(created), "display_value": "Nov 14, 2023 10:13 PM"},
+        "due_by_time": {"value": str(created + 86400000), "display_value": "Nov 15, 2023 10:13 PM"},
+        "last_updated_time": {"value": str(created + 600000), "display_value": "Nov 14, 2023 10:23 PM"},
+        "is_overdue": i % 3 == 0,
+        "has_notes": i % 2 == 0,
+        "time_elapsed": {"value": str(i * 1000), "display_value": f"{i % 60} min"}
+    }
+
+
+def sdp_payload(size_mb):
+    """A list response of roughly `size_mb` megabytes"""
+    entry_size = len(json.dumps(sdp_request(0)))
+    count = int(size_mb * 1024 * 1024 / entry_size)
+    return {
+        "requests": [sdp_request(i) for i in range(count)],
+        "list_info": {"row_count": count, "start_index": 1, "has_more_rows": False},
+        "response_status": [{"status_code": 2000, "status": "success"}]
+    }
+
+
+def best_of(fn, repeat):
+    """Best wall time of `repeat` runs (ms)"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the JSON codec on SDP list payloads')
+    parser.add_argument('--size-mb', type=float, default=1.0)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    payload = sdp_payload(args.size_mb)
+    text = json.dumps(payload)
+    body = text.encode()
+
+    stdlib_app = Flask('stdlib')
+    stdlib_app.json = DefaultJSONProvider(stdlib_app)
+    fast_app = Flask('fast')
+    fast_app.json = json_codec.FastJSONProvider(fast_app)
+
+    def respond(app):
+        with app.app_context():
+            return app.json.response(payload).get_data()
+
+    cases = [
+        ('parse upstream response', lambda: json.loads(body), lambda: json_codec.loads(body)),
+        ('serialize history row', lambda: json.dumps(payload), lambda: json_codec.dumps(payload)),
+        ('Flask JSON response', lambda: respond(stdlib_app), lambda: respond(fast_app)),
+    ]
+
+    print(f"Payload: {len(payload['requests'])} requests, {len(body) / 1024 / 1024:.2f} MB")
+    print(f"Codec: {json_codec.BACKEND}, best of {args.repeat}\n")
+    print(f"{'operation':<26}{'stdlib ms':>12}{'codec ms':>12}{'speedup':>10}")
+    for name, baseline, fast in cases:
+        baseline_ms = best_of(baseline, args.repeat)
+        fast_ms = best_of(fast, args.repeat)
+        print(f"{name:<26}{baseline_ms:>12.2f}{fast_ms:>12.2f}{baseline_ms / fast_ms:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
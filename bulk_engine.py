@@ -0,0 +1,236 @@
+"""
+Bulk apply engine for site-matrix changes
+Every bulk change set is stored as a BulkPlan with one BulkPlanItem per
+technician. Items are checkpointed as each PUT completes, so an interrupted
+apply can be resumed, and finished items can be rolled back from the
+pre-change site lists recorded in the plan.
+"""
+import asyncio
+import json
+import uuid
+
+from models import db, BulkPlan, BulkPlanItem
+from sdp_client import run_async, client_session, async_api_call_with_credential
+from site_matrix_snapshot import find_technician, resolve_site_ids, apply_site_update
+from shared_state import backend
+from config import SDP_MAX_CONCURRENCY, BULK_PLAN_LEASE_TTL
+
+
+def put_failed(response):
+    """True if an SDP PUT response is an error (transport or HTTP status)"""
+    return not response['success'] or response.get('status_code', 200) >= 400
+
+
+def response_error(response):
+    """Best error message for a failed SDP response"""
+    if not response['success']:
+        return response.get('error', 'Unknown error')
+    status = response['data'].get('response_status', {}) if isinstance(response['data'], dict) else {}
+    if isinstance(status, list):
+        status = status[0] if status else {}
+    messages = status.get('messages') or []
+    if messages and isinstance(messages[0], dict) and messages[0].get('message'):
+        return messages[0]['message']
+    return f"HTTP {response.get('status_code')}"
+
+
+def create_plan(user_id, credential, snapshot, updates, description=None):
+    """
+    Persist a bulk change set as a plan
+
+    Args:
+        updates: [{technician_id, site_ids}] or [{technician_id, add_site_ids, remove_site_ids}]
+        snapshot: current matrix snapshot, used for deltas and as the
+                  pre-change state recorded for rollback
+
+    Items whose target equals the current sites, or whose technician is
+    unknown (with an error), are stored as 'skipped'. Returns the BulkPlan.
+    """
+    plan = BulkPlan(
+        user_id=user_id,
+        kind='apply',
+        api_base_url=credential.api_base_url,
+        description=description
+    )
+    db.session.add(plan)
+
+    for update in updates:
+        tech_id = str(update.get('technician_id'))
+        tech = find_technician(snapshot, tech_id)
+        before = [str(site_id) for site_id in tech['associated_site_ids']] if tech else None
+
+        item = BulkPlanItem(plan=plan, technician_id=tech_id)
+
+        if 'site_ids' in update:
+            after = [str(site_id) for site_id in update['site_ids']]
+        elif before is not None:
+            after = resolve_site_ids(before, update.get('add_site_ids'), update.get('remove_site_ids'))
+        else:
+            # Unknown technician: nothing safe to send, keep it out of applies
+            after = []
+            item.state = 'skipped'
+            item.error = f"Technician {tech_id} not found"
+
+        item.before_site_ids = json.dumps(before) if before is not None else None
+        item.after_site_ids = json.dumps(after)
+        if before is not None and set(before) == set(after):
+            item.state = 'skipped'
+
+        db.session.add(item)
+
+    db.session.commit()
+    return plan
+
+
+def create_rollback_plan(plan):
+    """
+    Build a plan that restores the pre-change sites of every applied item
+
+    Items without a recorded pre-change state cannot be rolled back and
+    are left out.
+    """
+    rollback = BulkPlan(
+        user_id=plan.user_id,
+        kind='rollback',
+        source_plan_id=plan.id,
+        api_base_url=plan.api_base_url,
+        description=f"Rollback of plan {plan.id}"
+    )
+    db.session.add(rollback)
+
+    for item in plan.items.filter_by(state='done'):
+        if item.before_site_ids is None:
+            continue
+        db.session.add(BulkPlanItem(
+            plan=rollback,
+            technician_id=item.technician_id,
+            before_site_ids=item.after_site_ids,
+            after_site_ids=item.before_site_ids
+        ))
+
+    db.session.commit()
+    return rollback
+
+
+async def _run_puts(credential, items, checkpoint):
+    """PUT items concurrently, calling checkpoint(item, response) as each finishes"""
+    semaphore = asyncio.Semaphore(SDP_MAX_CONCURRENCY)
+
+    async with client_session() as session:
+        async def put(item):
+            update_data = {
+                "technician": {
+                    "associated_sites": [{"id": site_id} for site_id in json.loads(item.after_site_ids)]
+                }
+            }
+            async with semaphore:
+                response = await async_api_call_with_credential(
+                    session, credential, 'PUT', f'/technicians/{item.technician_id}',
+                    data={'input_data': json.dumps(update_data)}
+                )
+            return item, response
+
+        for next_done in asyncio.as_completed([put(item) for item in items]):
+            item, response = await next_done
+            checkpoint(item, response)
+
+
+def apply_plan(plan, credential, retry_failed=False):
+    """
+    Apply (or resume) a plan
+
+    Only items still 'pending' are sent (plus 'failed' ones when
+    retry_failed is set), so re-running after a crash finishes the
+    remaining work. Each item's result is committed as soon as its PUT
+    returns. PUTs carry the full site list, so re-sending an item whose
+    earlier result was lost is safe.
+
+    Returns:
+        {'success': [...], 'failed': [...], 'total': n} for this run,
+        or None if the plan is already being applied
+    """
+    # Lease in the shared state: one worker applies a plan at a time
+    # (the token makes sure a run only ever releases its own lease)
+    lease = f"bulk:running:{plan.id}"
+    token = uuid.uuid4().hex
+    if not backend().add(lease, token, ttl=BULK_PLAN_LEASE_TTL):
+        return None
+
+    try:
+        states = ['pending', 'failed'] if retry_failed else ['pending']
+        items = plan.items.filter(BulkPlanItem.state.in_(states)).all()
+
+        results = {
+            'success': [],
+            'failed': [],
+            'total': len(items)
+        }
+
+        plan.status = 'running'
+        db.session.commit()
+
+        def checkpoint(item, response):
+            item.attempts = (item.attempts or 0) + 1
+            if put_failed(response):
+                item.state = 'failed'
+                item.error = response_error(response)
+                results['failed'].append({
+                    'technician_id': item.technician_id,
+                    'error': item.error
+                })
+            else:
+                site_ids = json.loads(item.after_site_ids)
+                item.state = 'done'
+                item.error = None
+                apply_site_update(credential, item.technician_id, site_ids)
+                results['success'].append({
+                    'technician_id': item.technician_id,
+                    'site_count': len(site_ids)
+                })
+            db.session.commit()
+
+        if items:
+            run_async(_run_puts(credential, items, checkpoint))
+
+        has_failures = plan.items.filter_by(state='failed').count() > 0
+        plan.status = 'failed' if has_failures else 'completed'
+        db.session.commit()
+        return results
+    finally:
+        backend().delete_if(lease, token)
+
+
+def plan_summary(plan, include_items=False):
+    """Serialize a plan (and optionally its items) for the API"""
+    counts = {state: 0 for state in ('pending', 'done', 'failed', 'skipped')}
+    for state, count in db.session.query(BulkPlanItem.state, db.func.count(BulkPlanItem.id))\
+            .filter(BulkPlanItem.plan_id == plan.id)\
+            .group_by(BulkPlanItem.state):
+        counts[state] = count
+
+    summary = {
+        'id': plan.id,
+        'kind': plan.kind,
+        'source_plan_id': plan.source_plan_id,
+        'description': plan.description,
+        'status': plan.status,
+        'counts': counts,
+        'total': sum(counts.values()),
+        'created_at': plan.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        'updated_at': plan.updated_at.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+    if include_items:
+        summary['items'] = [
+            {
+                'technician_id': item.technician_id,
+                'state': item.state,
+                'attempts': item.attempts,
+                'error': item.error,
+                'before_site_ids': json.loads(item.before_site_ids) if item.before_site_ids else None,
+                'after_site_ids': json.loads(item.after_site_ids)
+            }
+            for item in plan.items.order_by(BulkPlanItem.id)
+        ]
+
+    return summary
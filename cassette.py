@@ -0,0 +1,171 @@
+"""
+Record/playback transport for SDP calls
+With SDP_TRANSPORT = 'record', every upstream exchange made through
+guarded_request (api_call, api_call_with_credential) or
+async_api_call_with_credential is saved to a cassette: a SQLite file
+indexed by method, URL path and normalized input_data. With 'playback'
+those calls are answered from the cassette without touching the portal
+(no rate limit, breaker or network), so the app can be benchmarked and
+profiled offline with real payloads. A call with no recording fails with
+CassetteMiss.
+
+Matching ignores the portal host and the API key, so a cassette recorded
+against one portal plays back for any base URL with the same path prefix.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import requests
+
+import json_codec
+from config import SDP_TRANSPORT, CASSETTE_PATH, CASSETTE_CACHE_ENTRIES
+
+LIVE = 'live'
+RECORD = 'record'
+PLAYBACK = 'playback'
+
+
+class CassetteMiss(Exception):
+    """Playback found no recorded exchange for a call"""
+
+
+def normalized_input(params=None, data=None):
+    """Canonical text of a call's parameters (input_data parsed and re-serialized with sorted keys)"""
+    merged = {}
+    for source in (params, data):
+        for key, value in (source or {}).items():
+            if key == 'input_data' and isinstance(value, str):
+                try:
+                    value = json_codec.loads(value)
+                except ValueError:
+                    pass
+            merged[key] = value
+    return json_codec.dumps(merged, sort_keys=True) if merged else ''
+
+
+def exchange_key(method, url, params=None, data=None):
+    """(key, path, normalized input) matching a call to its recording"""
+    path = urlsplit(url).path.rstrip('/')
+    query = normalized_input(params, data)
+    key = hashlib.sha256(f"{method.upper()} {path}\n{query}".encode()).hexdigest()
+    return key, path, query
+
+
+class CassetteStore:
+    """Recorded exchanges in a SQLite file, with a small in-process cache for playback"""
+
+    def __init__(self, path, cache_entries=CASSETTE_CACHE_ENTRIES):
+        self.path = path
+        self.cache_entries = cache_entries
+        self._local = threading.local()
+        self._cache = OrderedDict()  # key -> (status, body)
+        self._lock = threading.Lock()
+        self._conn().execute(
+            'CREATE TABLE IF NOT EXISTS exchanges (key TEXT PRIMARY KEY, method TEXT, path TEXT, '
+            'input TEXT, status INTEGER, body BLOB, recorded_at REAL)'
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """(status, body) recorded under a key, or None"""
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        row = self._conn().execute('SELECT status, body FROM exchanges WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        entry = (row[0], bytes(row[1]))
+        with self._lock:
+            self._cache[key] = entry
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return entry
+
+    def put(self, key, method, path, query, status, body):
+        """Save (or replace) the exchange of a key"""
+        self._conn().execute('INSERT OR REPLACE INTO exchanges VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (key, method.upper(), path, query, status, body, time.time()))
+        with self._lock:
+            self._cache.pop(key, None)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def store():
+    """The cassette store (CASSETTE_PATH relative to the working directory until init_cassettes has run)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CassetteStore(CASSETTE_PATH)
+        return _store
+
+
+def playing():
+    return SDP_TRANSPORT == PLAYBACK
+
+
+def recording():
+    return SDP_TRANSPORT == RECORD
+
+
+def play(method, url, params=None, data=None):
+    """
+    Recorded (status, body) of a call
+
+    Raises:
+        CassetteMiss if nothing matching was recorded
+    """
+    key, path, query = exchange_key(method, url, params, data)
+    entry = store().get(key)
+    if entry is None:
+        raise CassetteMiss(f"No recorded exchange for {method.upper()} {path} {query}".rstrip())
+    return entry
+
+
+def play_response(method, url, params=None, data=None):
+    """Recorded exchange of a call as a requests.Response (what guarded_request returns)"""
+    status, body = play(method, url, params, data)
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response._content_consumed = True
+    response.encoding = 'utf-8'
+    response.url = url
+    return response
+
+
+def record(method, url, params, data, status, body):
+    """Save an exchange made live; a failure here never fails the call"""
+    key, path, query = exchange_key(method, url, params, data)
+    try:
+        store().put(key, method, path, query, status, body if isinstance(body, bytes) else body.encode())
+    except sqlite3.Error:
+        pass
+
+
+def init_cassettes(app):
+    """Open the cassette (relative CASSETTE_PATH under the instance folder) when recording or playing back"""
+    global _store
+    if SDP_TRANSPORT not in (LIVE, RECORD, PLAYBACK):
+        raise ValueError(f"Unsupported SDP_TRANSPORT: {SDP_TRANSPORT}")
+    if SDP_TRANSPORT == LIVE:
+        return
+    path = CASSETTE_PATH if os.path.isabs(CASSETTE_PATH) else os.path.join(app.instance_path, CASSETTE_PATH)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _store_lock:
+        _store = CassetteStore(path)
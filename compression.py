@@ -0,0 +1,66 @@
+"""
+Response compression
+Compresses JSON/HTML/text responses above COMPRESSION_MIN_SIZE with
+brotli (when installed and accepted) or gzip. Streamed responses (SSE,
+file downloads) and already encoded ones are left alone.
+"""
+import gzip
+
+from flask import request
+
+from config import (COMPRESSION_MIN_SIZE, COMPRESSION_MIMETYPES, COMPRESSION_GZIP_LEVEL,
+                    COMPRESSION_BROTLI_QUALITY)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def choose_encoding(accept_encodings):
+    """Best supported encoding the client accepts, or None"""
+    if brotli and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    """Compress a body with the given encoding"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, COMPRESSION_GZIP_LEVEL)
+
+
+def compress_response(response):
+    """after_request hook: compress eligible responses in place"""
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSION_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+
+    # The encoded body is a different representation: keep the validator
+    # but make it weak (If-None-Match compares weakly)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    """Register the compression hook"""
+    app.after_request(compress_response)
@@ -43,4 +43,134 @@ ENDPOINTS = {
         "contacts": "/accounts/{account_id}/contacts",
         "sites": "/accounts/{account_id}/sites",
     }
-}
\ No newline at end of file
+}
+
+# Upstream fan-out tuning (used by sdp_client)
+SDP_PAGE_SIZE = 100  # SDP caps list row_count at 100
+SDP_MAX_CONCURRENCY = 8  # Max in-flight upstream calls per fan-out
+SDP_MAX_EXPORT_ROWS = 10000
+
+# /api/batch limits
+BATCH_MAX_ITEMS = 50
+BATCH_ITEM_TIMEOUT = 30  # seconds per item
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+
+# Site matrix snapshot cache lifetime (seconds)
+SITE_MATRIX_SNAPSHOT_TTL = 300
+SITE_MATRIX_MAX_PAGE = 500  # Max rows/columns per matrix slice
+SITE_MATRIX_DETAIL_TTL = 900  # Per-technician GET /technicians/{id} cache
+
+# Server-side saved query scheduler (auto-refresh)
+QUERY_SCHEDULER_ENABLED = True
+QUERY_SCHEDULER_TICK = 5  # seconds between checks for due queries
+QUERY_SCHEDULER_MIN_INTERVAL = 15  # floor for auto_refresh_interval (seconds)
+QUERY_SCHEDULER_LEASE_TTL = 120  # seconds before another worker takes over from a leader that stopped
+QUERY_SCHEDULER_BATCH = 50  # due queries fetched between checks that this worker still leads
+
+# Live updates over Server-Sent Events
+LIVE_EVENTS_BUFFER = 1000  # events kept for Last-Event-ID resume
+LIVE_EVENTS_TTL = 600  # seconds each event stays in the shared log
+LIVE_EVENTS_POLL = 0.5  # seconds between checks of the shared log for other workers' events
+LIVE_EVENTS_GAP_WAIT = 2  # seconds to wait for an event being published before treating it as lost
+LIVE_EVENTS_KEEPALIVE = 15  # seconds between keep-alive comments
+LIVE_EVENTS_RETRY_MS = 3000  # client reconnect delay
+LIVE_EVENTS_MAX_DIFF_RATIO = 0.5  # push a diff only when smaller than this share of the body
+
+# Report execution ingest (one local table per run)
+REPORT_RUNS_DB = 'report_runs.db'  # SQLite file in the instance folder
+REPORT_PAGE_SIZE = 100
+REPORT_MAX_ROWS = 100000
+REPORT_QUERY_MAX_PAGE = 500
+
+# Request analytics over the local /requests mirror
+REQUEST_CLOSED_STATUSES = ('Closed', 'Resolved', 'Cancelled', 'Canceled')
+ANALYTICS_AGE_BINS = (1, 3, 7, 14, 30)  # open-ticket age bucket edges (days)
+ANALYTICS_TREND_DAYS = 30
+ANALYTICS_MAX_TREND_DAYS = 366
+
+# Bulk worklog summaries (/requests/{id}/worklogs/summary fan-out)
+WORKLOG_SUMMARY_TTL = 3600  # per-request cache, also dropped when the request changes
+WORKLOG_SUMMARY_MAX_REQUESTS = 5000
+
+# JSON codec for upstream parsing, history and Flask responses (json_codec)
+JSON_CODEC = 'auto'  # 'auto' (orjson if installed), 'orjson' or 'json'
+
+# Static asset pipeline (assets.py) and response compression
+ASSET_SOURCES = ('layout.css', 'site_matrix.css', 'explorer.js', 'site_matrix.js')  # under static/
+COMPRESSION_MIN_SIZE = 1024  # bytes; smaller responses are sent as is
+COMPRESSION_MIMETYPES = ('application/json', 'text/html', 'text/css', 'application/javascript', 'text/plain')
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Upstream deadlines and circuit breaker (upstream_guard)
+UPSTREAM_CONNECT_TIMEOUT = 5  # seconds
+UPSTREAM_CALL_TIMEOUT = 30  # cap for a single SDP call
+ROUTE_DEADLINE_DEFAULT = 45  # seconds a request may spend on SDP calls
+ROUTE_DEADLINES = {  # by view function name, for routes that fan out or page a lot
+    'batch_api_call': 60,
+    'export_list': 180,
+    'get_site_matrix_data': 120,
+    'bulk_update_technician_sites': 300,
+    'apply_site_rule': 300,
+    'resume_bulk_plan': 300,
+    'rollback_bulk_plan': 300,
+    'create_report_run': 600,
+    'sync_request_mirror': 600,
+    'bulk_worklog_summary': 300,
+    'fanout_query': 120,
+}
+CIRCUIT_FAILURE_THRESHOLD = 5  # consecutive failures that open a portal's circuit
+CIRCUIT_RESET_TIMEOUT = 30  # seconds before a trial call is let through
+STALE_CACHE_TTL = 86400  # seconds last good GET results are kept for fallback
+STALE_CACHE_MAX_BYTES = 1048576  # larger responses aren't kept
+UPSTREAM_RATE_LIMIT = 0  # max SDP calls per portal per UPSTREAM_RATE_WINDOW, across workers (0: no limit)
+UPSTREAM_RATE_WINDOW = 60  # seconds
+
+# Cross-portal fan-out queries (portal_fanout)
+FANOUT_MAX_PORTALS = 20
+FANOUT_MAX_ROWS_PER_PORTAL = 1000  # deepest merged row a query can page to
+FANOUT_PORTAL_TIMEOUT = 60  # seconds per portal; slower portals are reported as errors
+
+# Server-side field catalog learned from api_call responses (field_catalog)
+FIELD_CATALOG_SAMPLE_ITEMS = 50  # list items sampled per response
+FIELD_CATALOG_MAX_DEPTH = 4  # nesting levels recorded (status.name is depth 2)
+FIELD_CATALOG_MAX_FIELDS = 1000  # per endpoint and portal
+FIELD_CATALOG_EXAMPLES = 3  # distinct example values kept per field
+
+# Shared state for caches, rate limits and job leases across workers (shared_state)
+SHARED_STATE_URL = 'memory://'  # or sqlite:///shared_state.db, redis://host:6379/0
+SHARED_STATE_PREFIX = 'sdp-explorer:'  # Redis key prefix
+SHARED_STATE_MEMORY_BUDGETS = {  # memory:// only: LRU caps on cached values per key prefix (leases and counters are never evicted)
+    'stale:': {'entries': 500, 'bytes': 134217728},
+    'worklogs:': {'entries': 20000},
+    'matrix:details:': {'entries': 20000},
+}
+SINGLEFLIGHT_LOCK_TTL = 300  # seconds a leader may hold a computation
+SINGLEFLIGHT_WAIT = 120  # seconds followers wait for the leader's result
+SINGLEFLIGHT_RESULT_TTL = 30
+BULK_PLAN_LEASE_TTL = 3600  # seconds a worker may hold a running bulk plan
+SHARED_LOCK_TTL = 30  # seconds a worker may hold a shared lock (snapshot read-modify-write)
+SHARED_LOCK_WAIT = 10  # seconds to wait for one
+
+# Database binds: history/audit tables get their own SQLite file (storage)
+HISTORY_BIND = 'history'  # __bind_key__ for RequestHistory and future job/audit tables
+HISTORY_DATABASE_URI = 'sqlite:///sdp_history.db'  # relative paths are in the instance folder
+SQLITE_PRAGMAS = {  # per bind, None is the main database (users, credentials, saved queries)
+    None: {'journal_mode': 'WAL', 'busy_timeout': 5000},
+    HISTORY_BIND: {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 10000},
+}
+HISTORY_MIGRATION_BATCH = 1000  # rows per batch when moving old history out of the main database
+
+# Record/playback transport for SDP calls (cassette)
+SDP_TRANSPORT = 'live'  # 'live', 'record' (live calls saved to the cassette) or 'playback' (cassette only)
+CASSETTE_PATH = 'sdp_cassette.db'  # relative paths are in the instance folder
+CASSETTE_CACHE_ENTRIES = 2000  # recorded responses kept in memory during playback
+
+# Oversized api_call responses spooled to disk and paged through a handle (response_spool)
+SPOOL_THRESHOLD_BYTES = 8388608  # larger bodies are not held in memory
+SPOOL_MAX_BYTES = 2147483648  # larger bodies are refused
+SPOOL_DIR = 'spool'  # relative paths are in the instance folder
+SPOOL_TTL = 3600  # seconds a spooled response can be paged
+SPOOL_PAGE_SIZE = 100  # items sent with the call's response
+SPOOL_MAX_PAGE = 500
+SPOOL_CHUNK_BYTES = 1048576  # download and scan window
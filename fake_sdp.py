@@ -0,0 +1,172 @@
+"""
+Fake ME SDP portal for probes and local development
+Answers every config.ENDPOINTS path under /api/v3 with SDP v3 shaped
+bodies: list endpoints page through `--rows` synthetic objects by
+list_info, single objects come back for IDs, writes echo an object.
+Latency, jitter and an error rate can be set to rehearse slow or flaky
+portals without touching a real one.
+
+Usage: python fake_sdp.py [--port 8765] [--latency-ms 0] [--jitter-ms 0] [--error-rate 0] [--rows 250]
+"""
+import argparse
+import asyncio
+import random
+import re
+import threading
+
+from aiohttp import web
+
+import json_codec
+from benchmark_json import sdp_request
+from config import ENDPOINTS, SDP_PAGE_SIZE
+
+BASE_PATH = '/api/v3'
+SUCCESS = [{"status_code": 2000, "status": "success"}]
+
+
+def endpoint_patterns():
+    """(regex, template) for every ENDPOINTS path, most specific first"""
+    templates = {path for actions in ENDPOINTS.values() for path in actions.values()}
+    patterns = []
+    for template in sorted(templates, key=lambda t: (-t.count('/'), t)):
+        regex = re.sub(r'\{[^}]+\}', r'([^/]+)', template)
+        patterns.append((re.compile(f"^{regex}$"), template))
+    return patterns
+
+
+def singular(name):
+    """SDP object key for a collection name (requests -> request)"""
+    return name[:-1] if name.endswith('s') else name
+
+
+def fake_object(kind, i):
+    """One synthetic object of a collection"""
+    if kind == 'request':
+        return sdp_request(i)
+    return {
+        "id": str(100000 + i),
+        "name": f"{kind.replace('_', ' ').title()} {i}",
+        "description": f"Fake {kind} {i} served by fake_sdp",
+        "created_time": {"value": str(1700000000000 + i * 60000), "display_value": "Nov 14, 2023 10:13 PM"},
+        "site": {"id": str(700 + i % 20), "name": f"Site {i % 20}"},
+    }
+
+
+class FakePortal:
+    """aiohttp handlers and knobs of one fake portal"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, rows=250):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rows = rows
+        self.patterns = endpoint_patterns()
+
+    def app(self):
+        app = web.Application()
+        app.router.add_route('*', BASE_PATH + '/{path:.*}', self.handle)
+        return app
+
+    def respond(self, body, status=200):
+        return web.Response(body=json_codec.dumps(body), status=status, content_type='application/json')
+
+    def list_body(self, name, input_data):
+        """A page of a collection by list_info (start_index is 1-based)"""
+        list_info = input_data.get('list_info') or {}
+        start = max(int(list_info.get('start_index') or 1), 1)
+        count = min(max(int(list_info.get('row_count') or 10), 1), SDP_PAGE_SIZE)
+        end = min(start - 1 + count, self.rows)
+        kind = singular(name)
+        info = {"row_count": max(end - start + 1, 0), "start_index": start, "has_more_rows": end < self.rows}
+        if list_info.get('get_total_count'):
+            info["total_count"] = self.rows
+        return {name: [fake_object(kind, i) for i in range(start - 1, end)],
+                "list_info": info, "response_status": SUCCESS}
+
+    async def handle(self, request):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        if 'authtoken' not in request.headers:
+            return self.respond({"response_status": [{"status_code": 4000, "status": "failed",
+                                                      "messages": [{"message": "Missing authtoken"}]}]}, 401)
+        if self.error_rate and random.random() < self.error_rate:
+            return self.respond({"response_status": [{"status_code": 4000, "status": "failed",
+                                                      "messages": [{"message": "Injected failure"}]}]}, 500)
+
+        path = '/' + request.match_info['path'].strip('/')
+        template = next((t for regex, t in self.patterns if regex.match(path)), None)
+        if template is None:
+            return self.respond({"response_status": [{"status_code": 4000, "status": "failed",
+                                                      "messages": [{"message": f"Unknown URL {path}"}]}]}, 404)
+
+        if request.method == 'DELETE':
+            return self.respond({"response_status": SUCCESS})
+
+        last = template.rstrip('/').split('/')[-1]
+        if request.method == 'GET' and not last.startswith('{') and last.endswith('s'):
+            raw = request.query.get('input_data')
+            return self.respond(self.list_body(last, json_codec.loads(raw) if raw else {}))
+
+        # Single object: a view by ID, a write, or an action such as /summary
+        segments = [s for s in template.split('/') if s and not s.startswith('{')]
+        kind = singular(segments[-1]) if last.startswith('{') or request.method != 'GET' else last
+        ident = re.findall(r'\d+', path)
+        i = int(ident[-1]) % self.rows if ident else 0
+        return self.respond({kind: fake_object(kind, i), "response_status": SUCCESS})
+
+
+def start_in_thread(host='127.0.0.1', port=0, **options):
+    """
+    Serve a FakePortal from a background thread (its own event loop, so it
+    doesn't share one with the client being measured)
+
+    Returns:
+        (base_url, stop) - stop() shuts the server down
+    """
+    started = threading.Event()
+    state = {}
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(FakePortal(**options).app(), access_log=None)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, host, port)
+        loop.run_until_complete(site.start())
+        state['port'] = runner.addresses[0][1]
+        state['loop'] = loop
+        started.set()
+        loop.run_forever()
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
+
+    thread = threading.Thread(target=serve, name='fake-sdp', daemon=True)
+    thread.start()
+    started.wait()
+
+    def stop():
+        state['loop'].call_soon_threadsafe(state['loop'].stop)
+        thread.join()
+
+    return f"http://{host}:{state['port']}{BASE_PATH}", stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a fake ME SDP portal')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of calls answered with HTTP 500')
+    parser.add_argument('--rows', type=int, default=250, help='objects in every list endpoint')
+    args = parser.parse_args()
+
+    portal = FakePortal(args.latency_ms, args.jitter_ms, args.error_rate, args.rows)
+    print(f"Fake SDP portal at http://{args.host}:{args.port}{BASE_PATH} (any authtoken)")
+    web.run_app(portal.app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
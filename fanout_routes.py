@@ -0,0 +1,77 @@
+"""
+Routes for cross-portal fan-out queries
+Runs one GET across all of the current user's active portals and returns
+the merged, source-tagged result (portal_fanout)
+"""
+import json
+
+from flask import jsonify, request
+from flask_login import login_required, current_user
+from app import app, get_user_api_config, new_log_entry, record_history
+from sdp_client import prepare_api_call
+from portal_fanout import user_portals, fan_out
+from config import FANOUT_MAX_PORTALS
+
+
+def _portals(credential_ids=None):
+    """The current user's fan-out portals"""
+    api_base_url, api_key = get_user_api_config()
+    return user_portals(current_user, api_base_url, api_key, credential_ids)
+
+
+@app.route('/api/fanout/portals', methods=['GET'])
+@login_required
+def fanout_portals():
+    """Portals a fan-out query would run against"""
+    return jsonify({'success': True, 'portals': [source for source, _ in _portals()]})
+
+
+@app.route('/api/fanout', methods=['POST'])
+@login_required
+def fanout_query():
+    """
+    Run a GET against every active portal and merge the results
+
+    Body: same shape as /api/call (method must be GET), plus optional
+          credential_ids to limit the portals. list_info's sort_field,
+          sort_order, start_index and row_count apply to the merged set.
+    """
+    data = request.json or {}
+    if data.get('method', 'GET').upper() != 'GET':
+        return jsonify({'success': False, 'error': 'Fan-out queries are read-only (GET)'}), 400
+
+    input_data = data.get('input_data') or {}
+    if not isinstance(input_data, dict):
+        return jsonify({'success': False, 'error': 'input_data must be an object'}), 400
+    endpoint, params, _ = prepare_api_call('GET', data.get('endpoint', ''), data.get('placeholders', {}), input_data)
+    if not endpoint:
+        return jsonify({'success': False, 'error': 'Endpoint is required'}), 400
+
+    credential_ids = data.get('credential_ids')
+    if credential_ids is not None and (not isinstance(credential_ids, list)
+                                       or not all(isinstance(i, int) for i in credential_ids)):
+        return jsonify({'success': False, 'error': 'credential_ids must be a list of IDs'}), 400
+
+    portals = _portals(credential_ids)
+    if not portals:
+        return jsonify({'success': False, 'error': 'No active API credentials'}), 400
+    if len(portals) > FANOUT_MAX_PORTALS:
+        return jsonify({'success': False, 'error': f'Too many portals (max {FANOUT_MAX_PORTALS})'}), 400
+
+    try:
+        result = fan_out(portals, endpoint, input_data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    # One history entry per portal, with a summary instead of every page
+    for status in result['portals']:
+        log_entry = new_log_entry('GET', f"{status['api_base_url']}{endpoint}", params)
+        if status['success']:
+            log_entry['status_code'] = 200
+            log_entry['response'] = json.dumps({key: status[key] for key in ('total_count', 'fetched')
+                                                if key in status})
+        else:
+            log_entry['error'] = status['error']
+        record_history(log_entry)
+
+    return jsonify(result), (200 if result['success'] else 502)
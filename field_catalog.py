@@ -0,0 +1,151 @@
+"""
+Server-side field catalog
+Learns the fields of each endpoint's objects, per portal, from the
+responses that pass through api_call: their paths, JSON types, how often
+they are null or missing and a few example values. Objects are sampled
+from every page seen, so the filter builder knows fields that a single
+response (or its first item) would not show.
+"""
+import json
+import re
+from datetime import datetime
+
+from flask import current_app
+
+from models import db, FieldCatalog, CatalogField
+from sdp_client import credential_key, extract_list_key
+from config import (FIELD_CATALOG_SAMPLE_ITEMS, FIELD_CATALOG_MAX_DEPTH, FIELD_CATALOG_MAX_FIELDS,
+                    FIELD_CATALOG_EXAMPLES)
+
+ID_SEGMENT = re.compile(r'^(\d+|\{[^}]+\})$')
+EXAMPLE_MAX_CHARS = 80
+
+
+def normalize_endpoint(endpoint):
+    """Endpoint with IDs and {placeholders} replaced by {id}"""
+    path = endpoint.split('?')[0].rstrip('/')
+    return '/'.join('{id}' if ID_SEGMENT.match(segment) else segment for segment in path.split('/'))
+
+
+def json_type(value):
+    """JSON type name of a parsed value"""
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, (int, float)):
+        return 'number'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, list):
+        return 'array'
+    if isinstance(value, dict):
+        return 'object'
+    return 'null'
+
+
+def flatten(obj, prefix='', depth=1, out=None):
+    """{path: value} for every field of an object, nested objects down to FIELD_CATALOG_MAX_DEPTH"""
+    out = {} if out is None else out
+    for key, value in obj.items():
+        path = f"{prefix}.{key}" if prefix else key
+        out[path] = value
+        if isinstance(value, dict) and depth < FIELD_CATALOG_MAX_DEPTH:
+            flatten(value, path, depth + 1, out)
+    return out
+
+
+def sample_objects(data):
+    """Objects of a response to learn from: list items spread across the page, or the single object"""
+    list_key = extract_list_key(data)
+    if list_key:
+        items = [item for item in data[list_key] if isinstance(item, dict)]
+        if len(items) > FIELD_CATALOG_SAMPLE_ITEMS:
+            step = len(items) / FIELD_CATALOG_SAMPLE_ITEMS
+            items = [items[int(i * step)] for i in range(FIELD_CATALOG_SAMPLE_ITEMS)]
+        return items
+    for key, value in data.items():
+        if key != 'response_status' and isinstance(value, dict):
+            return [value]
+    return []
+
+
+def field_stats(objects):
+    """{path: [types, present, nulls, examples]} over sampled objects"""
+    stats = {}
+    for obj in objects:
+        for path, value in flatten(obj).items():
+            entry = stats.setdefault(path, [set(), 0, 0, []])
+            if value is None:
+                entry[2] += 1
+                continue
+            entry[0].add(json_type(value))
+            entry[1] += 1
+            if not isinstance(value, (dict, list)) and len(entry[3]) < FIELD_CATALOG_EXAMPLES:
+                example = value[:EXAMPLE_MAX_CHARS] if isinstance(value, str) else value
+                if example not in entry[3]:
+                    entry[3].append(example)
+    return stats
+
+
+def observe_response(credential, endpoint, data):
+    """
+    Fold a successful GET response into the catalog of its endpoint
+
+    Called from api_call for every read; a failure here is logged and never
+    fails the call itself.
+    """
+    objects = sample_objects(data) if isinstance(data, dict) else []
+    if not objects:
+        return
+
+    try:
+        portal_key = credential_key(credential)
+        endpoint = normalize_endpoint(endpoint)
+        catalog = FieldCatalog.query.filter_by(portal_key=portal_key, endpoint=endpoint).first()
+        if not catalog:
+            catalog = FieldCatalog(portal_key=portal_key, endpoint=endpoint, sampled=0)
+            db.session.add(catalog)
+
+        fields = {field.path: field for field in catalog.fields}
+        for path, (types, present, nulls, examples) in field_stats(objects).items():
+            field = fields.get(path)
+            if field is None:
+                if len(fields) >= FIELD_CATALOG_MAX_FIELDS:
+                    continue
+                field = CatalogField(path=path, types='', present=0, nulls=0)
+                catalog.fields.append(field)
+                fields[path] = field
+
+            field.types = ','.join(sorted(set(filter(None, field.types.split(','))) | types))
+            field.present += present
+            field.nulls += nulls
+            known = json.loads(field.examples) if field.examples else []
+            for example in examples:
+                if len(known) < FIELD_CATALOG_EXAMPLES and example not in known:
+                    known.append(example)
+            field.examples = json.dumps(known)
+
+        catalog.sampled += len(objects)
+        catalog.updated_at = datetime.utcnow()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Field catalog update failed for %s', endpoint)
+
+
+def get_catalog(credential, endpoint):
+    """The catalog of an endpoint on a credential's portal, or None if nothing was seen yet"""
+    return FieldCatalog.query.filter_by(portal_key=credential_key(credential),
+                                        endpoint=normalize_endpoint(endpoint)).first()
+
+
+def catalog_fields(catalog):
+    """Serializable fields of a catalog, by path"""
+    fields = []
+    for field in sorted(catalog.fields, key=lambda f: f.path):
+        fields.append({
+            'path': field.path,
+            'types': field.types.split(',') if field.types else [],
+            'null_rate': round(1 - field.present / catalog.sampled, 3) if catalog.sampled else None,
+            'examples': json.loads(field.examples) if field.examples else []
+        })
+    return fields
@@ -0,0 +1,113 @@
+"""
+Content-addressed store for request history response bodies
+The explorer repeats the same calls all the time, so most history bodies
+are identical (the same technician or site list, page after page). Each
+distinct body is stored once in history_blobs under its SHA-256;
+RequestHistory rows keep only the hash. Nothing counts references on
+write: collect_garbage() drops the blobs no history row points to, so it
+stays correct however history is pruned.
+
+Usage: python history_blobs.py [--gc] [--vacuum]
+"""
+import argparse
+import hashlib
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, HistoryBlob, RequestHistory
+from config import HISTORY_BIND
+
+INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def body_hash(body):
+    """SHA-256 (hex) a body is stored under"""
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def add_bodies(bodies):
+    """Store bodies (hash -> body) in the current session, skipping ones already stored"""
+    insert = INSERTS.get(db.engines[HISTORY_BIND].dialect.name)
+    now = datetime.utcnow()
+    for digest, body in bodies.items():
+        if insert is None:
+            if db.session.get(HistoryBlob, digest) is None:
+                db.session.add(HistoryBlob(hash=digest, body=body, size=len(body.encode()), created_at=now))
+            continue
+        db.session.execute(insert(HistoryBlob).values(hash=digest, body=body, size=len(body.encode()),
+                                                      created_at=now).on_conflict_do_nothing(index_elements=['hash']))
+
+
+def store_body(body):
+    """Hash of a response body after making sure its blob is stored (None for no body)"""
+    if not body:
+        return None
+    digest = body_hash(body)
+    add_bodies({digest: body})
+    return digest
+
+
+def collect_garbage():
+    """
+    Delete blobs no history row points to
+
+    Returns:
+        (blobs deleted, bytes freed)
+    """
+    orphaned = ('FROM history_blobs WHERE NOT EXISTS (SELECT 1 FROM request_history '
+                'WHERE request_history.response_hash = history_blobs.hash)')
+    engine = db.engines[HISTORY_BIND]
+    with engine.begin() as conn:
+        deleted, freed = conn.execute(text(f'SELECT COUNT(*), COALESCE(SUM(size), 0) {orphaned}')).one()
+        conn.execute(text(f'DELETE {orphaned}'))
+    return deleted, freed
+
+
+def blob_stats():
+    """Stored vs logical size of history bodies"""
+    blobs, stored = db.session.query(
+        db.func.count(HistoryBlob.hash),
+        db.func.coalesce(db.func.sum(HistoryBlob.size), 0)
+    ).one()
+    logical = db.session.query(db.func.coalesce(db.func.sum(HistoryBlob.size), 0))\
+        .join(RequestHistory, RequestHistory.response_hash == HistoryBlob.hash).scalar()
+    inline = db.session.query(db.func.count(RequestHistory.id))\
+        .filter(RequestHistory.response.isnot(None)).scalar()
+    return {'blobs': blobs, 'stored_bytes': stored, 'logical_bytes': logical, 'inline_rows': inline}
+
+
+def vacuum():
+    """Give freed pages back to the filesystem (SQLite only)"""
+    engine = db.engines[HISTORY_BIND]
+    if engine.dialect.name == 'sqlite':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('VACUUM'))
+            # In WAL mode the file only shrinks once the log is checkpointed
+            conn.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='History body store statistics and garbage collection')
+    parser.add_argument('--gc', action='store_true', help='delete blobs no history entry points to')
+    parser.add_argument('--vacuum', action='store_true', help='shrink the history database file afterwards')
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        if args.gc:
+            deleted, freed = collect_garbage()
+            print(f"Deleted {deleted} orphaned blobs ({freed / 1048576:.1f} MB)")
+        if args.vacuum:
+            vacuum()
+        stats = blob_stats()
+        ratio = stats['logical_bytes'] / stats['stored_bytes'] if stats['stored_bytes'] else 1
+        print(f"{stats['blobs']} blobs, {stats['stored_bytes'] / 1048576:.1f} MB stored for "
+              f"{stats['logical_bytes'] / 1048576:.1f} MB of history bodies ({ratio:.1f}x)")
+        if stats['inline_rows']:
+            print(f"{stats['inline_rows']} rows still hold their body inline; run init_db.py to move them")
+
+
+if __name__ == '__main__':
+    main()
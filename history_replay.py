@@ -0,0 +1,307 @@
+"""
+Replay recorded SDP traffic
+Re-issues a slice of RequestHistory (by user, time range, endpoint and
+method) against a target portal - a staging portal or the fake portal -
+keeping the recorded gaps between calls, or scaled by --speed. Reports
+latency per endpoint and how replayed responses differ from the recorded
+ones (status codes and changed JSON paths), so production traffic shapes
+can be used for performance regression runs.
+
+Usage:
+    python history_replay.py --fake --speed 10
+    python history_replay.py --target https://staging.example.com/api/v3 --api-key KEY \\
+        --user alice --since 2025-12-01T08:00 --until 2025-12-01T12:00 --endpoint '/requests*'
+    python history_replay.py --target ... --speed 0 --max-in-flight 16 --json
+
+--speed 0 sends calls as fast as --max-in-flight allows. Writes (POST,
+PUT, DELETE) are only replayed with --allow-writes.
+"""
+import argparse
+import asyncio
+import fnmatch
+import json
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import json_codec
+from field_catalog import normalize_endpoint
+from sdp_probe import PERCENTILES, classify, percentile
+from config import API_BASE_URL, API_KEY, UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_CALL_TIMEOUT
+
+DIFF_MAX_PATHS = 5  # changed paths kept per call
+DEFAULT_IGNORE = ('response_status',)
+
+
+def portal_bases():
+    """Every portal base URL the app knows, longest first"""
+    from models import User, APICredential
+    bases = {API_BASE_URL}
+    bases.update(url for (url,) in User.query.with_entities(User.api_base_url) if url)
+    bases.update(url for (url,) in APICredential.query.with_entities(APICredential.api_base_url) if url)
+    return sorted((base.rstrip('/') for base in bases), key=len, reverse=True)
+
+
+def split_url(url, bases):
+    """Endpoint of a recorded URL (what follows its portal's base URL)"""
+    for base in bases:
+        if url.startswith(base + '/'):
+            return url[len(base):]
+    path = urlsplit(url).path
+    marker = path.find('/api/v3/')
+    return path[marker + len('/api/v3'):] if marker >= 0 else path
+
+
+def load_history(user=None, since=None, until=None, endpoints=(), methods=('GET',), limit=None):
+    """
+    Recorded calls of a slice, oldest first
+
+    Returns:
+        list of dicts (offset in seconds from the first call, method,
+        endpoint, params, data, status_code, response)
+    """
+    from models import db, User, RequestHistory
+
+    query = RequestHistory.query.filter(RequestHistory.method.in_(methods))
+    if user:
+        account = User.query.filter_by(username=user).first() if not str(user).isdigit() \
+            else User.query.get(int(user))
+        if not account:
+            raise SystemExit(f"Unknown user {user}")
+        query = query.filter(RequestHistory.user_id == account.id)
+    if since:
+        query = query.filter(RequestHistory.timestamp >= since)
+    if until:
+        query = query.filter(RequestHistory.timestamp < until)
+    query = query.options(db.joinedload(RequestHistory.blob)).order_by(RequestHistory.timestamp, RequestHistory.id)
+
+    bases = portal_bases()
+    calls = []
+    first = None
+    for row in query.yield_per(500):
+        endpoint = split_url(row.url, bases)
+        if endpoints and not any(fnmatch.fnmatch(endpoint, pattern) for pattern in endpoints):
+            continue
+        first = first or row.timestamp
+        calls.append({
+            'offset': (row.timestamp - first).total_seconds(),
+            'method': row.method,
+            'endpoint': endpoint,
+            'params': json_codec.loads(row.params) if row.params else None,
+            'data': json_codec.loads(row.data) if row.data else None,
+            'status_code': row.status_code,
+            'response': row.response_body,
+        })
+        if limit and len(calls) >= limit:
+            break
+    return calls
+
+
+def diff_paths(old, new, ignore, path='', out=None):
+    """JSON paths where two parsed bodies differ (list items as [i], at most DIFF_MAX_PATHS)"""
+    out = [] if out is None else out
+    if len(out) >= DIFF_MAX_PATHS:
+        return out
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in sorted(set(old) | set(new), key=str):
+            if key in ignore:
+                continue
+            child = f"{path}.{key}" if path else str(key)
+            if key not in old:
+                out.append(f"+{child}")
+            elif key not in new:
+                out.append(f"-{child}")
+            else:
+                diff_paths(old[key], new[key], ignore, child, out)
+            if len(out) >= DIFF_MAX_PATHS:
+                break
+    elif isinstance(old, list) and isinstance(new, list):
+        if len(old) != len(new):
+            out.append(f"{path or '$'} length {len(old)} -> {len(new)}")
+        for index, (a, b) in enumerate(zip(old, new)):
+            diff_paths(a, b, ignore, f"{path}[{index}]", out)
+            if len(out) >= DIFF_MAX_PATHS:
+                break
+    elif old != new:
+        out.append(path or '$')
+    return out
+
+
+def compare(call, status, body, ignore):
+    """(status changed, changed paths) of a replayed response against the recorded one"""
+    status_changed = call['status_code'] is not None and status != call['status_code']
+    if not call['response'] or body is None:
+        return status_changed, []
+    try:
+        old, new = json_codec.loads(call['response']), json_codec.loads(body)
+    except ValueError:
+        return status_changed, [] if call['response'].encode() == body else ['$']
+    return status_changed, diff_paths(old, new, ignore)
+
+
+async def replay_call(session, semaphore, target, api_key, call, started, speed, ignore):
+    """Wait for the call's (scaled) time slot, send it and compare the response"""
+    if speed:
+        delay = started + call['offset'] / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    async with semaphore:
+        sent = time.perf_counter()
+        lag = sent - started - (call['offset'] / speed if speed else 0)
+        status, body, error = None, None, None
+        try:
+            async with session.request(call['method'], f"{target}{call['endpoint']}",
+                                       headers={'authtoken': api_key}, params=call['params'],
+                                       data=call['data']) as response:
+                body = await response.read()
+                status = response.status
+            error = classify(status, body)
+        except asyncio.TimeoutError:
+            error = 'timeout'
+        except aiohttp.ClientError as e:
+            error = type(e).__name__
+        seconds = time.perf_counter() - sent
+
+    status_changed, changed = compare(call, status, body, ignore) if status is not None else (False, [])
+    return {
+        'method': call['method'],
+        'endpoint': call['endpoint'],
+        'latency_ms': seconds * 1000,
+        'lag_ms': max(lag, 0) * 1000 if speed else None,
+        'status': status,
+        'recorded_status': call['status_code'],
+        'error': error,
+        'status_changed': status_changed,
+        'changed_paths': changed,
+    }
+
+
+async def replay(calls, target, api_key, speed, max_in_flight, timeout, ignore):
+    """Replay calls on their schedule; results in recorded order"""
+    semaphore = asyncio.Semaphore(max_in_flight)
+    connector = aiohttp.TCPConnector(limit=max_in_flight, ssl=False)
+    client_timeout = aiohttp.ClientTimeout(total=timeout, connect=min(UPSTREAM_CONNECT_TIMEOUT, timeout))
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(replay_call(session, semaphore, target, api_key, call, started, speed,
+                                                     ignore) for call in calls))
+        wall = time.perf_counter() - started
+    return results, wall
+
+
+def summarize(results):
+    """Report rows by method and normalized endpoint"""
+    groups = defaultdict(list)
+    for result in results:
+        groups[(result['method'], normalize_endpoint(result['endpoint']))].append(result)
+
+    rows = []
+    for (method, endpoint), group in sorted(groups.items(), key=lambda item: -len(item[1])):
+        latencies = sorted(r['latency_ms'] for r in group if r['error'] is None)
+        lags = sorted(r['lag_ms'] for r in group if r['lag_ms'] is not None)
+        rows.append({
+            'method': method,
+            'endpoint': endpoint,
+            'calls': len(group),
+            'ok': len(latencies),
+            'errors': dict(Counter(r['error'] for r in group if r['error']).most_common()),
+            'latency_ms': {f"p{p}": percentile(latencies, p) for p in PERCENTILES},
+            'lag_p95_ms': percentile(lags, 95),
+            'status_changed': sum(r['status_changed'] for r in group),
+            'body_changed': sum(bool(r['changed_paths']) for r in group),
+            'changed_paths': Counter(path for r in group for path in r['changed_paths']).most_common(DIFF_MAX_PATHS),
+        })
+    return rows
+
+
+def format_ms(value):
+    return f"{value:.1f}" if value is not None else '-'
+
+
+def print_report(rows, calls, wall, speed):
+    """Plain-text report with errors and the most common changed paths under the table"""
+    span = calls[-1]['offset'] if calls else 0
+    pace = f"{speed:g}x" if speed else 'max rate'
+    print(f"Replayed {len(calls)} calls recorded over {span:.1f}s in {wall:.1f}s ({pace})\n")
+    columns = f"{'endpoint':<40}{'calls':>7}{'ok':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}" \
+              f"{'lag p95':>9}{'status±':>9}{'body±':>7}"
+    print(columns)
+    print('-' * len(columns))
+    for row in rows:
+        latency = row['latency_ms']
+        name = f"{row['method']} {row['endpoint']}"
+        print(f"{name[:39]:<40}{row['calls']:>7}{row['ok']:>7}{format_ms(latency['p50']):>9}"
+              f"{format_ms(latency['p95']):>9}{format_ms(latency['p99']):>9}{format_ms(row['lag_p95_ms']):>9}"
+              f"{row['status_changed']:>9}{row['body_changed']:>7}")
+
+    for row in rows:
+        if row['errors'] or row['changed_paths']:
+            print(f"\n{row['method']} {row['endpoint']}")
+            for error, count in row['errors'].items():
+                print(f"  error {error}: {count}")
+            for path, count in row['changed_paths']:
+                print(f"  changed {path}: {count}")
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded SDP traffic against a portal')
+    parser.add_argument('--user', help='username or user ID (default: everyone)')
+    parser.add_argument('--since', type=parse_time, help='ISO time, UTC like the history table')
+    parser.add_argument('--until', type=parse_time)
+    parser.add_argument('--endpoint', action='append', default=[], help="glob on the endpoint, e.g. '/requests*'")
+    parser.add_argument('--method', action='append', default=[], help='methods to replay (default GET)')
+    parser.add_argument('--limit', type=int, help='replay at most this many calls')
+    parser.add_argument('--speed', type=float, default=1.0, help='time multiplier; 0 replays back to back')
+    parser.add_argument('--max-in-flight', type=int, default=32)
+    parser.add_argument('--timeout', type=float, default=UPSTREAM_CALL_TIMEOUT, help='seconds per call')
+    parser.add_argument('--ignore', action='append', default=list(DEFAULT_IGNORE),
+                        help='field name left out of response diffs (repeatable)')
+    parser.add_argument('--target', default=API_BASE_URL, help='portal base URL')
+    parser.add_argument('--api-key', default=API_KEY)
+    parser.add_argument('--fake', action='store_true', help='replay against a fake portal started in this process')
+    parser.add_argument('--allow-writes', action='store_true', help='allow POST/PUT/DELETE calls')
+    parser.add_argument('--json', action='store_true', help='print the report (and every call) as JSON')
+    args = parser.parse_args()
+
+    methods = tuple(method.upper() for method in args.method) or ('GET',)
+    if any(method != 'GET' for method in methods) and not args.allow_writes:
+        raise SystemExit('Replaying writes changes the target portal; pass --allow-writes')
+
+    from app import app
+    with app.app_context():
+        calls = load_history(args.user, args.since, args.until, args.endpoint, methods, args.limit)
+    if not calls:
+        raise SystemExit('No recorded calls match')
+
+    target, api_key, stop = args.target.rstrip('/'), args.api_key, None
+    if args.fake:
+        from fake_sdp import start_in_thread
+        target, stop = start_in_thread()
+        api_key = 'fake'
+
+    try:
+        results, wall = asyncio.run(replay(calls, target, api_key, args.speed, args.max_in_flight, args.timeout,
+                                           set(args.ignore)))
+    finally:
+        if stop:
+            stop()
+
+    rows = summarize(results)
+    if args.json:
+        json.dump({'target': target, 'speed': args.speed, 'wall_s': wall, 'endpoints': rows, 'calls': results},
+                  sys.stdout, indent=2, default=str)
+        print()
+    else:
+        print_report(rows, calls, wall, args.speed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+Conditional GET support for app JSON endpoints
+Routes describe what they would return with a cheap version (max IDs,
+updated_at, snapshot versions). The ETag is a hash of that version, so a
+matching If-None-Match is answered with a 304 before the payload is built.
+"""
+import hashlib
+import json
+
+from flask import request, jsonify, make_response
+from flask_login import current_user
+
+
+def make_etag(*parts):
+    """Strong ETag value for a version tuple"""
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def conditional_json(version, build):
+    """
+    JSON response validated by `version`
+
+    `build()` is only called when the client's cached copy (If-None-Match)
+    doesn't match. Responses must be revalidated on every use
+    (no-cache) and are private to the user.
+    """
+    etag = make_etag(current_user.get_id(), request.path, *version)
+
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(build())
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
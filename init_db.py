@@ -1,5 +1,6 @@
 """Initialize the database with tables"""
 from app import app, db, User, UserPreferences
+from storage import migrate_history, migrate_history_blobs
 import sys
 
 def init_database():
@@ -9,6 +10,14 @@ def init_database():
         db.create_all()
         print("✓ Database tables created successfully!")
 
+        # History used to live in the main database
+        moved = migrate_history()
+        if moved:
+            print(f"✓ Moved {moved} history entries to the history database")
+        moved = migrate_history_blobs()
+        if moved:
+            print(f"✓ Moved {moved} history response bodies to the blob store")
+
         # Check if any users exist
         user_count = User.query.count()
         print(f"✓ Current user count: {user_count}")
@@ -0,0 +1,93 @@
+"""
+JSON codec used on the request path
+Uses orjson when it is installed (and JSON_CODEC allows it), the standard
+library otherwise. Covers upstream response parsing, history/query
+serialization and Flask's own JSON responses (FastJSONProvider).
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+from config import JSON_CODEC
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if JSON_CODEC not in ('auto', 'orjson', 'json'):
+    raise ValueError(f"Unknown JSON_CODEC: {JSON_CODEC}")
+if JSON_CODEC == 'orjson' and orjson is None:
+    raise ImportError("JSON_CODEC is 'orjson' but orjson is not installed")
+
+_orjson = orjson if JSON_CODEC != 'json' else None
+BACKEND = 'orjson' if _orjson else 'json'
+
+
+def loads(data):
+    """Parse JSON from str or UTF-8 bytes"""
+    if _orjson:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(obj, sort_keys=False):
+    """Serialize to compact UTF-8 JSON bytes"""
+    if _orjson:
+        try:
+            return _orjson.dumps(obj, option=_orjson.OPT_SORT_KEYS if sort_keys else 0)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits, leave those to the stdlib
+    return json.dumps(obj, sort_keys=sort_keys, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def dumps(obj, sort_keys=False):
+    """Serialize to a compact JSON string"""
+    return dumps_bytes(obj, sort_keys).decode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson
+
+    Keeps DefaultJSONProvider's output semantics (sorted keys, RFC 822 dates
+    through `default`, indentation in debug mode) and falls back to it for
+    anything orjson refuses or when orjson isn't available.
+    """
+
+    def _options(self, sort_keys, indent):
+        options = _orjson.OPT_PASSTHROUGH_DATETIME | _orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            options |= _orjson.OPT_SORT_KEYS
+        if indent:
+            options |= _orjson.OPT_INDENT_2
+        return options
+
+    def _dumps_bytes(self, obj, indent=False):
+        """orjson bytes, or None if orjson can't handle the value"""
+        if not _orjson:
+            return None
+        try:
+            return _orjson.dumps(obj, default=self.default, option=self._options(self.sort_keys, indent))
+        except TypeError:
+            return None
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.keys() <= {'indent', 'separators'} and kwargs.get('indent') in (None, 2):
+            data = self._dumps_bytes(obj, indent=bool(kwargs.get('indent')))
+            if data is not None:
+                return data.decode()
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if _orjson and not kwargs:
+            return _orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        data = self._dumps_bytes(obj, indent=indent)
+        if data is None:
+            return super().response(obj)
+        return self._app.response_class(data + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,247 @@
+"""
+Live change notifications over Server-Sent Events
+Publishers append events to a log in the shared state backend
+(events:seq counts them, events:<n> holds each one for LIVE_EVENTS_TTL),
+so an event published by any worker reaches the streams of every worker.
+Each process pulls new events into a local buffer with one poller thread;
+each SSE connection streams the events of the channels it watches from
+that buffer and resumes from Last-Event-ID after a reconnect
+"""
+import threading
+import time
+from collections import deque
+
+from flask import Response
+
+import json_codec
+from shared_state import backend
+from config import (LIVE_EVENTS_BUFFER, LIVE_EVENTS_KEEPALIVE, LIVE_EVENTS_RETRY_MS, LIVE_EVENTS_TTL,
+                    LIVE_EVENTS_POLL, LIVE_EVENTS_GAP_WAIT)
+
+# Event IDs are "<epoch>-<n>": the epoch changes whenever the shared
+# counter starts over, so IDs from an earlier log are recognized
+_epoch = None
+_last = 0  # newest shared event number pulled into _events
+_gap = None  # (newest event number, when events up to it were first found missing)
+_events = deque(maxlen=LIVE_EVENTS_BUFFER)  # (n, channel, event type, data); channel None marks a lost event
+_condition = threading.Condition()
+_wake = threading.Event()
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def _shared_epoch(store):
+    """Start of the current shared event sequence"""
+    store.add('events:epoch', f"{time.time():.6f}")
+    return store.get('events:epoch')
+
+
+def publish(channel, event_type, data):
+    """Append an event to the shared log and wake this process's streams"""
+    store = backend()
+    n = store.incr('events:seq')
+    if n == 1:
+        # The counter (re)started: earlier IDs may come back, so start a new epoch
+        store.set('events:epoch', f"{time.time():.6f}")
+    store.set(f"events:{n}", (channel, event_type, data), ttl=LIVE_EVENTS_TTL)
+    _start_poller()
+    _wake.set()
+    return f"{_shared_epoch(store)}-{n}"
+
+
+def _pull():
+    """Move events published since the last pull (by any worker) into the local buffer"""
+    global _epoch, _last, _gap
+    store = backend()
+    seq = store.get('events:seq') or 0
+    with _condition:
+        if _epoch is None or seq < _last:
+            # First pull (backfill what Last-Event-ID could resume), or the shared log started over
+            _epoch = _shared_epoch(store)
+            _events.clear()
+            _last = max(seq - LIVE_EVENTS_BUFFER, 0)
+            _condition.notify_all()
+        first = max(_last + 1, seq - LIVE_EVENTS_BUFFER + 1)
+    if seq < first:
+        return
+
+    numbers = list(range(first, seq + 1))
+    values = store.get_many([f"events:{n}" for n in numbers])
+    latest_present = max((n for n, value in zip(numbers, values) if value is not None), default=0)
+    pulled = []
+    for n, value in zip(numbers, values):
+        if value is None:
+            # Published but not written yet, unless later events are there or it's been a while
+            if n < latest_present or (_gap and n <= _gap[0] and time.monotonic() - _gap[1] > LIVE_EVENTS_GAP_WAIT):
+                value = (None, 'reset', {})
+            else:
+                if not _gap or n > _gap[0]:
+                    _gap = (seq, time.monotonic())
+                break
+        pulled.append((n, *value))
+    else:
+        _gap = None
+
+    if pulled:
+        with _condition:
+            _events.extend(pulled)
+            _last = pulled[-1][0]
+            _condition.notify_all()
+
+
+def _poll_loop():
+    """Poller thread body"""
+    while True:
+        _wake.wait(LIVE_EVENTS_POLL)
+        _wake.clear()
+        try:
+            _pull()
+        except Exception:
+            time.sleep(LIVE_EVENTS_POLL)  # backend unavailable: streams keep sending keep-alives
+
+
+def _start_poller():
+    """Pull the shared log once and start this process's poller (first use only)"""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _pull()
+            _poller = threading.Thread(target=_poll_loop, name='live-events', daemon=True)
+            _poller.start()
+
+
+def _parse_event_id(last_event_id):
+    """
+    Cursor for a Last-Event-ID header
+
+    Returns:
+        (n, resumable) - resumable is False when the ID belongs to another
+        epoch or the events after it have already been dropped
+    """
+    if not last_event_id:
+        with _condition:
+            return _last, True
+
+    epoch, _, n = last_event_id.partition('-')
+    if epoch != _epoch or not n.isdigit():
+        with _condition:
+            return _last, False
+
+    n = int(n)
+    with _condition:
+        oldest = _events[0][0] if _events else _last + 1
+    return n, oldest <= n + 1
+
+
+def format_event(event_id, event_type, data):
+    """Serialize one SSE frame"""
+    lines = [f"event: {event_type}", f"data: {json_codec.dumps(data)}"]
+    if event_id:
+        lines.insert(0, f"id: {event_id}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def event_stream(channels, last_event_id=None, transform=None):
+    """
+    Generate SSE frames for `channels`
+
+    Starts after `last_event_id` when it can be resumed, otherwise sends a
+    'reset' event so the client reloads its state. `transform(channel, data)`
+    can adapt an event for the subscriber (return None to drop it).
+    """
+    _start_poller()
+    epoch = _epoch
+    cursor, resumable = _parse_event_id(last_event_id)
+    yield f"retry: {LIVE_EVENTS_RETRY_MS}\n\n"
+    if not resumable:
+        yield format_event(f"{epoch}-{cursor}", 'reset', {})
+
+    while True:
+        with _condition:
+            if _epoch != epoch:
+                # The shared log started over: numbers no longer line up
+                epoch, cursor = _epoch, _last
+                pending = None
+            else:
+                pending = [event for event in _events if event[0] > cursor]
+                if not pending:
+                    _condition.wait(LIVE_EVENTS_KEEPALIVE)
+                    pending = [event for event in _events if event[0] > cursor]
+                    if _epoch != epoch:
+                        continue
+
+        if pending is None:
+            yield format_event(f"{epoch}-{cursor}", 'reset', {})
+            continue
+
+        if not pending:
+            yield ': keep-alive\n\n'
+            continue
+
+        if pending[0][0] > cursor + 1:
+            # Fell behind the buffer while sending
+            yield format_event(f"{epoch}-{pending[-1][0]}", 'reset', {})
+            cursor = pending[-1][0]
+            continue
+
+        for n, channel, event_type, data in pending:
+            cursor = n
+            if channel is None:
+                # An event that never made it to the shared log: it may have been for us
+                yield format_event(f"{epoch}-{n}", 'reset', {})
+                continue
+            if channel not in channels:
+                continue
+            payload = transform(channel, data) if transform else data
+            if payload is not None:
+                yield format_event(f"{epoch}-{n}", event_type, payload)
+
+
+def sse_response(stream):
+    """Wrap an event stream in a streaming, unbuffered HTTP response"""
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def _pointer(path, key):
+    """Append a key to a JSON Pointer"""
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def json_diff(old, new, path=''):
+    """
+    JSON Patch style operations turning `old` into `new`
+
+    Objects are compared key by key and lists index by index (extra items
+    are added or removed at the end); anything else is replaced.
+    """
+    if type(old) is not type(new):
+        return [{'op': 'replace', 'path': path, 'value': new}]
+
+    if isinstance(old, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': _pointer(path, key)})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({'op': 'add', 'path': _pointer(path, key), 'value': value})
+            else:
+                ops.extend(json_diff(old[key], value, _pointer(path, key)))
+        return ops
+
+    if isinstance(old, list):
+        ops = []
+        for index in range(min(len(old), len(new))):
+            ops.extend(json_diff(old[index], new[index], _pointer(path, index)))
+        for index in range(len(old), len(new)):
+            ops.append({'op': 'add', 'path': _pointer(path, index), 'value': new[index]})
+        for index in range(len(old) - 1, len(new) - 1, -1):
+            ops.append({'op': 'remove', 'path': _pointer(path, index)})
+        return ops
+
+    if old != new:
+        return [{'op': 'replace', 'path': path, 'value': new}]
+    return []
@@ -3,6 +3,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from config import HISTORY_BIND
 
 db = SQLAlchemy()
 
@@ -21,9 +22,11 @@ class User(UserMixin, db.Model):
     is_active = db.Column(db.Boolean, default=True)
 
     # Relationships
-    request_history = db.relationship('RequestHistory', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    request_history = db.relationship('RequestHistory', primaryjoin='User.id == foreign(RequestHistory.user_id)',
+                                      backref='user', lazy='dynamic', cascade='all, delete-orphan')
     saved_queries = db.relationship('SavedQuery', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     preferences = db.relationship('UserPreferences', backref='user', uselist=False, cascade='all, delete-orphan')
+    api_credentials = db.relationship('APICredential', backref='user', lazy='dynamic', cascade='all, delete-orphan')
 
     def set_password(self, password):
         """Hash and set password"""
@@ -37,25 +40,67 @@ class User(UserMixin, db.Model):
         return f'<User {self.username}>'
 
 
+class APICredential(db.Model):
+    """Additional API credentials per user (admin/technician/requester keys)"""
+    __tablename__ = 'api_credentials'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=True)
+    role_type = db.Column(db.String(20), nullable=False, default='technician')  # admin, technician, requester
+    api_base_url = db.Column(db.String(255), nullable=False)
+    api_key = db.Column(db.String(255), nullable=False)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<APICredential {self.role_type} user_id={self.user_id}>'
+
+
 class RequestHistory(db.Model):
-    """API request history"""
+    """API request history (in the history database, so no foreign key to users)"""
     __tablename__ = 'request_history'
+    __bind_key__ = HISTORY_BIND
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     method = db.Column(db.String(10), nullable=False)
     url = db.Column(db.String(500), nullable=False)
     params = db.Column(db.Text, nullable=True)  # JSON string
     data = db.Column(db.Text, nullable=True)  # JSON string
     status_code = db.Column(db.Integer, nullable=True)
-    response = db.Column(db.Text, nullable=True)  # JSON string
+    response = db.Column(db.Text, nullable=True)  # JSON string, only on rows from before history_blobs
+    response_hash = db.Column(db.String(64), nullable=True, index=True)  # HistoryBlob holding the response
     error = db.Column(db.Text, nullable=True)
+    blob = db.relationship('HistoryBlob', primaryjoin='foreign(RequestHistory.response_hash) == HistoryBlob.hash',
+                           viewonly=True)
+
+    @property
+    def response_body(self):
+        """Response text, from the shared blob or (older rows) the row itself"""
+        if self.response_hash:
+            return self.blob.body if self.blob else None
+        return self.response
 
     def __repr__(self):
         return f'<RequestHistory {self.method} {self.url}>'
 
 
+class HistoryBlob(db.Model):
+    """Response body stored once for every history entry with the same content (see history_blobs)"""
+    __tablename__ = 'history_blobs'
+    __bind_key__ = HISTORY_BIND
+
+    hash = db.Column(db.String(64), primary_key=True)  # SHA-256 of the body
+    body = db.Column(db.Text, nullable=False)
+    size = db.Column(db.Integer, nullable=False)  # bytes
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<HistoryBlob {self.hash[:12]} size={self.size}>'
+
+
 class SavedQuery(db.Model):
     """Saved API queries for quick access"""
     __tablename__ = 'saved_queries'
@@ -92,3 +137,156 @@ class UserPreferences(db.Model):
 
     def __repr__(self):
         return f'<UserPreferences user_id={self.user_id}>'
+
+
+class BulkPlan(db.Model):
+    """Durable site-matrix bulk change set (applied item by item, resumable)"""
+    __tablename__ = 'bulk_plans'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), default='apply')  # apply, rollback
+    source_plan_id = db.Column(db.Integer, db.ForeignKey('bulk_plans.id'), nullable=True)
+    api_base_url = db.Column(db.String(255), nullable=False)
+    description = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), default='pending')  # pending, running, completed, failed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    items = db.relationship('BulkPlanItem', backref='plan', lazy='dynamic', cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<BulkPlan {self.id} {self.kind} {self.status}>'
+
+
+class BulkPlanItem(db.Model):
+    """One technician update within a bulk plan"""
+    __tablename__ = 'bulk_plan_items'
+
+    id = db.Column(db.Integer, primary_key=True)
+    plan_id = db.Column(db.Integer, db.ForeignKey('bulk_plans.id'), nullable=False, index=True)
+    technician_id = db.Column(db.String(50), nullable=False)
+    before_site_ids = db.Column(db.Text, nullable=True)  # JSON string (pre-change snapshot)
+    after_site_ids = db.Column(db.Text, nullable=False)  # JSON string
+    state = db.Column(db.String(20), default='pending', index=True)  # pending, done, failed, skipped
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<BulkPlanItem {self.technician_id} {self.state}>'
+
+
+class QuerySnapshot(db.Model):
+    """Latest scheduled result of a distinct saved query (shared by every user of the same credential)"""
+    __tablename__ = 'query_snapshots'
+    __bind_key__ = HISTORY_BIND
+
+    id = db.Column(db.Integer, primary_key=True)
+    query_key = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    api_base_url = db.Column(db.String(255), nullable=False)
+    endpoint = db.Column(db.String(255), nullable=False)
+    version = db.Column(db.Integer, default=0)  # bumped when the result changes
+    content_hash = db.Column(db.String(64), nullable=True)
+    status_code = db.Column(db.Integer, nullable=True)
+    response = db.Column(db.Text, nullable=True)  # JSON string
+    error = db.Column(db.Text, nullable=True)
+    fetched_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<QuerySnapshot {self.endpoint} v{self.version}>'
+
+
+class ReportRun(db.Model):
+    """Report execution ingested into its own local table (see report_store)"""
+    __tablename__ = 'report_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=True)
+    api_base_url = db.Column(db.String(255), nullable=False)
+    endpoint = db.Column(db.String(255), nullable=False)
+    method = db.Column(db.String(10), default='GET')
+    input_data = db.Column(db.Text, nullable=True)  # JSON string
+    status = db.Column(db.String(20), default='running')  # running, completed, failed
+    row_count = db.Column(db.Integer, default=0)
+    columns = db.Column(db.Text, nullable=True)  # JSON string [{name, column, type}]
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ReportRun {self.id} {self.status}>'
+
+
+class MirroredRequest(db.Model):
+    """Local copy of the analytics fields of an SDP request (see request_analytics)"""
+    __tablename__ = 'mirrored_requests'
+    __table_args__ = (db.UniqueConstraint('portal_key', 'request_id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    portal_key = db.Column(db.String(300), nullable=False, index=True)
+    request_id = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(100), nullable=True)
+    is_open = db.Column(db.Boolean, default=True)
+    technician = db.Column(db.String(255), nullable=True)
+    site = db.Column(db.String(255), nullable=True)
+    priority = db.Column(db.String(100), nullable=True)
+    created_time = db.Column(db.BigInteger, nullable=True)  # ms since epoch
+    completed_time = db.Column(db.BigInteger, nullable=True)
+    due_by_time = db.Column(db.BigInteger, nullable=True)
+    last_updated_time = db.Column(db.BigInteger, nullable=True)
+
+    def __repr__(self):
+        return f'<MirroredRequest {self.request_id}>'
+
+
+class RequestDailyCount(db.Model):
+    """Requests created/closed per UTC day, kept up to date by each mirror sync"""
+    __tablename__ = 'request_daily_counts'
+    __table_args__ = (db.UniqueConstraint('portal_key', 'day'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    portal_key = db.Column(db.String(300), nullable=False, index=True)
+    day = db.Column(db.Integer, nullable=False)  # days since epoch (UTC)
+    created = db.Column(db.Integer, default=0)
+    closed = db.Column(db.Integer, default=0)
+
+    def __repr__(self):
+        return f'<RequestDailyCount {self.day} +{self.created}/-{self.closed}>'
+
+
+class FieldCatalog(db.Model):
+    """Fields seen in responses of one endpoint on one portal (see field_catalog)"""
+    __tablename__ = 'field_catalogs'
+    __table_args__ = (db.UniqueConstraint('portal_key', 'endpoint'),)
+    __bind_key__ = HISTORY_BIND
+
+    id = db.Column(db.Integer, primary_key=True)
+    portal_key = db.Column(db.String(300), nullable=False, index=True)
+    endpoint = db.Column(db.String(255), nullable=False)  # IDs normalized to {id}
+    sampled = db.Column(db.Integer, default=0)  # objects observed
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    fields = db.relationship('CatalogField', backref='catalog', lazy=True, cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<FieldCatalog {self.endpoint} sampled={self.sampled}>'
+
+
+class CatalogField(db.Model):
+    """One field path of a FieldCatalog with its observed types and values"""
+    __tablename__ = 'catalog_fields'
+    __table_args__ = (db.UniqueConstraint('catalog_id', 'path'),)
+    __bind_key__ = HISTORY_BIND
+
+    id = db.Column(db.Integer, primary_key=True)
+    catalog_id = db.Column(db.Integer, db.ForeignKey('field_catalogs.id'), nullable=False, index=True)
+    path = db.Column(db.String(255), nullable=False)
+    types = db.Column(db.String(100), nullable=False, default='')  # comma-separated JSON types
+    present = db.Column(db.Integer, default=0)  # objects with a non-null value
+    nulls = db.Column(db.Integer, default=0)  # objects with an explicit null
+    examples = db.Column(db.Text, nullable=True)  # JSON list of distinct sample values
+
+    def __repr__(self):
+        return f'<CatalogField {self.path}>'
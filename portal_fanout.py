@@ -0,0 +1,233 @@
+"""
+Cross-portal fan-out queries
+Runs the same GET endpoint and input_data against every active portal a
+user holds credentials for, then merges the results into one SDP-shaped
+list: each item is tagged with its source portal, the merged set is sorted
+by the query's sort_field and paged by its start_index/row_count. A portal
+that fails only adds an entry to the per-portal errors.
+"""
+import asyncio
+
+import json_codec
+from models import APICredential
+from sdp_client import (PortalCredential, credential_key, run_async, client_session, fetch_all_pages,
+                        async_api_call_with_credential, extract_list_key)
+from config import FANOUT_MAX_ROWS_PER_PORTAL, FANOUT_PORTAL_TIMEOUT, SDP_PAGE_SIZE
+
+
+def user_portals(user, api_base_url, api_key, credential_ids=None):
+    """
+    Credentials to fan out over: the profile settings plus every active
+    APICredential, one per distinct portal + key
+
+    Returns:
+        [(source, credential)] where source is the tag added to merged items
+    """
+    portals = []
+    if not credential_ids and api_base_url and api_key:
+        portals.append(({'credential_id': None, 'name': 'Profile', 'api_base_url': api_base_url},
+                        PortalCredential(api_key, api_base_url)))
+
+    query = APICredential.query.filter_by(user_id=user.id, is_active=True)
+    if credential_ids:
+        query = query.filter(APICredential.id.in_(credential_ids))
+    for credential in query.order_by(APICredential.id).all():
+        source = {
+            'credential_id': credential.id,
+            'name': credential.name or f"{credential.role_type} #{credential.id}",
+            'api_base_url': credential.api_base_url
+        }
+        portals.append((source, credential))
+
+    seen = set()
+    unique = []
+    for source, credential in portals:
+        key = credential_key(credential)
+        if key not in seen:
+            seen.add(key)
+            unique.append((source, credential))
+    return unique
+
+
+def sort_value(item, field):
+    """
+    Comparable value of a (dotted) field: SDP wraps times as {value, ...}
+    and lookups as {name, ...}. Missing values sort last.
+    """
+    value = item
+    for part in field.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    if isinstance(value, dict):
+        value = value.get('value', value.get('name'))
+    if value is None:
+        return (2, 0, '')
+    try:
+        return (0, float(value), '')
+    except (TypeError, ValueError):
+        return (1, 0, str(value).lower())
+
+
+def single_object(data):
+    """(key, object) of a non-list response such as GET /requests/{id}"""
+    for key, value in data.items():
+        if key not in ('list_info', 'response_status') and isinstance(value, dict):
+            return key, value
+    return None, None
+
+
+async def fetch_portal(session, credential, endpoint, list_info, wanted):
+    """One portal's share of the fan-out: its first `wanted` rows in query order"""
+    try:
+        return await asyncio.wait_for(
+            fetch_all_pages(session, credential, endpoint, list_info=list_info, max_rows=wanted,
+                            page_size=min(SDP_PAGE_SIZE, wanted)),
+            FANOUT_PORTAL_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        return {"success": False, "error": f"Timed out after {FANOUT_PORTAL_TIMEOUT}s"}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+async def fetch_portal_object(session, credential, endpoint, params):
+    """One portal's answer to a non-list GET"""
+    try:
+        response = await asyncio.wait_for(
+            async_api_call_with_credential(session, credential, 'GET', endpoint, params=params),
+            FANOUT_PORTAL_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        return {"success": False, "error": f"Timed out after {FANOUT_PORTAL_TIMEOUT}s"}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    if response['success'] and response['status_code'] >= 400:
+        return {"success": False, "status_code": response['status_code'],
+                "error": f"HTTP {response['status_code']}: {response['raw'][:200]}"}
+    return response
+
+
+def paging(list_info):
+    """
+    (start_index, row_count) requested by a query's list_info, removed from it
+
+    Raises:
+        ValueError if either isn't a positive whole number
+    """
+    values = []
+    for field, default in (('start_index', 1), ('row_count', SDP_PAGE_SIZE)):
+        value = list_info.pop(field, None)
+        if value is None or value == '':
+            value = default
+        try:
+            values.append(max(int(value), 1))
+        except (TypeError, ValueError):
+            raise ValueError(f"list_info.{field} must be a number")
+    return tuple(values)
+
+
+def fan_out(portals, endpoint, input_data=None):
+    """
+    Query every portal concurrently and merge the results
+
+    List queries use input_data's list_info: each portal is asked for its
+    first start_index + row_count - 1 rows (sorted upstream by sort_field),
+    which is all the merged page can draw from. Other queries are sent
+    as-is: a list endpoint called without list_info contributes its first
+    page, any other endpoint its single object, per portal.
+
+    Returns:
+        {"success": True, <list_key>: [...], "list_info": {...}, "portals": [...]}
+
+    Raises:
+        ValueError for an invalid list_info
+    """
+    list_info = (input_data or {}).get('list_info') or {}
+    if not isinstance(list_info, dict):
+        raise ValueError('list_info must be an object')
+    list_info = dict(list_info)
+    start_index, row_count = paging(list_info)
+    list_info.pop('get_total_count', None)
+    wanted = min(start_index + row_count - 1, FANOUT_MAX_ROWS_PER_PORTAL)
+    list_mode = 'list_info' in (input_data or {})
+
+    async def run():
+        async with client_session() as session:
+            if list_mode:
+                calls = (fetch_portal(session, credential, endpoint, list_info, wanted)
+                         for _, credential in portals)
+            else:
+                params = {'input_data': json_codec.dumps(input_data)} if input_data else None
+                calls = (fetch_portal_object(session, credential, endpoint, params)
+                         for _, credential in portals)
+            return await asyncio.gather(*calls)
+
+    responses = run_async(run())
+
+    merged = []
+    list_key = None
+    total_count = 0
+    statuses = []
+    for (source, _), response in zip(portals, responses):
+        status = {**source, 'success': response['success']}
+        if not response['success']:
+            status['error'] = response['error']
+        elif list_mode and response['list_key']:
+            list_key = list_key or response['list_key']
+            merged.extend({**item, '_source': source} for item in response['items'])
+            total_count += response['total_count']
+            status['total_count'] = response['total_count']
+            status['fetched'] = len(response['items'])
+        else:
+            data = response.get('data')
+            data = data if isinstance(data, dict) else {}
+            key = extract_list_key(data)
+            if key:
+                list_key = list_key or key
+                items = data[key]
+                merged.extend({**item, '_source': source} for item in items if isinstance(item, dict))
+                # Only the page the portal sent can be merged and paged
+                total_count += len(items)
+                info = data.get('list_info')
+                upstream_total = info.get('total_count') if isinstance(info, dict) else None
+                status['total_count'] = upstream_total if isinstance(upstream_total, int) else len(items)
+                status['fetched'] = len(items)
+            else:
+                key, obj = single_object(data)
+                if obj is not None:
+                    list_key = list_key or key
+                    merged.append({**obj, '_source': source})
+                    total_count += 1
+        statuses.append(status)
+
+    sort_field = list_info.get('sort_field')
+    if sort_field:
+        descending = str(list_info.get('sort_order', 'asc')).lower() == 'desc'
+        keyed = [(sort_value(item, sort_field), item) for item in merged]
+        # Missing values stay last in both orders
+        present = sorted((entry for entry in keyed if entry[0][0] < 2), key=lambda entry: entry[0],
+                         reverse=descending)
+        merged = [item for _, item in present] + [item for key, item in keyed if key[0] == 2]
+
+    if not any(status['success'] for status in statuses):
+        return {
+            'success': False,
+            'error': '; '.join(f"{status['name']}: {status['error']}" for status in statuses) or 'No portals',
+            'portals': statuses
+        }
+
+    page = merged[start_index - 1:start_index - 1 + row_count]
+    return {
+        'success': True,
+        list_key or 'items': page,
+        'list_info': {
+            'start_index': start_index,
+            'row_count': len(page),
+            'total_count': total_count,
+            'has_more_rows': start_index - 1 + len(page) < total_count,
+            'sort_field': sort_field,
+            'sort_order': list_info.get('sort_order')
+        },
+        'portals': statuses,
+        'failed': sum(1 for status in statuses if not status['success']),
+        'truncated': wanted < start_index + row_count - 1
+    }
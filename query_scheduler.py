@@ -0,0 +1,306 @@
+"""
+Server-side saved query scheduler
+Runs the GET saved queries of users with auto-refresh enabled on their
+refresh interval. Identical queries (same portal, API key, endpoint and
+input) are fetched once and share one QuerySnapshot, so upstream load
+scales with distinct queries rather than with the number of viewers.
+
+init_scheduler() starts a scheduler thread in every worker process (on
+its first request); the thread only runs passes while it holds the
+shared-state leader lease, so one worker refreshes queries at a time
+however the app is served. With the memory:// backend every process is
+its own leader.
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import json_codec
+from models import db, User, SavedQuery, UserPreferences, QuerySnapshot
+from sdp_client import (PortalCredential, run_async, client_session, async_api_call_with_credential,
+                        gather_bounded, credential_key, prepare_api_call)
+from live_events import publish, json_diff
+from shared_state import backend
+from config import (API_BASE_URL as DEFAULT_API_BASE_URL, API_KEY as DEFAULT_API_KEY, QUERY_SCHEDULER_ENABLED,
+                    QUERY_SCHEDULER_TICK, QUERY_SCHEDULER_MIN_INTERVAL, QUERY_SCHEDULER_LEASE_TTL,
+                    QUERY_SCHEDULER_BATCH,
+                    LIVE_EVENTS_MAX_DIFF_RATIO)
+
+LEADER_LEASE = 'scheduler:leader'
+
+_scheduler_thread = None
+_scheduler_lock = threading.Lock()
+
+
+def user_credential(user):
+    """Portal credential from a user's profile settings (config defaults as fallback)"""
+    return PortalCredential(user.api_key or DEFAULT_API_KEY, user.api_base_url or DEFAULT_API_BASE_URL)
+
+
+def query_key(credential, query):
+    """
+    Identity of a saved query's upstream call
+    Equal for every user whose query resolves to the same call on the same credential
+    """
+    placeholders = json.loads(query.placeholders) if query.placeholders else {}
+    input_data = json.loads(query.input_data) if query.input_data else {}
+    endpoint, _, _ = prepare_api_call(query.method, query.endpoint, placeholders)
+    identity = json.dumps([credential_key(credential), query.method.upper(), endpoint, input_data],
+                          sort_keys=True)
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def query_channel(key):
+    """Live event channel of a query snapshot"""
+    return f"query:{key}"
+
+
+def scheduled_queries():
+    """
+    Collect the GET saved queries of active users with auto-refresh on,
+    grouped by query key
+
+    Returns:
+        {key: {'credential', 'endpoint', 'params', 'interval', 'query_ids'}}
+        where interval is the shortest one among the subscribers
+    """
+    rows = db.session.query(SavedQuery, User, UserPreferences)\
+        .join(User, SavedQuery.user_id == User.id)\
+        .join(UserPreferences, UserPreferences.user_id == User.id)\
+        .filter(User.is_active.is_(True),
+                UserPreferences.auto_refresh.is_(True),
+                SavedQuery.method == 'GET')
+
+    jobs = {}
+    for query, user, prefs in rows:
+        credential = user_credential(user)
+        key = query_key(credential, query)
+        interval = max(prefs.auto_refresh_interval or QUERY_SCHEDULER_MIN_INTERVAL, QUERY_SCHEDULER_MIN_INTERVAL)
+
+        if key not in jobs:
+            endpoint, params, _ = prepare_api_call(
+                'GET', query.endpoint,
+                json.loads(query.placeholders) if query.placeholders else {},
+                json.loads(query.input_data) if query.input_data else {}
+            )
+            jobs[key] = {
+                'credential': credential,
+                'endpoint': endpoint,
+                'params': params,
+                'interval': interval,
+                'query_ids': []
+            }
+
+        jobs[key]['interval'] = min(jobs[key]['interval'], interval)
+        jobs[key]['query_ids'].append(query.id)
+
+    return jobs
+
+
+async def _fetch_jobs(jobs):
+    """Run the due queries concurrently"""
+    async with client_session() as session:
+        return await gather_bounded(
+            async_api_call_with_credential(session, job['credential'], 'GET', job['endpoint'], params=job['params'])
+            for job in jobs
+        )
+
+
+def _snapshot_diff(old_body, new_body):
+    """JSON diff between two snapshot bodies, or None if it isn't worth sending"""
+    if not old_body or not new_body:
+        return None
+    diff = json_diff(json_codec.loads(old_body), json_codec.loads(new_body))
+    if len(json_codec.dumps_bytes(diff)) > len(new_body) * LIVE_EVENTS_MAX_DIFF_RATIO:
+        return None
+    return diff
+
+
+def store_result(snapshot, response, fetched_at):
+    """
+    Record a run in its snapshot, bumping the version only if the result changed
+
+    Returns:
+        live event payload if the result changed, else None
+    """
+    if response['success']:
+        status_code, body, error = response['status_code'], response['raw'], None
+    else:
+        status_code, body, error = None, None, response.get('error', 'Unknown error')
+
+    snapshot.fetched_at = fetched_at
+    content_hash = hashlib.sha256(json.dumps([status_code, body, error]).encode()).hexdigest()
+    if content_hash == snapshot.content_hash:
+        return None
+
+    event = {
+        'version': (snapshot.version or 0) + 1,
+        'base_version': snapshot.version or 0,
+        'status_code': status_code,
+        'error': error,
+        'fetched_at': fetched_at.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    diff = _snapshot_diff(snapshot.response, body)
+    if diff is not None:
+        event['diff'] = diff
+
+    snapshot.version = event['version']
+    snapshot.content_hash = content_hash
+    snapshot.status_code = status_code
+    snapshot.response = body
+    snapshot.error = error
+    return event
+
+
+def run_due_queries(now=None, leading=None):
+    """
+    One scheduler pass: refresh every query whose interval has elapsed
+    and drop snapshots nobody is subscribed to any more
+
+    Due queries are fetched QUERY_SCHEDULER_BATCH at a time; before each
+    batch `leading()` (if given) must still be true, otherwise the pass
+    stops without committing anything.
+
+    Returns:
+        number of upstream calls made
+    """
+    now = now or datetime.utcnow()
+    jobs = scheduled_queries()
+
+    stale = QuerySnapshot.query
+    if jobs:
+        stale = stale.filter(~QuerySnapshot.query_key.in_(list(jobs)))
+    stale.delete(synchronize_session=False)
+
+    snapshots = {
+        snapshot.query_key: snapshot
+        for snapshot in QuerySnapshot.query.filter(QuerySnapshot.query_key.in_(list(jobs)))
+    } if jobs else {}
+
+    due = []
+    for key, job in jobs.items():
+        snapshot = snapshots.get(key)
+        if snapshot is None:
+            snapshot = QuerySnapshot(query_key=key, api_base_url=job['credential'].api_base_url,
+                                     endpoint=job['endpoint'])
+            db.session.add(snapshot)
+        elif snapshot.fetched_at and (now - snapshot.fetched_at).total_seconds() < job['interval']:
+            continue
+        due.append((snapshot, job))
+
+    events = []
+    for start in range(0, len(due), QUERY_SCHEDULER_BATCH):
+        batch = due[start:start + QUERY_SCHEDULER_BATCH]
+        if leading and not leading():
+            # Another worker took over the scheduler: leave this pass to it
+            db.session.rollback()
+            return start
+        responses = run_async(_fetch_jobs([job for _, job in batch]))
+        for (snapshot, _), response in zip(batch, responses):
+            if response.get('unavailable'):
+                continue  # Portal circuit open: keep serving the last result
+            event = store_result(snapshot, response, now)
+            if event:
+                events.append((snapshot.query_key, event))
+
+    if leading and not leading():
+        db.session.rollback()
+        return len(due)
+    db.session.commit()
+
+    # Only announce versions clients can already read
+    for key, event in events:
+        publish(query_channel(key), 'snapshot', event)
+    return len(due)
+
+
+def _lead(token):
+    """Take or renew the leader lease; True if this process runs the next pass"""
+    store = backend()
+    return (store.add(LEADER_LEASE, token, ttl=QUERY_SCHEDULER_LEASE_TTL)
+            or store.renew(LEADER_LEASE, token, ttl=QUERY_SCHEDULER_LEASE_TTL))
+
+
+def _heartbeat(token, done, lost):
+    """Keep renewing the leader lease while a pass runs; sets `lost` if it can't"""
+    while not done.wait(QUERY_SCHEDULER_LEASE_TTL / 3):
+        try:
+            renewed = backend().renew(LEADER_LEASE, token, ttl=QUERY_SCHEDULER_LEASE_TTL)
+        except Exception:
+            renewed = False
+        if not renewed:
+            lost.set()
+            return
+
+
+def _scheduler_loop(app):
+    """Background thread body"""
+    token = uuid.uuid4().hex
+    while True:
+        with app.app_context():
+            try:
+                if _lead(token):
+                    done, lost = threading.Event(), threading.Event()
+                    threading.Thread(target=_heartbeat, args=(token, done, lost),
+                                     name='query-scheduler-lease', daemon=True).start()
+                    try:
+                        run_due_queries(leading=lambda: not lost.is_set())
+                    finally:
+                        done.set()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Saved query scheduler pass failed')
+        time.sleep(QUERY_SCHEDULER_TICK)
+
+
+def start_scheduler(app):
+    """Start the scheduler thread (once per process)"""
+    global _scheduler_thread
+    with _scheduler_lock:
+        if _scheduler_thread is None:
+            _scheduler_thread = threading.Thread(target=_scheduler_loop, args=(app,),
+                                                 name='query-scheduler', daemon=True)
+            _scheduler_thread.start()
+    return _scheduler_thread
+
+
+def init_scheduler(app):
+    """
+    Start the scheduler with the first request each worker serves (not at
+    import, so scripts importing the app and the reloader's file watcher
+    don't run it)
+    """
+    if not QUERY_SCHEDULER_ENABLED:
+        return
+
+    def start():
+        if _scheduler_thread is None:
+            start_scheduler(app)
+
+    app.before_request(start)
+
+
+def query_channels(user, queries):
+    """Map live event channel -> the user's saved query IDs behind it"""
+    credential = user_credential(user)
+    channels = {}
+    for query in queries:
+        channels.setdefault(query_channel(query_key(credential, query)), []).append(query.id)
+    return channels
+
+
+def snapshots_for_queries(user, queries):
+    """Map saved query ID -> QuerySnapshot (if one exists) for a user's queries"""
+    credential = user_credential(user)
+    keys = {query.id: query_key(credential, query) for query in queries}
+    if not keys:
+        return {}
+
+    by_key = {
+        snapshot.query_key: snapshot
+        for snapshot in QuerySnapshot.query.filter(QuerySnapshot.query_key.in_(list(keys.values())))
+    }
+    return {query_id: by_key[key] for query_id, key in keys.items() if key in by_key}
@@ -0,0 +1,201 @@
+"""
+Routes for report executions
+Runs /reports/{report_id}/execute or /reports/execute_query into a local
+per-run table (report_store) and serves grouped/filtered/sorted pages of it
+"""
+import json
+import os
+from datetime import datetime
+
+from flask import jsonify, request
+from flask_login import login_required, current_user
+from app import app, get_user_api_config, new_log_entry, record_history
+from models import db, ReportRun
+from sdp_client import PortalCredential
+from report_store import ingest_report, query_run, drop_run
+from config import ENDPOINTS, REPORT_RUNS_DB, REPORT_QUERY_MAX_PAGE
+
+
+def runs_db_path():
+    """Path of the report runs database (in the instance folder)"""
+    os.makedirs(app.instance_path, exist_ok=True)
+    return os.path.join(app.instance_path, REPORT_RUNS_DB)
+
+
+def run_summary(run):
+    """Serialize a report run for the API"""
+    return {
+        'id': run.id,
+        'name': run.name,
+        'endpoint': run.endpoint,
+        'status': run.status,
+        'row_count': run.row_count,
+        'columns': [
+            {'name': column['name'], 'type': column['type']}
+            for column in json.loads(run.columns or '[]')
+        ],
+        'error': run.error,
+        'created_at': run.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        'completed_at': run.completed_at.strftime("%Y-%m-%d %H:%M:%S") if run.completed_at else None
+    }
+
+
+def _get_run(run_id):
+    """Current user's report run or None"""
+    return ReportRun.query.filter_by(id=run_id, user_id=current_user.id).first()
+
+
+@app.route('/api/reports/runs', methods=['POST'])
+@login_required
+def create_report_run():
+    """
+    Execute a report into a new local table
+
+    Body: {report_id, name?, input_data?} for a saved report, or
+          {input_data: {query: ...}, name?} for /reports/execute_query
+    """
+    data = request.json or {}
+    report_id = data.get('report_id')
+    input_data = data.get('input_data') or {}
+    # The execute endpoints are reads; nothing else is sent upstream
+    method = data.get('method') or 'GET'
+    if not isinstance(method, str) or method.upper() != 'GET':
+        return jsonify({'success': False, 'error': 'Report execution is read-only (GET)'}), 400
+    method = 'GET'
+
+    if report_id:
+        endpoint = ENDPOINTS['Reports']['execute']
+        placeholders = {'report_id': report_id}
+    elif input_data:
+        endpoint = ENDPOINTS['Reports']['execute_query']
+        placeholders = {}
+    else:
+        return jsonify({'success': False, 'error': 'report_id or input_data is required'}), 400
+
+    api_base_url, api_key = get_user_api_config()
+    resolved_endpoint = endpoint.replace('{report_id}', str(report_id)) if report_id else endpoint
+
+    run = ReportRun(
+        user_id=current_user.id,
+        name=data.get('name') or (f"Report {report_id}" if report_id else 'Query'),
+        api_base_url=api_base_url,
+        endpoint=resolved_endpoint,
+        method=method,
+        input_data=json.dumps(input_data)
+    )
+    db.session.add(run)
+    db.session.commit()
+
+    result = ingest_report(runs_db_path(), run.id, PortalCredential(api_key, api_base_url),
+                           method, endpoint, placeholders, input_data)
+
+    run.completed_at = datetime.utcnow()
+    if result['success']:
+        run.status = 'completed'
+        run.row_count = result['row_count']
+        run.columns = json.dumps(result['columns'])
+    else:
+        run.status = 'failed'
+        run.error = result['error']
+    db.session.commit()
+
+    # History keeps a summary, the rows live in the run table
+    log_entry = new_log_entry(method, f"{api_base_url}{resolved_endpoint}", data=input_data)
+    if result['success']:
+        log_entry['status_code'] = 200
+        log_entry['response'] = json.dumps({'report_run_id': run.id, 'row_count': run.row_count})
+    else:
+        log_entry['error'] = run.error
+    record_history(log_entry)
+
+    status = 200 if result['success'] else 502
+    return jsonify({'success': result['success'], 'error': run.error, 'run': run_summary(run)}), status
+
+
+@app.route('/api/reports/runs', methods=['GET'])
+@login_required
+def list_report_runs():
+    """Recent report runs of the current user"""
+    runs = ReportRun.query.filter_by(user_id=current_user.id)\
+        .order_by(ReportRun.created_at.desc())\
+        .limit(request.args.get('limit', 50, type=int))\
+        .all()
+    return jsonify({'success': True, 'runs': [run_summary(run) for run in runs]})
+
+
+@app.route('/api/reports/runs/<int:run_id>', methods=['GET'])
+@login_required
+def get_report_run(run_id):
+    """One report run"""
+    run = _get_run(run_id)
+    if not run:
+        return jsonify({'success': False, 'error': 'Report run not found'}), 404
+    return jsonify({'success': True, 'run': run_summary(run)})
+
+
+@app.route('/api/reports/runs/<int:run_id>/rows', methods=['GET'])
+@login_required
+def get_report_rows(run_id):
+    """
+    Query a run's table
+
+    Query params:
+        filter - JSON list of {column, op, value}
+                 (op: eq, ne, lt, le, gt, ge, contains, in, null, notnull)
+        group_by - column name (repeatable)
+        agg - count or sum|avg|min|max:<column> (repeatable, used with group_by)
+        sort, order=asc|desc - output column to sort on
+        page, per_page
+    """
+    run = _get_run(run_id)
+    if not run:
+        return jsonify({'success': False, 'error': 'Report run not found'}), 404
+    if run.status != 'completed':
+        return jsonify({'success': False, 'error': f"Report run is {run.status}"}), 409
+
+    try:
+        filters = json.loads(request.args.get('filter') or '[]')
+    except ValueError:
+        filters = None
+    if not isinstance(filters, list):
+        return jsonify({'success': False, 'error': 'filter must be a JSON list'}), 400
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), REPORT_QUERY_MAX_PAGE)
+
+    try:
+        result = query_run(
+            runs_db_path(), run.id, json.loads(run.columns or '[]'),
+            filters=filters,
+            group_by=request.args.getlist('group_by'),
+            aggregates=request.args.getlist('agg'),
+            sort=request.args.get('sort'),
+            descending=request.args.get('order') == 'desc',
+            page=page,
+            per_page=per_page
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'columns': result['columns'],
+        'rows': result['rows'],
+        'total': result['total'],
+        'page': page,
+        'per_page': per_page
+    })
+
+
+@app.route('/api/reports/runs/<int:run_id>', methods=['DELETE'])
+@login_required
+def delete_report_run(run_id):
+    """Delete a report run and its table"""
+    run = _get_run(run_id)
+    if not run:
+        return jsonify({'success': False, 'error': 'Report run not found'}), 404
+
+    drop_run(runs_db_path(), run.id)
+    db.session.delete(run)
+    db.session.commit()
+    return jsonify({'success': True})
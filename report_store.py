@@ -0,0 +1,353 @@
+"""
+Local storage for report executions
+Report results are fetched page by page and written into a dedicated
+SQLite table per run (with typed columns), so a big report never sits in
+memory whole and can be grouped, filtered and sorted again and again
+without re-running it
+"""
+import json
+import re
+import sqlite3
+
+from sdp_client import run_async, client_session, async_api_call_with_credential, prepare_api_call
+from config import REPORT_PAGE_SIZE, REPORT_MAX_ROWS
+
+INTEGER_PATTERN = re.compile(r'^-?\d{1,18}$')
+REAL_PATTERN = re.compile(r'^-?(\d+\.\d*|\.\d+|\d+)([eE][-+]?\d+)?$')
+
+FILTER_OPS = {
+    'eq': '=',
+    'ne': '!=',
+    'lt': '<',
+    'le': '<=',
+    'gt': '>',
+    'ge': '>=',
+    'contains': 'LIKE',
+    'in': 'IN',
+    'null': 'IS NULL',
+    'notnull': 'IS NOT NULL'
+}
+AGGREGATES = ('count', 'sum', 'avg', 'min', 'max')
+
+
+def connect(path):
+    """Open the report runs database"""
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def table_name(run_id):
+    """Name of a run's table"""
+    return f"report_run_{int(run_id)}"
+
+
+def _rows_from(value):
+    """Result rows held by one response value, or None if it isn't a result set"""
+    if isinstance(value, list) and (not value or isinstance(value[0], dict)):
+        return value
+    if not isinstance(value, dict):
+        return None
+
+    # {columns: [...], rows|data: [[...], ...]}
+    columns = value.get('columns') or value.get('column_names')
+    table = value.get('rows', value.get('data'))
+    if columns and isinstance(table, list) and (not table or isinstance(table[0], list)):
+        names = [column.get('name') if isinstance(column, dict) else column for column in columns]
+        return [dict(zip(names, row)) for row in table]
+
+    for inner in value.values():
+        if isinstance(inner, list) and inner and isinstance(inner[0], dict):
+            return inner
+    return None
+
+
+def extract_rows(data):
+    """
+    Pull the result rows out of a report response
+
+    Accepts a list of row objects under any top-level key (or one level
+    down), or a {columns, rows} table. Returns a list of dicts.
+    """
+    for key, value in data.items():
+        if key in ('list_info', 'response_status'):
+            continue
+        rows = _rows_from(value)
+        if rows is not None:
+            return rows
+    return []
+
+
+def cell_value(value):
+    """Flatten an SDP cell (objects become their display value)"""
+    if isinstance(value, dict):
+        for key in ('display_value', 'name', 'value'):
+            if key in value:
+                return cell_value(value[key])
+        return json.dumps(value)
+    if isinstance(value, list):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def infer_type(values):
+    """SQLite column type for a sample of (flattened) values"""
+    values = [value for value in values if value is not None and value != '']
+    if not values:
+        return 'TEXT'
+    if all(isinstance(value, int) or (isinstance(value, str) and INTEGER_PATTERN.match(value)) for value in values):
+        return 'INTEGER'
+    if all(isinstance(value, (int, float)) or (isinstance(value, str) and REAL_PATTERN.match(value))
+           for value in values):
+        return 'REAL'
+    return 'TEXT'
+
+
+def coerce(value, column_type):
+    """Convert a flattened value to its column type (left as is if it doesn't fit)"""
+    if value is None or value == '':
+        return None
+    try:
+        if column_type == 'INTEGER':
+            return int(value)
+        if column_type == 'REAL':
+            return float(value)
+    except (TypeError, ValueError):
+        return value
+    return value if isinstance(value, (int, float)) else str(value)
+
+
+def _add_columns(conn, table, columns, rows):
+    """Create the table from the first page, or add columns that show up later"""
+    known = {column['name'] for column in columns}
+    new_names = []
+    for row in rows:
+        for name in row:
+            if name not in known:
+                known.add(name)
+                new_names.append(name)
+
+    added = []
+    for name in new_names:
+        column = {
+            'name': name,
+            'column': f"c{len(columns)}",
+            'type': infer_type([cell_value(row.get(name)) for row in rows])
+        }
+        columns.append(column)
+        added.append(column)
+
+    if not added:
+        return
+    if len(added) == len(columns):
+        definitions = ', '.join(f'"{column["column"]}" {column["type"]}' for column in columns)
+        conn.execute(f'CREATE TABLE "{table}" ({definitions})')
+    else:
+        for column in added:
+            conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column["column"]}" {column["type"]}')
+
+
+def _insert_rows(conn, table, columns, rows):
+    """Append one page of rows"""
+    if not rows:
+        return
+    names = ', '.join(f'"{column["column"]}"' for column in columns)
+    marks = ', '.join('?' for _ in columns)
+    conn.executemany(
+        f'INSERT INTO "{table}" ({names}) VALUES ({marks})',
+        ([coerce(cell_value(row.get(column['name'])), column['type']) for column in columns] for row in rows)
+    )
+
+
+async def _ingest(conn, table, credential, method, endpoint, placeholders, input_data):
+    """Fetch the report page by page, writing each page before fetching the next"""
+    columns = []
+    row_count = 0
+    start_index = 1
+
+    async with client_session() as session:
+        while row_count < REPORT_MAX_ROWS:
+            page_input = dict(input_data or {})
+            list_info = dict(page_input.get('list_info') or {})
+            list_info['row_count'] = min(REPORT_PAGE_SIZE, REPORT_MAX_ROWS - row_count)
+            list_info['start_index'] = start_index
+            page_input['list_info'] = list_info
+
+            page_endpoint, params, data = prepare_api_call(method, endpoint, placeholders, page_input)
+            response = await async_api_call_with_credential(session, credential, method, page_endpoint,
+                                                             params=params, data=data)
+            if not response['success']:
+                return {'success': False, 'error': response['error']}
+            if response['status_code'] >= 400:
+                return {'success': False, 'error': f"HTTP {response['status_code']}: {response['raw'][:500]}"}
+
+            rows = extract_rows(response['data'])
+            _add_columns(conn, table, columns, rows)
+            _insert_rows(conn, table, columns, rows)
+            conn.commit()
+            row_count += len(rows)
+
+            info = response['data'].get('list_info') or {}
+            if not rows or not info.get('has_more_rows'):
+                break
+            start_index += len(rows)
+
+    if not columns:
+        conn.execute(f'CREATE TABLE "{table}" ("c0" TEXT)')
+        conn.commit()
+
+    return {'success': True, 'columns': columns, 'row_count': row_count}
+
+
+def ingest_report(path, run_id, credential, method, endpoint, placeholders=None, input_data=None):
+    """
+    Execute a report into its run table
+
+    Returns:
+        {'success': True, 'columns': [{name, column, type}], 'row_count': n}
+        or {'success': False, 'error': ...} (the partial table is dropped)
+    """
+    table = table_name(run_id)
+    conn = connect(path)
+    try:
+        conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+        result = run_async(_ingest(conn, table, credential, method, endpoint, placeholders, input_data))
+        if not result['success']:
+            conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+            conn.commit()
+        return result
+    finally:
+        conn.close()
+
+
+def drop_run(path, run_id):
+    """Delete a run's table"""
+    conn = connect(path)
+    try:
+        conn.execute(f'DROP TABLE IF EXISTS "{table_name(run_id)}"')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _where(filters, by_name):
+    """WHERE clause and parameters for [{column, op, value}] filters"""
+    clauses = []
+    params = []
+    for item in filters or []:
+        if not isinstance(item, dict):
+            raise ValueError('Each filter must be an object')
+        column = by_name.get(item.get('column'))
+        op = item.get('op', 'eq')
+        if not column:
+            raise ValueError(f"Unknown column: {item.get('column')}")
+        if op not in FILTER_OPS:
+            raise ValueError(f"Unknown filter operator: {op}")
+
+        sql_column = f'"{column["column"]}"'
+        value = item.get('value')
+        if op in ('null', 'notnull'):
+            clauses.append(f"{sql_column} {FILTER_OPS[op]}")
+        elif op == 'contains':
+            clauses.append(f"{sql_column} LIKE ? ESCAPE '\\'")
+            escaped = str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"%{escaped}%")
+        elif op == 'in':
+            values = value if isinstance(value, list) else [value]
+            if not values:
+                clauses.append('0')
+                continue
+            clauses.append(f"{sql_column} IN ({', '.join('?' for _ in values)})")
+            params.extend(coerce(v, column['type']) for v in values)
+        else:
+            clauses.append(f"{sql_column} {FILTER_OPS[op]} ?")
+            params.append(coerce(value, column['type']))
+
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def query_run(path, run_id, columns, filters=None, group_by=None, aggregates=None,
+              sort=None, descending=False, page=1, per_page=50):
+    """
+    Filter, group, sort and page a run's table
+
+    Args:
+        columns: the run's column map [{name, column, type}]
+        filters: [{column, op, value}] with op one of FILTER_OPS
+        group_by: column names to group on
+        aggregates: 'count' or '<func>:<column>' (func in AGGREGATES),
+                    defaults to ['count'] when grouping
+        sort: output column name
+
+    Returns:
+        {'columns': [output names], 'rows': [dicts], 'total': n}
+
+    Raises:
+        ValueError for unknown columns, operators or aggregates, or
+        duplicate output columns
+    """
+    by_name = {column['name']: column for column in columns}
+    where, params = _where(filters, by_name)
+    table = table_name(run_id)
+
+    select = []  # (sql expression, output name)
+    group_sql = []
+    if group_by:
+        for name in group_by:
+            if name not in by_name:
+                raise ValueError(f"Unknown column: {name}")
+            select.append((f'"{by_name[name]["column"]}"', name))
+            group_sql.append(f'"{by_name[name]["column"]}"')
+
+        for aggregate in aggregates or ['count']:
+            func, _, name = aggregate.partition(':')
+            if func not in AGGREGATES:
+                raise ValueError(f"Unknown aggregate: {func}")
+            if func == 'count' and not name:
+                select.append(('COUNT(*)', 'count'))
+                continue
+            if name not in by_name:
+                raise ValueError(f"Unknown column: {name}")
+            select.append((f'{func.upper()}("{by_name[name]["column"]}")', f"{func}({name})"))
+        # Rows are dicts keyed by output name: a repeated group column or aggregate
+        # (names compared case-insensitively) would silently overwrite another
+        seen = set()
+        for _, name in select:
+            if name.lower() in seen:
+                raise ValueError(f"Duplicate output column: {name}")
+            seen.add(name.lower())
+    else:
+        select = [(f'"{column["column"]}"', column['name']) for column in columns]
+
+    outputs = [name for _, name in select]
+    aliases = {name: f"o{index}" for index, name in enumerate(outputs)}
+    if sort is not None and sort not in aliases:
+        raise ValueError(f"Unknown sort column: {sort}")
+
+    select_sql = ', '.join(f'{expression} AS {aliases[name]}' for expression, name in select)
+    group_clause = f" GROUP BY {', '.join(group_sql)}" if group_sql else ''
+    if sort is not None:
+        order_clause = f" ORDER BY {aliases[sort]} {'DESC' if descending else 'ASC'}"
+    else:
+        order_clause = f" ORDER BY {', '.join(group_sql)}" if group_sql else ' ORDER BY rowid'
+
+    conn = connect(path)
+    try:
+        if group_sql:
+            total_sql = f'SELECT COUNT(*) FROM (SELECT 1 FROM "{table}"{where}{group_clause})'
+        else:
+            total_sql = f'SELECT COUNT(*) FROM "{table}"{where}'
+        total = conn.execute(total_sql, params).fetchone()[0]
+
+        cursor = conn.execute(
+            f'SELECT {select_sql} FROM "{table}"{where}{group_clause}{order_clause} LIMIT ? OFFSET ?',
+            params + [per_page, (page - 1) * per_page]
+        )
+        rows = [dict(zip(outputs, row)) for row in cursor]
+    finally:
+        conn.close()
+
+    return {'columns': outputs, 'rows': rows, 'total': total}
@@ -0,0 +1,339 @@
+"""
+Request analytics over a local /requests mirror
+Requests are synced incrementally (by last_updated_time) into
+MirroredRequest rows, created/closed counts per day are kept in
+RequestDailyCount buckets as records change, and open-ticket aggregations
+run vectorized over a per-portal NumPy column cache
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from models import db, MirroredRequest, RequestDailyCount
+from sdp_client import run_async, client_session, stream_pages
+from shared_state import backend
+from config import REQUEST_CLOSED_STATUSES, ANALYTICS_AGE_BINS
+
+DAY_MS = 86400000
+GROUP_FIELDS = ('technician', 'site', 'status', 'priority')
+
+# Column cache: portal key -> (mirror version, columns). Columns stay in
+# each process; the mirror version is shared so a sync by any worker
+# invalidates them everywhere.
+_columns = {}
+_columns_lock = threading.Lock()
+
+_closed_statuses = {status.lower() for status in REQUEST_CLOSED_STATUSES}
+
+
+def _time_value(field):
+    """ms timestamp of an SDP date field ({"value": "...", "display_value": ...})"""
+    if isinstance(field, dict) and field.get('value'):
+        return int(field['value'])
+    return None
+
+
+def _name(field):
+    """Name of an SDP reference field"""
+    return field.get('name') if isinstance(field, dict) else None
+
+
+def mirror_fields(request_data):
+    """Analytics fields of one /requests list entry"""
+    status = _name(request_data.get('status'))
+    completed_time = _time_value(request_data.get('completed_time'))
+    return {
+        'request_id': str(request_data['id']),
+        'status': status,
+        'is_open': completed_time is None and (status or '').lower() not in _closed_statuses,
+        'technician': _name(request_data.get('technician')),
+        'site': _name(request_data.get('site')),
+        'priority': _name(request_data.get('priority')),
+        'created_time': _time_value(request_data.get('created_time')),
+        'completed_time': completed_time,
+        'due_by_time': _time_value(request_data.get('due_by_time')),
+        'last_updated_time': _time_value(request_data.get('last_updated_time'))
+    }
+
+
+def _day_contributions(record):
+    """(created day, closed day) a mirrored record counts towards"""
+    created_day = record['created_time'] // DAY_MS if record['created_time'] is not None else None
+    closed_day = None
+    if not record['is_open'] and record['completed_time'] is not None:
+        closed_day = record['completed_time'] // DAY_MS
+    return created_day, closed_day
+
+
+def _record_of(row):
+    """The fields of a MirroredRequest row that feed the daily buckets"""
+    return {'created_time': row.created_time, 'completed_time': row.completed_time, 'is_open': row.is_open}
+
+
+def _apply_bucket_deltas(portal_key, deltas):
+    """Add {day: [created, closed]} deltas to the daily buckets"""
+    deltas = {day: delta for day, delta in deltas.items() if delta[0] or delta[1]}
+    if not deltas:
+        return
+
+    buckets = {
+        bucket.day: bucket
+        for bucket in RequestDailyCount.query.filter(RequestDailyCount.portal_key == portal_key,
+                                                     RequestDailyCount.day.in_(list(deltas)))
+    }
+    for day, (created, closed) in deltas.items():
+        bucket = buckets.get(day)
+        if bucket is None:
+            bucket = RequestDailyCount(portal_key=portal_key, day=day, created=0, closed=0)
+            db.session.add(bucket)
+        bucket.created = (bucket.created or 0) + created
+        bucket.closed = (bucket.closed or 0) + closed
+
+
+def upsert_page(portal_key, requests_data):
+    """
+    Write one page of /requests entries into the mirror and move their
+    daily bucket contributions from their old state to the new one
+
+    Returns:
+        (inserted, updated)
+    """
+    records = [mirror_fields(entry) for entry in requests_data if entry.get('id') is not None]
+    if not records:
+        return 0, 0
+
+    existing = {
+        row.request_id: row
+        for row in MirroredRequest.query.filter(MirroredRequest.portal_key == portal_key,
+                                                MirroredRequest.request_id.in_([r['request_id'] for r in records]))
+    }
+
+    deltas = {}
+
+    def shift(record, sign):
+        created_day, closed_day = _day_contributions(record)
+        if created_day is not None:
+            deltas.setdefault(created_day, [0, 0])[0] += sign
+        if closed_day is not None:
+            deltas.setdefault(closed_day, [0, 0])[1] += sign
+
+    inserted = updated = 0
+    for record in records:
+        row = existing.get(record['request_id'])
+        if row is None:
+            row = MirroredRequest(portal_key=portal_key)
+            db.session.add(row)
+            existing[record['request_id']] = row
+            inserted += 1
+        else:
+            shift(_record_of(row), -1)
+            updated += 1
+        for field, value in record.items():
+            setattr(row, field, value)
+        shift(record, 1)
+
+    _apply_bucket_deltas(portal_key, deltas)
+    return inserted, updated
+
+
+def mirror_watermark(portal_key):
+    """Latest last_updated_time in a portal's mirror (None if empty)"""
+    return db.session.query(db.func.max(MirroredRequest.last_updated_time))\
+        .filter(MirroredRequest.portal_key == portal_key).scalar()
+
+
+def sync_requests(credential, portal_key, full=False):
+    """
+    Bring a portal's mirror up to date
+
+    Only requests updated at or after the mirror's watermark are fetched
+    unless `full` is set (re-reading the boundary is harmless, upserts are
+    idempotent). Each page is committed as it arrives.
+
+    Returns:
+        {'success': True, 'fetched', 'inserted', 'updated', 'watermark'}
+        or {'success': False, 'error'}
+    """
+    watermark = None if full else mirror_watermark(portal_key)
+    list_info = {'sort_field': 'last_updated_time', 'sort_order': 'asc'}
+    if watermark is not None:
+        list_info['search_criteria'] = {
+            'field': 'last_updated_time',
+            'condition': 'greater or equal',
+            'value': str(watermark)
+        }
+
+    totals = {'fetched': 0, 'inserted': 0, 'updated': 0}
+
+    async def run():
+        async with client_session() as session:
+            async for page in stream_pages(session, credential, '/requests', 'requests', list_info=list_info):
+                inserted, updated = upsert_page(portal_key, page)
+                db.session.commit()
+                totals['fetched'] += len(page)
+                totals['inserted'] += inserted
+                totals['updated'] += updated
+
+    try:
+        run_async(run())
+    except Exception as e:
+        db.session.rollback()
+        return {'success': False, 'error': str(e), **totals}
+    finally:
+        if totals['fetched']:
+            backend().incr(f"analytics:mirror:{portal_key}")
+
+    return {'success': True, 'watermark': mirror_watermark(portal_key), **totals}
+
+
+def _encode(values):
+    """Dictionary-encode a categorical column: (labels, int codes)"""
+    labels, codes = np.unique(np.array([value or '' for value in values], dtype=object), return_inverse=True)
+    return [str(label) for label in labels], codes.astype(np.int32)
+
+
+def _times(values):
+    """ms timestamps as int64 (-1 where missing)"""
+    return np.array([-1 if value is None else value for value in values], dtype=np.int64)
+
+
+def load_columns(portal_key):
+    """
+    Columnar view of a portal's mirror (cached until the next sync changes it)
+
+    Returns:
+        {'count', 'is_open', 'created', 'completed', 'due',
+         'technician': (labels, codes), 'site': ..., 'status': ..., 'priority': ...}
+    """
+    version = backend().get(f"analytics:mirror:{portal_key}") or 0
+    with _columns_lock:
+        cached = _columns.get(portal_key)
+        if cached and cached[0] == version:
+            return cached[1]
+
+    rows = db.session.query(
+        MirroredRequest.is_open, MirroredRequest.created_time, MirroredRequest.completed_time,
+        MirroredRequest.due_by_time, MirroredRequest.technician, MirroredRequest.site,
+        MirroredRequest.status, MirroredRequest.priority
+    ).filter(MirroredRequest.portal_key == portal_key).all()
+
+    fields = list(zip(*rows)) if rows else [[] for _ in range(8)]
+    columns = {
+        'count': len(rows),
+        'is_open': np.array(fields[0], dtype=bool),
+        'created': _times(fields[1]),
+        'completed': _times(fields[2]),
+        'due': _times(fields[3]),
+        'technician': _encode(fields[4]),
+        'site': _encode(fields[5]),
+        'status': _encode(fields[6]),
+        'priority': _encode(fields[7])
+    }
+
+    with _columns_lock:
+        _columns[portal_key] = (version, columns)
+    return columns
+
+
+def _group_counts(columns, field, mask):
+    """Counts per label of `field` among rows selected by `mask`"""
+    labels, codes = columns[field]
+    return np.bincount(codes[mask], minlength=len(labels))
+
+
+def _label(label):
+    """Display label for an encoded value ('' means not set)"""
+    return label or '(none)'
+
+
+def summary(columns, now_ms=None):
+    """Headline numbers for the whole mirror"""
+    now_ms = now_ms or int(time.time() * 1000)
+    is_open = columns['is_open']
+    overdue = is_open & (columns['due'] >= 0) & (columns['due'] < now_ms)
+    status_labels = columns['status'][0]
+    by_status = _group_counts(columns, 'status', np.ones(columns['count'], dtype=bool))
+
+    return {
+        'total': columns['count'],
+        'open': int(is_open.sum()),
+        'closed': int(columns['count'] - is_open.sum()),
+        'overdue': int(overdue.sum()),
+        'by_status': sorted(
+            ({'name': _label(status_labels[i]), 'count': int(count)} for i, count in enumerate(by_status) if count),
+            key=lambda item: -item['count']
+        )
+    }
+
+
+def open_counts(columns, by, now_ms=None):
+    """Open and overdue ticket counts per technician/site/status/priority, largest first"""
+    now_ms = now_ms or int(time.time() * 1000)
+    is_open = columns['is_open']
+    overdue = is_open & (columns['due'] >= 0) & (columns['due'] < now_ms)
+
+    labels = columns[by][0]
+    open_by = _group_counts(columns, by, is_open)
+    overdue_by = _group_counts(columns, by, overdue)
+
+    order = np.argsort(-open_by, kind='stable')
+    return [
+        {'name': _label(labels[i]), 'open': int(open_by[i]), 'overdue': int(overdue_by[i])}
+        for i in order if open_by[i]
+    ]
+
+
+def age_distribution(columns, by=None, bins=ANALYTICS_AGE_BINS, now_ms=None):
+    """
+    Age histogram of open tickets (days since created)
+
+    Returns bucket labels, overall counts, median/p90 age and, with `by`,
+    one histogram per group
+    """
+    now_ms = now_ms or int(time.time() * 1000)
+    mask = columns['is_open'] & (columns['created'] >= 0)
+    ages = (now_ms - columns['created'][mask]) / DAY_MS
+    edges = np.array(bins, dtype=float)
+    bucket = np.digitize(ages, edges)
+
+    labels = [f"<{bins[0]}d"] + [f"{low}-{high}d" for low, high in zip(bins, bins[1:])] + [f"{bins[-1]}d+"]
+    result = {
+        'buckets': labels,
+        'counts': np.bincount(bucket, minlength=len(labels)).tolist(),
+        'median_days': round(float(np.median(ages)), 2) if ages.size else None,
+        'p90_days': round(float(np.percentile(ages, 90)), 2) if ages.size else None
+    }
+
+    if by:
+        group_labels, codes = columns[by]
+        grid = np.bincount(codes[mask] * len(labels) + bucket,
+                           minlength=len(group_labels) * len(labels)).reshape(len(group_labels), len(labels))
+        totals = grid.sum(axis=1)
+        result['groups'] = [
+            {'name': _label(group_labels[i]), 'open': int(totals[i]), 'counts': grid[i].tolist()}
+            for i in np.argsort(-totals, kind='stable') if totals[i]
+        ]
+
+    return result
+
+
+def daily_trend(portal_key, days, today=None):
+    """Created/closed counts per day for the last `days` days (from the daily buckets)"""
+    today = today if today is not None else int(time.time() * 1000) // DAY_MS
+    first_day = today - days + 1
+    counts = {
+        bucket.day: bucket
+        for bucket in RequestDailyCount.query.filter(RequestDailyCount.portal_key == portal_key,
+                                                     RequestDailyCount.day >= first_day,
+                                                     RequestDailyCount.day <= today)
+    }
+    return [
+        {
+            'date': datetime.fromtimestamp(day * 86400, tz=timezone.utc).strftime('%Y-%m-%d'),
+            'created': counts[day].created if day in counts else 0,
+            'closed': counts[day].closed if day in counts else 0
+        }
+        for day in range(first_day, today + 1)
+    ]
@@ -0,0 +1,331 @@
+"""
+Spooling of oversized upstream responses
+api_call streams SDP bodies; one larger than SPOOL_THRESHOLD_BYTES is
+written to a file in the spool folder instead of being held in memory.
+The file is then scanned once, a window at a time, to record where each
+item of its main list starts and ends (an .idx file of byte offsets) and
+to keep the small top-level fields (list_info, response_status). Pages
+are read back by seeking to their items, so a worker never holds more
+than one window or one page of a spooled response, whatever its size.
+
+Files live in the instance folder (shared by the workers of one host) and
+expire after SPOOL_TTL.
+"""
+import codecs
+import json
+import os
+import re
+import socket
+import struct
+import tempfile
+import threading
+import time
+import uuid
+
+import requests
+
+import json_codec
+from config import (SPOOL_DIR, SPOOL_THRESHOLD_BYTES, SPOOL_MAX_BYTES, SPOOL_TTL, SPOOL_PAGE_SIZE,
+                    SPOOL_CHUNK_BYTES)
+
+HANDLE = re.compile(r'^[0-9a-f]{32}$')
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+OFFSET = struct.Struct('<qq')  # start and end byte of one list item
+LIST_META_KEYS = ('list_info', 'response_status')  # same rule as sdp_client.extract_list_key
+
+_decoder = json.JSONDecoder()
+_spool_dir = SPOOL_DIR
+
+
+class SpoolError(Exception):
+    """A response too large to hold that can't be spooled either"""
+
+
+class _Window:
+    """Decoded text over a file, read SPOOL_CHUNK_BYTES at a time, tracking byte offsets"""
+
+    def __init__(self, f):
+        self.f = f
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.byte = 0  # file offset of text[pos]
+        self.eof = False
+
+    def fill(self):
+        """Drop consumed text and read more (at least as much as is buffered, so big items don't rescan often)"""
+        data = self.f.read(max(SPOOL_CHUNK_BYTES, len(self.text) - self.pos))
+        self.eof = not data
+        self.text = self.text[self.pos:] + self.utf8.decode(data, final=self.eof)
+        self.pos = 0
+
+    def advance(self, end):
+        self.byte += len(self.text[self.pos:end].encode())
+        self.pos = end
+
+    def peek(self):
+        """Next non-whitespace character ('' at the end of the file)"""
+        while True:
+            self.advance(WHITESPACE.match(self.text, self.pos).end())
+            if self.pos < len(self.text) or self.eof:
+                return self.text[self.pos:self.pos + 1]
+            self.fill()
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected {chars!r} at byte {self.byte}")
+        self.advance(self.pos + 1)
+        return char
+
+    def value(self):
+        """Decode the next JSON value: (value, start byte, end byte)"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise ValueError(f"Invalid JSON at byte {self.byte}")
+                self.fill()
+                continue
+            # A number running into the end of the window may go on in the next read
+            if end == len(self.text) and not self.eof:
+                self.fill()
+                continue
+            start = self.byte
+            self.advance(end)
+            return value, start, self.byte
+
+
+def index_body(f, idx):
+    """
+    Scan a spooled SDP body, writing the offsets of its main list's items to idx
+
+    Returns:
+        (list_key, item count, other top-level fields)
+    """
+    window = _Window(f)
+    fields = {}
+    list_key = None
+    count = 0
+    window.expect('{')
+    if window.peek() == '}':
+        return None, 0, fields
+
+    while True:
+        key, _, _ = window.value()
+        window.expect(':')
+        if list_key is None and key not in LIST_META_KEYS and window.peek() == '[':
+            list_key = key
+            window.expect('[')
+            if window.peek() == ']':
+                window.expect(']')
+            else:
+                while True:
+                    _, start, end = window.value()
+                    idx.write(OFFSET.pack(start, end))
+                    count += 1
+                    if window.expect(',]') == ']':
+                        break
+        else:
+            fields[key], _, _ = window.value()
+        if window.expect(',}') == '}':
+            return list_key, count, fields
+
+
+def _path(handle, suffix):
+    return os.path.join(_spool_dir, f"{handle}.{suffix}")
+
+
+def purge_expired():
+    """Remove spooled responses older than SPOOL_TTL (and partial downloads)"""
+    cutoff = time.time() - SPOOL_TTL
+    for name in os.listdir(_spool_dir):
+        path = os.path.join(_spool_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def _cut_off(response, expired):
+    """Deadline reached: shut the socket so a read blocked on it returns now"""
+    expired.set()
+    try:
+        # A duplicate of the descriptor: shutdown acts on the connection itself
+        with socket.fromfd(response.raw.fileno(), socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.shutdown(socket.SHUT_RDWR)
+    except (OSError, ValueError, AttributeError):
+        pass
+
+
+def spool_if_oversized(response, budget=None):
+    """
+    Read a streamed requests response
+
+    Bodies up to SPOOL_THRESHOLD_BYTES are kept on the response as usual
+    (response.content / response.text); larger ones are written to a file.
+    The read timeout only bounds each socket read, so a portal trickling
+    bytes could hold the worker indefinitely: with a budget (seconds) the
+    whole body must arrive within it.
+
+    Returns:
+        path of the spooled body, or None
+
+    Raises:
+        SpoolError past SPOOL_MAX_BYTES
+        requests.Timeout if the body isn't read within the budget
+    """
+    length = response.headers.get('Content-Length', '')
+    if length.isdigit() and int(length) > SPOOL_MAX_BYTES:
+        response.close()
+        raise SpoolError(f"Response of {int(length) / 1048576:.0f} MB exceeds the "
+                         f"{SPOOL_MAX_BYTES / 1048576:.0f} MB limit")
+
+    expired = threading.Event()
+    watchdog = None
+    if budget is not None:
+        watchdog = threading.Timer(max(budget, 0), _cut_off, args=(response, expired))
+        watchdog.daemon = True
+        watchdog.start()
+
+    buffer = bytearray()
+    spool = None
+    size = 0
+    try:
+        for chunk in response.iter_content(SPOOL_CHUNK_BYTES):
+            size += len(chunk)
+            if size > SPOOL_MAX_BYTES:
+                raise SpoolError(f"Response exceeds the {SPOOL_MAX_BYTES / 1048576:.0f} MB limit")
+            if spool is not None:
+                spool.write(chunk)
+                continue
+            buffer += chunk
+            if len(buffer) > SPOOL_THRESHOLD_BYTES:
+                spool = tempfile.NamedTemporaryFile(dir=_spool_dir, suffix='.part', delete=False)
+                spool.write(buffer)
+                buffer = None
+        if expired.is_set():
+            raise requests.Timeout(f"Response body not received within {budget:.1f}s")
+    except BaseException as e:
+        if spool is not None:
+            spool.close()
+            os.remove(spool.name)
+        if expired.is_set() and not isinstance(e, requests.Timeout):
+            raise requests.Timeout(f"Response body not received within {budget:.1f}s") from e
+        raise
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+        response.close()
+
+    if spool is None:
+        response._content = bytes(buffer)
+        response._content_consumed = True
+        return None
+    spool.close()
+    return spool.name
+
+
+def spool_response(path, owner, endpoint):
+    """
+    Index a spooled body and give it a handle
+
+    Returns:
+        spool info (handle, list_key, total, bytes, ...)
+
+    Raises:
+        SpoolError if the body isn't an SDP list response
+    """
+    purge_expired()
+    handle = uuid.uuid4().hex
+    body_path = _path(handle, 'body')
+    os.replace(path, body_path)
+    size = os.path.getsize(body_path)
+    try:
+        with open(body_path, 'rb') as f, open(_path(handle, 'idx'), 'wb') as idx:
+            list_key, total, fields = index_body(f, idx)
+        if list_key is None:
+            raise ValueError('no list to page through')
+    except ValueError as e:
+        discard(handle)
+        raise SpoolError(f"Response of {size / 1048576:.0f} MB is too large to load and can't be paged ({e})")
+
+    info = {
+        'handle': handle,
+        'owner': owner,
+        'endpoint': endpoint,
+        'list_key': list_key,
+        'total': total,
+        'bytes': size,
+        'fields': fields,
+        'created_at': time.time(),
+    }
+    with open(_path(handle, 'meta'), 'w') as f:
+        json.dump(info, f)
+    return info
+
+
+def discard(handle):
+    """Remove a spooled response's files"""
+    for suffix in ('body', 'idx', 'meta'):
+        try:
+            os.remove(_path(handle, suffix))
+        except OSError:
+            pass
+
+
+def spool_info(handle):
+    """Info of a spooled response, or None if unknown or expired"""
+    if not HANDLE.match(handle or ''):
+        return None
+    try:
+        with open(_path(handle, 'meta')) as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return info if info['created_at'] > time.time() - SPOOL_TTL else None
+
+
+def read_items(info, start_index, row_count):
+    """Items start_index (1-based) to start_index + row_count - 1 of a spooled list"""
+    first = max(start_index, 1) - 1
+    count = max(min(row_count, info['total'] - first), 0)
+    if not count:
+        return []
+    with open(_path(info['handle'], 'idx'), 'rb') as idx:
+        idx.seek(first * OFFSET.size)
+        offsets = idx.read(count * OFFSET.size)
+    start = OFFSET.unpack_from(offsets, 0)[0]
+    end = OFFSET.unpack_from(offsets, (count - 1) * OFFSET.size)[1]
+    with open(_path(info['handle'], 'body'), 'rb') as f:
+        f.seek(start)
+        return json_codec.loads(b'[' + f.read(end - start) + b']')
+
+
+def public_info(info):
+    """What the browser needs to page through a spooled response"""
+    return {key: info[key] for key in ('handle', 'list_key', 'total', 'bytes')}
+
+
+def first_page(info):
+    """Response data of a spooled call: its top-level fields, the first SPOOL_PAGE_SIZE items and _spool"""
+    return {
+        **info['fields'],
+        info['list_key']: read_items(info, 1, SPOOL_PAGE_SIZE),
+        '_spool': {**public_info(info), 'start_index': 1, 'row_count': SPOOL_PAGE_SIZE},
+    }
+
+
+def history_note(info):
+    """What request history keeps instead of a spooled body"""
+    return json_codec.dumps({'_spool': public_info(info)})
+
+
+def init_spool(app):
+    """Create the spool folder (relative SPOOL_DIR under the instance folder)"""
+    global _spool_dir
+    _spool_dir = SPOOL_DIR if os.path.isabs(SPOOL_DIR) else os.path.join(app.instance_path, SPOOL_DIR)
+    os.makedirs(_spool_dir, exist_ok=True)
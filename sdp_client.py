@@ -0,0 +1,294 @@
+"""
+Asyncio client for ME SDP API calls
+Used by fan-out routes that need many upstream calls at once
+(site matrix data, technician details, multi-page exports)
+"""
+import asyncio
+import hashlib
+
+import aiohttp
+
+import cassette
+import json_codec
+from cassette import CassetteMiss
+from upstream_guard import UpstreamUnavailable, breaker_for, call_timeout, is_failure, async_throttle
+from config import SDP_MAX_CONCURRENCY, SDP_PAGE_SIZE, UPSTREAM_CONNECT_TIMEOUT
+
+
+class PortalCredential:
+    """Plain credential holder for calls made with a user's profile settings"""
+
+    def __init__(self, api_key, api_base_url):
+        self.api_key = api_key
+        self.api_base_url = api_base_url
+
+
+def credential_key(credential):
+    """Cache key for a credential (portal + hashed API key)"""
+    key_hash = hashlib.sha256((credential.api_key or '').encode()).hexdigest()[:16]
+    return f"{credential.api_base_url}|{key_hash}"
+
+
+def prepare_api_call(method, endpoint, placeholders=None, input_data=None):
+    """
+    Resolve endpoint placeholders and wrap input_data the way SDP expects it
+
+    Returns:
+        (endpoint, params, data) - input_data goes into params for GET, data otherwise
+    """
+    for key, value in (placeholders or {}).items():
+        endpoint = endpoint.replace(f"{{{key}}}", str(value))
+
+    payload = {'input_data': json_codec.dumps(input_data)} if input_data else None
+    if method.upper() == "GET":
+        return endpoint, payload, None
+    return endpoint, None, payload
+
+
+def run_async(coro):
+    """Run a coroutine to completion from a (synchronous) Flask view"""
+    return asyncio.run(coro)
+
+
+def client_session():
+    """Create an aiohttp session sized for the fan-out concurrency limit"""
+    connector = aiohttp.TCPConnector(limit=SDP_MAX_CONCURRENCY, ssl=False)
+    return aiohttp.ClientSession(connector=connector)
+
+
+async def async_api_call_with_credential(session, credential, method, endpoint, params=None, data=None):
+    """
+    Make API call using specific credential
+    Same contract as site_matrix_routes.api_call_with_credential.
+    Runs under the portal's rate limit and circuit breaker with a timeout
+    capped by the current route's deadline; calls that aren't attempted come back with
+    "unavailable": True. Recorded or played back per SDP_TRANSPORT.
+    """
+    url = f"{credential.api_base_url}{endpoint}"
+    headers = {"authtoken": credential.api_key}
+
+    if cassette.playing():
+        try:
+            status, body = cassette.play(method, url, params, data)
+        except CassetteMiss as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+        return {
+            "success": True,
+            "status_code": status,
+            "data": json_codec.loads(body) if body else {},
+            "raw": body.decode()
+        }
+
+    breaker = breaker_for(credential.api_base_url)
+    try:
+        await async_throttle(credential.api_base_url)
+        timeout = call_timeout()
+        breaker.before_call()
+    except UpstreamUnavailable as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "unavailable": True
+        }
+
+    try:
+        client_timeout = aiohttp.ClientTimeout(total=timeout, connect=min(UPSTREAM_CONNECT_TIMEOUT, timeout))
+        async with session.request(method.upper(), url, headers=headers, params=params, data=data,
+                                   timeout=client_timeout) as response:
+            text = await response.text()
+    except asyncio.TimeoutError:
+        breaker.record(False)
+        return {
+            "success": False,
+            "error": f"SDP call timed out after {timeout:.1f}s"
+        }
+    except Exception as e:
+        breaker.record(False)
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    except BaseException:
+        # Cancelled (e.g. by an outer wait_for): release a half-open trial
+        breaker.record(False)
+        raise
+    breaker.record(not is_failure(response.status))
+    if cassette.recording():
+        cassette.record(method, url, params, data, response.status, text)
+
+    try:
+        return {
+            "success": True,
+            "status_code": response.status,
+            "data": json_codec.loads(text) if text else {},
+            "raw": text
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+async def bounded(semaphore, coro):
+    """Await a coroutine while holding a slot of the semaphore"""
+    async with semaphore:
+        return await coro
+
+
+async def gather_bounded(coros, limit=SDP_MAX_CONCURRENCY):
+    """Run coroutines concurrently, at most `limit` at a time, results in order"""
+    semaphore = asyncio.Semaphore(limit)
+    return await asyncio.gather(*(bounded(semaphore, coro) for coro in coros))
+
+
+def extract_list_key(data):
+    """Find the key holding the main list in an SDP list response"""
+    for key, value in data.items():
+        if key not in ('list_info', 'response_status') and isinstance(value, list):
+            return key
+    return None
+
+
+def list_params(start_index, row_count, list_info=None, get_total_count=False):
+    """Build GET params for one page of an SDP list call"""
+    info = dict(list_info or {})
+    info['row_count'] = row_count
+    info['start_index'] = start_index
+    if get_total_count:
+        info['get_total_count'] = True
+    return {'input_data': json_codec.dumps({"list_info": info})}
+
+
+def page_failure(page):
+    """Error message of a list page that failed or came back as an HTTP error, or None"""
+    if not page['success']:
+        return page['error']
+    if page['status_code'] >= 400:
+        return f"HTTP {page['status_code']}: {(page.get('raw') or '')[:200]}"
+    return None
+
+
+async def fetch_all_pages(session, credential, endpoint, list_key=None, list_info=None,
+                          max_rows=None, limit=SDP_MAX_CONCURRENCY, page_size=SDP_PAGE_SIZE):
+    """
+    Fetch every page of an SDP list endpoint
+
+    The first page is fetched alone to learn total_count, the remaining
+    pages are then requested concurrently (bounded by `limit`).
+
+    Returns:
+        {"success": True, "items": [...], "list_key": ..., "total_count": ...}
+        (plus "data", the response itself, when it holds no list)
+        or {"success": False, "error": ...}
+    """
+    first = await async_api_call_with_credential(
+        session, credential, 'GET', endpoint,
+        params=list_params(1, page_size, list_info, get_total_count=True)
+    )
+    error = page_failure(first)
+    if error:
+        return {"success": False, "error": error}
+
+    data = first['data']
+    list_key = list_key or extract_list_key(data)
+    if not list_key:
+        return {"success": True, "items": [], "list_key": None, "total_count": 0, "data": data}
+    items = list(data.get(list_key) or [])
+    info = data.get('list_info', {})
+    total_count = info.get('total_count')
+
+    if total_count is not None:
+        total_count = int(total_count)
+        wanted = min(total_count, max_rows) if max_rows else total_count
+        starts = range(1 + page_size, wanted + 1, page_size)
+        pages = await gather_bounded(
+            (async_api_call_with_credential(session, credential, 'GET', endpoint,
+                                            params=list_params(start, page_size, list_info))
+             for start in starts),
+            limit
+        )
+        for page in pages:
+            error = page_failure(page)
+            if error:
+                return {"success": False, "error": error}
+            items.extend(page['data'].get(list_key) or [])
+    else:
+        # No total count available: follow has_more_rows one page at a time
+        start = 1
+        while info.get('has_more_rows') and (not max_rows or len(items) < max_rows):
+            start += page_size
+            page = await async_api_call_with_credential(
+                session, credential, 'GET', endpoint,
+                params=list_params(start, page_size, list_info)
+            )
+            error = page_failure(page)
+            if error:
+                return {"success": False, "error": error}
+            items.extend(page['data'].get(list_key) or [])
+            info = page['data'].get('list_info', {})
+
+    if max_rows:
+        items = items[:max_rows]
+
+    return {
+        "success": True,
+        "items": items,
+        "list_key": list_key,
+        "total_count": total_count if total_count is not None else len(items)
+    }
+
+
+async def stream_pages(session, credential, endpoint, list_key=None, list_info=None,
+                       limit=SDP_MAX_CONCURRENCY, page_size=SDP_PAGE_SIZE):
+    """
+    Async generator over the pages of an SDP list endpoint
+
+    Like fetch_all_pages, but yields each page's items as soon as its
+    window of `limit` concurrent requests completes, so callers can
+    process big lists without holding them in memory whole.
+    Raises RuntimeError if a page fails.
+    """
+    first = await async_api_call_with_credential(
+        session, credential, 'GET', endpoint,
+        params=list_params(1, page_size, list_info, get_total_count=True)
+    )
+    error = page_failure(first)
+    if error:
+        raise RuntimeError(error)
+
+    data = first['data']
+    list_key = list_key or extract_list_key(data)
+    info = data.get('list_info', {})
+    yield list(data.get(list_key) or []) if list_key else []
+
+    total_count = info.get('total_count')
+    if total_count is not None:
+        starts = list(range(1 + page_size, int(total_count) + 1, page_size))
+        for window in range(0, len(starts), limit):
+            pages = await asyncio.gather(*(
+                async_api_call_with_credential(session, credential, 'GET', endpoint,
+                                               params=list_params(start, page_size, list_info))
+                for start in starts[window:window + limit]
+            ))
+            for page in pages:
+                error = page_failure(page)
+                if error:
+                    raise RuntimeError(error)
+                yield page['data'].get(list_key) or []
+    else:
+        start = 1
+        while info.get('has_more_rows'):
+            start += page_size
+            page = await async_api_call_with_credential(
+                session, credential, 'GET', endpoint,
+                params=list_params(start, page_size, list_info)
+            )
+            error = page_failure(page)
+            if error:
+                raise RuntimeError(error)
+            yield page['data'].get(list_key) or []
+            info = page['data'].get('list_info', {})
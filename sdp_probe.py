@@ -0,0 +1,321 @@
+"""
+SDP latency probe
+Runs a scenario of SDP calls (any config.ENDPOINTS entry) at one or more
+concurrency levels against a portal or the fake portal (fake_sdp), and
+reports latency percentiles, throughput, payload sizes and errors. Use it
+to compare a portal before and after an upgrade, or to pick
+SDP_MAX_CONCURRENCY for it.
+
+Usage:
+    python sdp_probe.py --fake --concurrency 1,4,8,16 --iterations 200
+    python sdp_probe.py --scenario accounts --base-url https://sdp.example.com/api/v3 --api-key KEY
+    python sdp_probe.py --endpoint Requests.list --endpoint Requests.view --placeholder request_id=1234 --json
+    python sdp_probe.py --scenario scenario.json
+
+A scenario file is JSON: {"steps": [{"endpoint": "Requests.list" or
+"/requests", "method": "GET", "placeholders": {...}, "input_data":
+{...}}, ...], "concurrency": [1, 8], "iterations": 100}. Placeholders a
+step doesn't set are filled with the first ID listed by the path before
+them, as test_accounts_api.py does by hand. Writes (add, update, assign,
+delete) only run with --allow-writes.
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from collections import Counter
+
+import aiohttp
+
+import json_codec
+from sdp_client import prepare_api_call, extract_list_key
+from config import API_BASE_URL, API_KEY, ENDPOINTS, SDP_PAGE_SIZE, UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_CALL_TIMEOUT
+
+ACTION_METHODS = {'add': 'POST', 'update': 'PUT', 'assign': 'PUT', 'delete': 'DELETE'}
+PERCENTILES = (50, 95, 99)
+
+SCENARIOS = {
+    # The reads of test_accounts_api.py
+    'accounts': [
+        {'endpoint': 'Accounts.list'},
+        {'endpoint': 'Accounts.view'},
+        {'endpoint': 'Accounts.contacts'},
+        {'endpoint': 'Accounts.sites'},
+        {'endpoint': 'Accounts.search',
+         'input_data': {'list_info': {'row_count': 10, 'search_fields': {'name': 'test'}}}},
+    ],
+    # The calls the explorer and site matrix lean on most
+    'reads': [
+        {'endpoint': 'Requests.list'},
+        {'endpoint': 'Requests.view'},
+        {'endpoint': 'Technicians.list'},
+        {'endpoint': 'Technicians.view'},
+        {'endpoint': 'Users.list'},
+        {'endpoint': 'Worklogs.request_summary'},
+    ],
+}
+
+
+def resolve_step(step, row_count):
+    """Step with its path template, method and default list_info filled in"""
+    endpoint = step['endpoint']
+    if endpoint.startswith('/'):
+        template, method = endpoint, step.get('method', 'GET')
+    else:
+        category, _, action = endpoint.partition('.')
+        try:
+            template = ENDPOINTS[category][action]
+        except KeyError:
+            raise SystemExit(f"Unknown endpoint {endpoint!r} (use Category.action from config.ENDPOINTS or a path)")
+        method = step.get('method', ACTION_METHODS.get(action, 'GET'))
+
+    input_data = step.get('input_data')
+    last = template.rstrip('/').split('/')[-1]
+    if input_data is None and method.upper() == 'GET' and not last.startswith('{'):
+        input_data = {'list_info': {'row_count': row_count, 'start_index': 1}}
+    return {
+        'name': step.get('name', endpoint),
+        'template': template,
+        'method': method.upper(),
+        'placeholders': dict(step.get('placeholders') or {}),
+        'input_data': input_data,
+    }
+
+
+async def first_id(session, base_url, api_key, path):
+    """ID of the first object listed by a path, or None"""
+    endpoint, params, _ = prepare_api_call('GET', path, input_data={'list_info': {'row_count': 1, 'start_index': 1}})
+    try:
+        async with session.get(f"{base_url}{endpoint}", headers={'authtoken': api_key}, params=params) as response:
+            if response.status >= 400:
+                return None
+            data = json_codec.loads(await response.read())
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise SystemExit(f"Could not list {path}: {e or type(e).__name__}")
+    list_key = extract_list_key(data)
+    items = data.get(list_key) if list_key else None
+    return str(items[0]['id']) if items and isinstance(items[0], dict) and 'id' in items[0] else None
+
+
+async def fill_placeholders(session, base_url, api_key, step, known):
+    """Set every placeholder of a step, looking missing IDs up (shared across steps through `known`)"""
+    segments = step['template'].split('/')
+    for index, segment in enumerate(segments):
+        if not (segment.startswith('{') and segment.endswith('}')):
+            continue
+        name = segment[1:-1]
+        if name in step['placeholders']:
+            continue
+        if name not in known:
+            prefix = '/'.join(segments[:index])
+            for key, value in {**known, **step['placeholders']}.items():
+                prefix = prefix.replace(f"{{{key}}}", str(value))
+            known[name] = await first_id(session, base_url, api_key, prefix)
+            if known[name] is None:
+                raise SystemExit(f"Could not find a {name} from {prefix}; pass --placeholder {name}=...")
+        step['placeholders'][name] = known[name]
+
+
+def classify(status, body):
+    """Error category of a response, or None if it succeeded"""
+    if status >= 400:
+        return f"HTTP {status}"
+    try:
+        data = json_codec.loads(body) if body else {}
+    except ValueError:
+        return 'invalid JSON'
+    statuses = data.get('response_status') if isinstance(data, dict) else None
+    for entry in statuses if isinstance(statuses, list) else [statuses] if statuses else []:
+        if isinstance(entry, dict) and entry.get('status_code') not in (None, 2000):
+            return f"SDP {entry['status_code']}"
+    return None
+
+
+async def timed_call(session, url, method, headers, params, data):
+    """(seconds, bytes, error) of one call"""
+    started = time.perf_counter()
+    try:
+        async with session.request(method, url, headers=headers, params=params, data=data) as response:
+            body = await response.read()
+            status = response.status
+    except asyncio.TimeoutError:
+        return time.perf_counter() - started, 0, 'timeout'
+    except aiohttp.ClientError as e:
+        return time.perf_counter() - started, 0, type(e).__name__
+    return time.perf_counter() - started, len(body), classify(status, body)
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+def summarize(step, concurrency, results, wall):
+    """Report row of one step at one concurrency level (latency and size over successful calls)"""
+    ok = [(seconds, size) for seconds, size, error in results if error is None]
+    latencies = sorted(seconds * 1000 for seconds, _ in ok)
+    sizes = [size for _, size in ok]
+    return {
+        'step': step['name'],
+        'method': step['method'],
+        'endpoint': step['template'],
+        'concurrency': concurrency,
+        'calls': len(results),
+        'ok': len(ok),
+        'errors': dict(Counter(error for _, _, error in results if error is not None).most_common()),
+        'latency_ms': {
+            **{f"p{p}": percentile(latencies, p) for p in PERCENTILES},
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'max': latencies[-1] if latencies else None,
+        },
+        'throughput_rps': len(results) / wall if wall else None,
+        'bytes': {
+            'mean': sum(sizes) / len(sizes) if sizes else None,
+            'max': max(sizes) if sizes else None,
+            'total': sum(sizes),
+        },
+        'wall_s': wall,
+    }
+
+
+async def run_step(base_url, api_key, step, concurrency, iterations, warmup, timeout):
+    """Make `iterations` calls of a step with `concurrency` in flight"""
+    endpoint, params, data = prepare_api_call(step['method'], step['template'], step['placeholders'],
+                                              step['input_data'])
+    url = f"{base_url}{endpoint}"
+    headers = {'authtoken': api_key}
+    connector = aiohttp.TCPConnector(limit=concurrency, ssl=False)
+    client_timeout = aiohttp.ClientTimeout(total=timeout, connect=min(UPSTREAM_CONNECT_TIMEOUT, timeout))
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        for _ in range(warmup):
+            await timed_call(session, url, step['method'], headers, params, data)
+
+        remaining = iter(range(iterations))
+        results = []
+
+        async def worker():
+            for _ in remaining:
+                results.append(await timed_call(session, url, step['method'], headers, params, data))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, iterations))))
+        wall = time.perf_counter() - started
+    return summarize(step, concurrency, results, wall)
+
+
+async def run_probe(base_url, api_key, steps, levels, iterations, warmup, timeout):
+    """Resolve placeholders, then run every step at every concurrency level"""
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False),
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        known = {}
+        for step in steps:
+            await fill_placeholders(session, base_url, api_key, step, known)
+
+    rows = []
+    for step in steps:
+        for concurrency in levels:
+            rows.append(await run_step(base_url, api_key, step, concurrency, iterations, warmup, timeout))
+    return rows
+
+
+def load_scenario(name):
+    """Steps and settings of a built-in scenario or a scenario file"""
+    if name in SCENARIOS:
+        return {'steps': SCENARIOS[name]}
+    with open(name) as f:
+        return json.load(f)
+
+
+def format_ms(value):
+    return f"{value:.1f}" if value is not None else '-'
+
+
+def print_table(rows):
+    """Plain-text report, errors listed under the table"""
+    columns = f"{'step':<26}{'conc':>5}{'calls':>7}{'ok':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}" \
+              f"{'max ms':>9}{'req/s':>9}{'avg KB':>9}{'max KB':>9}"
+    print(columns)
+    print('-' * len(columns))
+    for row in rows:
+        latency, size = row['latency_ms'], row['bytes']
+        print(f"{row['step'][:25]:<26}{row['concurrency']:>5}{row['calls']:>7}{row['ok']:>7}"
+              f"{format_ms(latency['p50']):>9}{format_ms(latency['p95']):>9}{format_ms(latency['p99']):>9}"
+              f"{format_ms(latency['max']):>9}{row['throughput_rps'] or 0:>9.1f}"
+              f"{(size['mean'] or 0) / 1024:>9.1f}{(size['max'] or 0) / 1024:>9.1f}")
+
+    failed = [row for row in rows if row['errors']]
+    if failed:
+        print('\nErrors')
+        for row in failed:
+            breakdown = ', '.join(f"{error}: {count}" for error, count in row['errors'].items())
+            print(f"  {row['step']} @ {row['concurrency']}: {breakdown}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure SDP portal latency and throughput')
+    parser.add_argument('--scenario', help=f"built-in ({', '.join(SCENARIOS)}) or a JSON scenario file")
+    parser.add_argument('--endpoint', action='append', default=[],
+                        help='Category.action from config.ENDPOINTS or a path (repeatable)')
+    parser.add_argument('--placeholder', action='append', default=[], metavar='NAME=VALUE',
+                        help='value for a {placeholder} (repeatable)')
+    parser.add_argument('--concurrency', default=None, help='comma-separated levels, e.g. 1,4,8 (default 1)')
+    parser.add_argument('--iterations', type=int, default=None, help='calls per step and level (default 50)')
+    parser.add_argument('--warmup', type=int, default=0, help='unmeasured calls before each run')
+    parser.add_argument('--row-count', type=int, default=SDP_PAGE_SIZE, help='row_count of list calls')
+    parser.add_argument('--timeout', type=float, default=UPSTREAM_CALL_TIMEOUT, help='seconds per call')
+    parser.add_argument('--base-url', default=API_BASE_URL)
+    parser.add_argument('--api-key', default=API_KEY)
+    parser.add_argument('--fake', action='store_true', help='probe a fake portal started in this process')
+    parser.add_argument('--fake-latency-ms', type=float, default=20)
+    parser.add_argument('--fake-jitter-ms', type=float, default=10)
+    parser.add_argument('--fake-error-rate', type=float, default=0.0)
+    parser.add_argument('--allow-writes', action='store_true', help='allow POST/PUT/DELETE steps')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario) if args.scenario else {}
+    raw_steps = scenario.get('steps', []) + [{'endpoint': endpoint} for endpoint in args.endpoint]
+    if not raw_steps:
+        raw_steps = SCENARIOS['reads']
+    levels = [int(level) for level in args.concurrency.split(',')] if args.concurrency \
+        else scenario.get('concurrency', [1])
+    levels = [levels] if isinstance(levels, int) else levels
+    iterations = args.iterations or scenario.get('iterations', 50)
+
+    placeholders = dict(item.split('=', 1) for item in args.placeholder)
+    steps = []
+    for raw in raw_steps:
+        step = resolve_step(raw, args.row_count)
+        step['placeholders'] = {**placeholders, **step['placeholders']}
+        steps.append(step)
+    writes = [step['name'] for step in steps if step['method'] != 'GET']
+    if writes and not args.allow_writes:
+        raise SystemExit(f"Steps {', '.join(writes)} write to the portal; pass --allow-writes to run them")
+
+    base_url, api_key, stop = args.base_url, args.api_key, None
+    if args.fake:
+        from fake_sdp import start_in_thread
+        base_url, stop = start_in_thread(latency_ms=args.fake_latency_ms, jitter_ms=args.fake_jitter_ms,
+                                         error_rate=args.fake_error_rate)
+        api_key = 'fake'
+
+    try:
+        rows = asyncio.run(run_probe(base_url, api_key, steps, levels, iterations, args.warmup, args.timeout))
+    finally:
+        if stop:
+            stop()
+
+    if args.json:
+        json.dump({'base_url': base_url, 'iterations': iterations, 'results': rows}, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"Portal: {base_url}, {iterations} calls per step and level\n")
+        print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
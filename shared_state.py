@@ -0,0 +1,467 @@
+"""
+Shared state for caches, rate limits and job leases
+Caches and limiters that live in module dicts only work with a single
+worker process. They go through the backend configured by
+SHARED_STATE_URL instead:
+
+    memory://                 this process only (default, one worker)
+    sqlite:///state.db        every worker on one host (relative to the
+                              instance folder; sqlite:////abs/path.db)
+    redis://host:6379/0       every worker anywhere (Redis or any server
+                              speaking its protocol, e.g. Valkey or KeyDB)
+
+Values are Python objects; the SQLite and Redis backends pickle them, so
+only point them at stores this app trusts.
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from config import (SHARED_STATE_URL, SHARED_STATE_PREFIX, SHARED_STATE_MEMORY_BUDGETS,
+                    SINGLEFLIGHT_LOCK_TTL, SINGLEFLIGHT_WAIT, SINGLEFLIGHT_RESULT_TTL, SHARED_LOCK_TTL,
+                    SHARED_LOCK_WAIT)
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+SINGLEFLIGHT_POLL = 0.05  # seconds between checks for a leader's result
+MEMORY_SWEEP_EVERY = 1000  # stores between sweeps of expired keys in the memory backend
+
+
+class MemoryBackend:
+    """
+    Process-local store
+    Every backend has the same interface: get, get_many, set, add (set if
+    absent), delete, delete_if and renew (delete / reset the ttl of a key
+    while it still holds a value) and incr (atomic counter); ttl is in
+    seconds.
+
+    Values set() under a prefix of `budgets` are cache entries, evicted
+    least recently used first once their namespace is over its entry or
+    byte budget. Everything else (leases and locks taken with add(),
+    counters) is never evicted, only dropped once expired.
+    """
+
+    def __init__(self, budgets=SHARED_STATE_MEMORY_BUDGETS):
+        self.budgets = budgets
+        self._data = {}  # key -> (expires_at, value)
+        self._pools = {prefix: OrderedDict() for prefix in budgets}  # prefix -> {key: size} in LRU order
+        self._pool_bytes = dict.fromkeys(budgets, 0)
+        self._stores = 0
+        self._lock = threading.Lock()
+
+    def _pool_of(self, key):
+        return next((prefix for prefix in self.budgets if key.startswith(prefix)), None)
+
+    def _remove(self, key):
+        self._data.pop(key, None)
+        prefix = self._pool_of(key)
+        if prefix is not None and key in self._pools[prefix]:
+            self._pool_bytes[prefix] -= self._pools[prefix].pop(key)
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry and entry[0] is not None and entry[0] <= now:
+            self._remove(key)
+            return None
+        if entry:
+            prefix = self._pool_of(key)
+            if prefix is not None and key in self._pools[prefix]:
+                self._pools[prefix].move_to_end(key)
+        return entry
+
+    def _store(self, key, value, ttl, cached=False):
+        self._remove(key)
+        self._data[key] = (time.time() + ttl if ttl else None, value)
+        prefix = self._pool_of(key) if cached else None
+        if prefix is not None:
+            budget = self.budgets[prefix]
+            pool = self._pools[prefix]
+            size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) if budget.get('bytes') else 0
+            if size > budget.get('bytes', size):
+                del self._data[key]  # would evict the whole namespace and still not fit
+                return
+            pool[key] = size
+            self._pool_bytes[prefix] += size
+            while pool and (len(pool) > budget.get('entries', len(pool)) or
+                            self._pool_bytes[prefix] > budget.get('bytes', self._pool_bytes[prefix])):
+                evicted, evicted_size = pool.popitem(last=False)
+                self._pool_bytes[prefix] -= evicted_size
+                del self._data[evicted]
+
+        self._stores += 1
+        if self._stores % MEMORY_SWEEP_EVERY == 0:
+            now = time.time()
+            for expired in [k for k, (expires_at, _) in self._data.items()
+                            if expires_at is not None and expires_at <= now]:
+                self._remove(expired)
+
+    def get(self, key):
+        """Value of a key, or None if missing or expired"""
+        with self._lock:
+            entry = self._live(key, time.time())
+        return entry[1] if entry else None
+
+    def get_many(self, keys):
+        """Values of several keys (None for missing ones)"""
+        now = time.time()
+        with self._lock:
+            entries = [self._live(key, now) for key in keys]
+        return [entry[1] if entry else None for entry in entries]
+
+    def set(self, key, value, ttl=None):
+        """Store a value"""
+        with self._lock:
+            self._store(key, value, ttl, cached=True)
+
+    def add(self, key, value, ttl=None):
+        """Store a value unless the key exists; True if stored"""
+        with self._lock:
+            if self._live(key, time.time()):
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def delete(self, key):
+        """Remove a key"""
+        with self._lock:
+            self._remove(key)
+
+    def delete_if(self, key, value):
+        """Remove a key only while it still holds `value`; True if removed"""
+        with self._lock:
+            entry = self._live(key, time.time())
+            if not entry or entry[1] != value:
+                return False
+            self._remove(key)
+            return True
+
+    def renew(self, key, value, ttl=None):
+        """Reset a key's ttl while it still holds `value`; True if renewed"""
+        with self._lock:
+            entry = self._live(key, time.time())
+            if not entry or entry[1] != value:
+                return False
+            self._data[key] = (time.time() + ttl if ttl else None, value)
+            return True
+
+    def incr(self, key, amount=1, ttl=None):
+        """Add to a counter (created with `ttl`) and return its new value"""
+        with self._lock:
+            entry = self._live(key, time.time())
+            if entry:
+                value = entry[1] + amount
+                self._data[key] = (entry[0], value)
+            else:
+                value = amount
+                self._store(key, value, ttl)
+            return value
+
+
+class SQLiteBackend:
+    """Store shared by the workers of one host through a SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            'CREATE TABLE IF NOT EXISTS shared_state (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)'
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _purge(self, conn, now):
+        """Occasionally drop expired rows (reads ignore them anyway)"""
+        if random.random() < 0.01:
+            conn.execute('DELETE FROM shared_state WHERE expires_at <= ?', (now,))
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        found = {}
+        conn = self._conn()
+        now = time.time()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = conn.execute(
+                f"SELECT key, value FROM shared_state WHERE key IN ({','.join('?' * len(chunk))}) "
+                f"AND (expires_at IS NULL OR expires_at > ?)", (*chunk, now)
+            )
+            found.update((key, pickle.loads(value)) for key, value in rows)
+        return [found.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('INSERT OR REPLACE INTO shared_state VALUES (?, ?, ?)',
+                     (key, pickle.dumps(value), now + ttl if ttl else None))
+        self._purge(conn, now)
+
+    def add(self, key, value, ttl=None):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM shared_state WHERE key = ? AND expires_at <= ?', (key, now))
+            added = conn.execute('INSERT OR IGNORE INTO shared_state VALUES (?, ?, ?)',
+                                 (key, pickle.dumps(value), now + ttl if ttl else None)).rowcount == 1
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return added
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM shared_state WHERE key = ?', (key,))
+
+    def delete_if(self, key, value):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT value FROM shared_state WHERE key = ? '
+                               'AND (expires_at IS NULL OR expires_at > ?)', (key, time.time())).fetchone()
+            deleted = row is not None and pickle.loads(row[0]) == value
+            if deleted:
+                conn.execute('DELETE FROM shared_state WHERE key = ?', (key,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return deleted
+
+    def renew(self, key, value, ttl=None):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT value FROM shared_state WHERE key = ? '
+                               'AND (expires_at IS NULL OR expires_at > ?)', (key, now)).fetchone()
+            renewed = row is not None and pickle.loads(row[0]) == value
+            if renewed:
+                conn.execute('UPDATE shared_state SET expires_at = ? WHERE key = ?',
+                             (now + ttl if ttl else None, key))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return renewed
+
+    def incr(self, key, amount=1, ttl=None):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT value, expires_at FROM shared_state WHERE key = ? '
+                               'AND (expires_at IS NULL OR expires_at > ?)', (key, now)).fetchone()
+            value = (pickle.loads(row[0]) if row else 0) + amount
+            expires_at = row[1] if row else (now + ttl if ttl else None)
+            conn.execute('INSERT OR REPLACE INTO shared_state VALUES (?, ?, ?)',
+                         (key, pickle.dumps(value), expires_at))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+
+class RedisBackend:
+    """Store shared by every worker through a Redis-protocol server"""
+
+    def __init__(self, client, prefix=SHARED_STATE_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url):
+        if redis is None:
+            raise RuntimeError('SHARED_STATE_URL is a redis:// URL but the redis package is not installed')
+        return cls(redis.Redis.from_url(url))
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def _load(self, value):
+        if value is None:
+            return None
+        # Counters are plain integers (so INCRBY works), everything else is pickled
+        return int(value) if value.lstrip(b'-').isdigit() else pickle.loads(value)
+
+    def get(self, key):
+        return self._load(self.client.get(self._key(key)))
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [self._load(value) for value in self.client.mget([self._key(key) for key in keys])]
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self._key(key), pickle.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(self._key(key), pickle.dumps(value), nx=True,
+                                    px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def delete_if(self, key, value):
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(self._key(key))
+                if self._load(pipe.get(self._key(key))) != value:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.delete(self._key(key))
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def renew(self, key, value, ttl=None):
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(self._key(key))
+                if self._load(pipe.get(self._key(key))) != value:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                if ttl:
+                    pipe.pexpire(self._key(key), int(ttl * 1000))
+                else:
+                    pipe.persist(self._key(key))
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def incr(self, key, amount=1, ttl=None):
+        pipe = self.client.pipeline()
+        if ttl:
+            # Starts a new counter with its expiry, leaves a running one alone
+            pipe.set(self._key(key), 0, nx=True, px=int(ttl * 1000))
+        pipe.incrby(self._key(key), amount)
+        return pipe.execute()[-1]
+
+
+def open_backend(url, base_dir=None):
+    """Backend for a SHARED_STATE_URL"""
+    if url.startswith('memory://'):
+        return MemoryBackend()
+    if url.startswith('sqlite:///'):
+        # Same form as SQLAlchemy URLs: sqlite:///relative.db, sqlite:////absolute.db
+        path = url[len('sqlite:///'):]
+        if not os.path.isabs(path):
+            path = os.path.join(base_dir or '.', path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return SQLiteBackend(path)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend.from_url(url)
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend():
+    """The configured backend (memory until init_shared_state has run)"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = open_backend(SHARED_STATE_URL)
+        return _backend
+
+
+def rate_limit_wait(key, limit, window):
+    """
+    Count one call against `limit` calls per `window` seconds (fixed
+    windows shared by every worker)
+
+    Returns:
+        0 if the call may go ahead, else seconds until the next window
+    """
+    now = time.time()
+    slot = int(now // window)
+    if backend().incr(f"rate:{key}:{slot}", ttl=window * 2) <= limit:
+        return 0
+    return (slot + 1) * window - now
+
+
+@contextmanager
+def shared_lock(key, ttl=SHARED_LOCK_TTL, wait=SHARED_LOCK_WAIT):
+    """
+    Hold `key` exclusively across workers for the duration of the block
+    (a lease with a random token, released only while it is still ours)
+
+    Raises:
+        TimeoutError if another holder doesn't let go within `wait` seconds
+    """
+    store = backend()
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    while not store.add(f"lock:{key}", token, ttl=ttl):
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Timed out waiting for lock {key}")
+        time.sleep(SINGLEFLIGHT_POLL)
+    try:
+        yield
+    finally:
+        store.delete_if(f"lock:{key}", token)
+
+
+def singleflight(key, fn, wait=SINGLEFLIGHT_WAIT):
+    """
+    Run fn() once for concurrent callers of the same key, across workers
+
+    The first caller computes the result and publishes it briefly; the
+    others wait for it (up to `wait` seconds) instead of repeating the
+    upstream work. If the leader fails or takes too long they run fn()
+    themselves.
+    """
+    store = backend()
+    lock_key = f"flight:{key}"
+    token = uuid.uuid4().hex
+    if store.add(lock_key, token, ttl=SINGLEFLIGHT_LOCK_TTL):
+        try:
+            result = fn()
+            store.set(f"flight:{key}:{token}", result, ttl=SINGLEFLIGHT_RESULT_TTL)
+            return result
+        finally:
+            store.delete_if(lock_key, token)
+
+    leader = store.get(lock_key)
+    deadline = time.monotonic() + wait
+    while leader and time.monotonic() < deadline:
+        # The leader publishes its result before releasing the lock
+        done = store.get(lock_key) != leader
+        result = store.get(f"flight:{key}:{leader}")
+        if result is not None:
+            return result
+        if done:
+            break
+        time.sleep(SINGLEFLIGHT_POLL)
+    return fn()
+
+
+def init_shared_state(app):
+    """Open the configured backend, resolving relative SQLite paths under the instance folder"""
+    global _backend
+    with _backend_lock:
+        _backend = open_backend(SHARED_STATE_URL, base_dir=app.instance_path)
@@ -6,9 +6,24 @@ from flask import render_template, jsonify, request
 from flask_login import login_required, current_user
 from app import app
 from decorators import requires_permission, get_appropriate_credential
-import requests
 import json
+import asyncio
+import json_codec
 from datetime import datetime
+from config import SITE_MATRIX_MAX_PAGE
+from sdp_client import (run_async, client_session, async_api_call_with_credential,
+                        fetch_all_pages, gather_bounded, credential_key)
+from models import BulkPlan, BulkPlanItem
+from bulk_engine import create_plan, create_rollback_plan, apply_plan, plan_summary, put_failed, response_error
+from site_matrix_snapshot import (build_snapshot, encode_compact, get_cached_snapshot, store_snapshot,
+                                  slice_snapshot, list_departments,
+                                  resolve_site_ids, apply_site_update, plan_rule,
+                                  get_cached_details, store_details, invalidate_details, matrix_channel,
+                                  snapshot_version)
+from live_events import event_stream, sse_response
+from http_cache import conditional_json
+from upstream_guard import guarded_request
+from shared_state import singleflight
 
 
 def api_call_with_credential(credential, method, endpoint, params=None, data=None):
@@ -18,14 +33,14 @@ def api_call_with_credential(credential, method, endpoint, params=None, data=Non
 
     try:
         if method.upper() == "GET":
-            response = requests.get(url, headers=headers, params=params, verify=False)
+            response = guarded_request("GET", url, credential.api_base_url, headers=headers, params=params)
         elif method.upper() == "PUT":
-            response = requests.put(url, headers=headers, data=data, verify=False)
+            response = guarded_request("PUT", url, credential.api_base_url, headers=headers, data=data)
 
         return {
             "success": True,
             "status_code": response.status_code,
-            "data": response.json() if response.text else {},
+            "data": json_codec.loads(response.content) if response.content else {},
             "raw": response.text
         }
     except Exception as e:
@@ -35,6 +50,160 @@ def api_call_with_credential(credential, method, endpoint, params=None, data=Non
         }
 
 
+async def _fetch_matrix_lists(credential):
+    """Fetch all technician and site pages concurrently"""
+    async with client_session() as session:
+        techs_response, sites_response = await asyncio.gather(
+            fetch_all_pages(session, credential, '/technicians', 'technicians'),
+            fetch_all_pages(session, credential, '/sites', 'sites')
+        )
+
+        # If sites endpoint doesn't exist, try accounts
+        if not sites_response['success'] or not sites_response['items']:
+            sites_response = await fetch_all_pages(session, credential, '/accounts', 'accounts')
+
+    return techs_response, sites_response
+
+
+async def _fetch_technician_details(credential, tech_ids):
+    """Fetch GET /technicians/{id} for many technicians concurrently"""
+    async with client_session() as session:
+        return await gather_bounded(
+            async_api_call_with_credential(session, credential, 'GET', f'/technicians/{tech_id}')
+            for tech_id in tech_ids
+        )
+
+
+def fetch_technician_details(credential, tech_ids):
+    """
+    Get GET /technicians/{id} payloads for many technicians
+    Served from the per-technician cache where possible, the rest are
+    fetched concurrently and cached (entries are dropped on PUT)
+
+    Returns:
+        ({tech_id: technician}, [{technician_id, error}])
+    """
+    details, missing = get_cached_details(credential, tech_ids)
+    if not missing:
+        return details, []
+
+    failed = []
+    fetched = []
+    responses = run_async(_fetch_technician_details(credential, missing))
+    for tech_id, response in zip(missing, responses):
+        technician = response['data'].get('technician') if response['success'] else None
+        if not technician:
+            failed.append({
+                'technician_id': tech_id,
+                'error': response.get('error', 'Technician not found')
+            })
+            continue
+        fetched.append(technician)
+        details[str(tech_id)] = technician
+
+    store_details(credential, fetched)
+    return details, failed
+
+
+def _hydrate_technicians(credential, technicians_data):
+    """
+    Fill in associated_sites for list entries that don't carry it
+
+    The list endpoint only returns associations when the portal includes
+    them; the rest are taken from per-technician details.
+
+    Returns:
+        (technicians, None) or (None, error message)
+    """
+    missing = [tech['id'] for tech in technicians_data if 'associated_sites' not in tech]
+    if not missing:
+        return technicians_data, None
+
+    details, failed = fetch_technician_details(credential, missing)
+    if failed:
+        # A technician without its real sites would look unassigned and
+        # could be wiped by a delta save, so don't build a partial matrix
+        return None, f"Failed to fetch site associations for {len(failed)} technician(s): {failed[0]['error']}"
+
+    technicians = []
+    for tech in technicians_data:
+        detail = details.get(str(tech['id']))
+        if detail is not None:
+            tech = dict(tech, associated_sites=detail.get('associated_sites') or [])
+        technicians.append(tech)
+    return technicians, None
+
+
+def load_matrix_snapshot(credential, refresh=False):
+    """
+    Get the matrix snapshot for a credential, fetching from SDP when the
+    cache is empty, stale or a refresh is requested
+
+    Returns:
+        (snapshot, None) or (None, error message)
+    """
+    if refresh:
+        invalidate_details(credential)
+    else:
+        snapshot = get_cached_snapshot(credential)
+        if snapshot:
+            return snapshot, None
+
+    def fetch():
+        techs_response, sites_response = run_async(_fetch_matrix_lists(credential))
+        if not techs_response['success']:
+            return None, f"Failed to fetch technicians: {techs_response.get('error')}"
+
+        technicians_data, error = _hydrate_technicians(credential, techs_response['items'])
+        if error:
+            return None, error
+
+        sites_data = sites_response['items'] if sites_response['success'] else []
+        snapshot = build_snapshot(technicians_data, sites_data)
+        store_snapshot(credential, snapshot)
+        return snapshot, None
+
+    # Concurrent loads (from any worker) share one fetch
+    return singleflight(f"matrix:{credential_key(credential)}", fetch)
+
+
+def _split_ids(value):
+    """Parse a comma separated ID list query param (None if absent)"""
+    if value is None:
+        return None
+    return [item for item in value.split(',') if item]
+
+
+def _target_site_ids(admin_cred, tech_id, update):
+    """
+    Work out the full site list to PUT for one technician
+
+    Accepts either the full `site_ids` list or `add_site_ids`/`remove_site_ids`
+    deltas. Deltas are applied to the technician's sites as the portal has
+    them right now (not the cached snapshot, which may be minutes old), so
+    the full-list PUT doesn't revert changes made since.
+
+    Returns:
+        (site_ids, None) or (None, error message)
+    """
+    if 'site_ids' in update:
+        return [str(site_id) for site_id in update['site_ids']], None
+
+    response = api_call_with_credential(admin_cred, 'GET', f'/technicians/{tech_id}')
+    if response['success'] and response['status_code'] == 404:
+        return None, f"Technician {tech_id} not found"
+    if not response['success'] or response['status_code'] >= 400:
+        return None, f"Failed to read technician {tech_id}: {response_error(response)}"
+    technician = response['data'].get('technician') if isinstance(response['data'], dict) else None
+    if not technician:
+        return None, f"Technician {tech_id} not found"
+
+    current_site_ids = [site['id'] for site in technician.get('associated_sites') or []]
+    return resolve_site_ids(current_site_ids,
+                            update.get('add_site_ids'),
+                            update.get('remove_site_ids')), None
+
+
 @app.route('/tools/site-matrix')
 @login_required
 def site_matrix():
@@ -48,6 +217,22 @@ def get_site_matrix_data():
     """
     Get all technicians and sites for matrix display
     Returns both lists to build the matrix
+
+    Query params:
+        format=bitset - compact encoding (ID arrays + base64 association bitsets)
+        refresh=1 - refetch from SDP instead of using the cached snapshot
+
+    Paging/filter params (any of them switches to a compact, sliced response):
+        row_offset, row_limit - technician window
+        col_offset, col_limit - site window
+        search - technician name/email substring
+        department, status - exact technician filters
+        technician_ids, site_ids - comma separated ID subsets
+        site_search - site name/account substring
+
+    Responses carry an ETag tied to the snapshot version; a matching
+    If-None-Match gets a 304. If SDP can't be reached the last cached
+    snapshot is served with stale: true.
     """
     # Get admin credential (required for reading all technicians)
     admin_cred = get_appropriate_credential(current_user, 'admin')
@@ -61,91 +246,87 @@ def get_site_matrix_data():
             'error': 'No API credential configured. Please add credentials in your profile.'
         }), 403
 
-    # Fetch all technicians
-    techs_response = api_call_with_credential(
-        admin_cred,
-        'GET',
-        '/technicians',
-        params={
-            'input_data': json.dumps({
-                "list_info": {
-                    "row_count": 100,
-                    "start_index": 1
-                }
-            })
-        }
-    )
+    snapshot, error = load_matrix_snapshot(admin_cred, refresh=request.args.get('refresh') == '1')
+    stale = None
+    if error:
+        # The portal is failing: show the last matrix we had, flagged as stale
+        stale = get_cached_snapshot(admin_cred, allow_stale=True)
+        if not stale:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 500
+        snapshot = stale
+
+    paged = any(arg in request.args for arg in (
+        'row_offset', 'row_limit', 'col_offset', 'col_limit', 'search', 'department',
+        'status', 'technician_ids', 'site_ids', 'site_search'
+    ))
+
+    def build():
+        if paged:
+            view = slice_snapshot(
+                snapshot,
+                search=request.args.get('search'),
+                department=request.args.get('department'),
+                status=request.args.get('status'),
+                technician_ids=_split_ids(request.args.get('technician_ids')),
+                site_ids=_split_ids(request.args.get('site_ids')),
+                site_search=request.args.get('site_search'),
+                row_offset=max(request.args.get('row_offset', 0, type=int), 0),
+                row_limit=min(request.args.get('row_limit', SITE_MATRIX_MAX_PAGE, type=int), SITE_MATRIX_MAX_PAGE),
+                col_offset=max(request.args.get('col_offset', 0, type=int), 0),
+                col_limit=min(request.args.get('col_limit', SITE_MATRIX_MAX_PAGE, type=int), SITE_MATRIX_MAX_PAGE)
+            )
+        else:
+            view = snapshot
 
-    if not techs_response['success']:
-        return jsonify({
-            'success': False,
-            'error': f"Failed to fetch technicians: {techs_response.get('error')}"
-        }), 500
+        # Compact wire format: ordered ID arrays + per-technician bitsets
+        if paged or request.args.get('format') == 'bitset':
+            payload = encode_compact(view)
+            if paged:
+                payload['row_offset'] = view['row_offset']
+                payload['col_offset'] = view['col_offset']
+                payload['departments'] = list_departments(snapshot)
+            return {'success': True, **payload, **stale_info}
 
-    # Fetch all sites/accounts
-    sites_response = api_call_with_credential(
-        admin_cred,
-        'GET',
-        '/sites',
-        params={
-            'input_data': json.dumps({
-                "list_info": {
-                    "row_count": 100,
-                    "start_index": 1
-                }
-            })
+        return {
+            'success': True,
+            **stale_info,
+            'technicians': snapshot['technicians'],
+            'sites': snapshot['sites'],
+            'version': snapshot['version'],
+            'total_technicians': len(snapshot['technicians']),
+            'total_sites': len(snapshot['sites'])
         }
-    )
 
-    # If sites endpoint doesn't exist, try accounts
-    if not sites_response['success'] or not sites_response['data'].get('sites'):
-        sites_response = api_call_with_credential(
-            admin_cred,
-            'GET',
-            '/accounts',
-            params={
-                'input_data': json.dumps({
-                    "list_info": {
-                        "row_count": 100,
-                        "start_index": 1
-                    }
-                })
-            }
-        )
+    stale_info = {'stale': True, 'upstream_error': error, 'built_at': snapshot['built_at']} if stale else {}
+    view_args = sorted((key, value) for key, value in request.args.items(multi=True) if key != 'refresh')
+    return conditional_json((*snapshot_version(admin_cred, snapshot), view_args, bool(stale)), build)
 
-    technicians_data = techs_response['data'].get('technicians', [])
-    sites_data = sites_response['data'].get('sites', sites_response['data'].get('accounts', []))
 
-    # Build simplified data structure
-    technicians = []
-    for tech in technicians_data:
-        associated_site_ids = [site['id'] for site in tech.get('associated_sites', [])]
-
-        technicians.append({
-            'id': tech['id'],
-            'name': tech.get('name', 'Unknown'),
-            'email': tech.get('email_id', ''),
-            'status': tech.get('status', 'ACTIVE'),
-            'department': tech.get('department', {}).get('name', ''),
-            'associated_sites': tech.get('associated_sites', []),
-            'associated_site_ids': associated_site_ids
-        })
+@app.route('/api/tools/site-matrix/events', methods=['GET'])
+@login_required
+def site_matrix_events():
+    """
+    Server-Sent Events stream of matrix changes for the user's credential
 
-    sites = []
-    for site in sites_data:
-        sites.append({
-            'id': site['id'],
-            'name': site.get('name', 'Unknown'),
-            'account': site.get('account', {}).get('name', '') if 'account' in site else ''
-        })
+    Events:
+        technician - {technician_id, site_ids, version} after a successful save
+        reload - {version} when a rebuilt snapshot differs from the cached one
+        reset - events since Last-Event-ID are gone, reload everything
+    """
+    admin_cred = get_appropriate_credential(current_user, 'admin')
+    if not admin_cred:
+        admin_cred = get_appropriate_credential(current_user, 'technician')
 
-    return jsonify({
-        'success': True,
-        'technicians': technicians,
-        'sites': sites,
-        'total_technicians': len(technicians),
-        'total_sites': len(sites)
-    })
+    if not admin_cred:
+        return jsonify({
+            'success': False,
+            'error': 'No API credential configured'
+        }), 403
+
+    return sse_response(event_stream({matrix_channel(admin_cred)}, request.headers.get('Last-Event-ID')))
 
 
 @app.route('/api/tools/site-matrix/technician/<int:tech_id>', methods=['GET'])
@@ -162,16 +343,14 @@ def get_technician_details(tech_id):
             'error': 'No API credential configured'
         }), 403
 
-    response = api_call_with_credential(
-        admin_cred,
-        'GET',
-        f'/technicians/{tech_id}'
-    )
-
-    if not response['success']:
-        return jsonify(response), 500
+    details, failed = fetch_technician_details(admin_cred, [tech_id])
+    if failed:
+        return jsonify({
+            'success': False,
+            'error': failed[0]['error']
+        }), 500
 
-    technician = response['data'].get('technician', {})
+    technician = details[str(tech_id)]
 
     return jsonify({
         'success': True,
@@ -184,16 +363,62 @@ def get_technician_details(tech_id):
     })
 
 
+@app.route('/api/tools/site-matrix/technicians/details', methods=['POST'])
+@login_required
+def get_technicians_details():
+    """
+    Get detailed info for many technicians at once
+    Fetches GET /technicians/{id} concurrently (and cached) instead of one by one
+    """
+    data = request.json or {}
+    tech_ids = data.get('technician_ids', [])
+
+    if not tech_ids:
+        return jsonify({
+            'success': False,
+            'error': 'No technician IDs provided'
+        }), 400
+
+    admin_cred = get_appropriate_credential(current_user, 'admin')
+    if not admin_cred:
+        admin_cred = get_appropriate_credential(current_user, 'technician')
+
+    if not admin_cred:
+        return jsonify({
+            'success': False,
+            'error': 'No API credential configured'
+        }), 403
+
+    details, failed = fetch_technician_details(admin_cred, tech_ids)
+
+    technicians = [
+        {
+            'id': technician['id'],
+            'name': technician.get('name', 'Unknown'),
+            'email': technician.get('email_id', ''),
+            'associated_sites': technician.get('associated_sites', [])
+        }
+        for technician in (details[str(tech_id)] for tech_id in tech_ids if str(tech_id) in details)
+    ]
+
+    return jsonify({
+        'success': True,
+        'technicians': technicians,
+        'failed': failed
+    })
+
+
 @app.route('/api/tools/site-matrix/update', methods=['PUT'])
 @login_required
 def update_technician_sites():
     """
     Update technician's associated sites
     Requires admin credential
+
+    Body: {technician_id, site_ids} or {technician_id, add_site_ids, remove_site_ids}
     """
     data = request.json
     tech_id = data.get('technician_id')
-    new_site_ids = data.get('site_ids', [])
 
     if not tech_id:
         return jsonify({
@@ -209,6 +434,13 @@ def update_technician_sites():
             'error': 'Admin API credential required for updating technicians'
         }), 403
 
+    new_site_ids, error = _target_site_ids(admin_cred, tech_id, data)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+
     # Build associated_sites array from IDs
     associated_sites = [{"id": str(site_id)} for site_id in new_site_ids]
 
@@ -227,7 +459,9 @@ def update_technician_sites():
         data={'input_data': json.dumps(update_data)}
     )
 
-    if response['success']:
+    # A PUT the portal rejected (4xx/5xx) changes neither the snapshot nor live clients
+    if not put_failed(response):
+        apply_site_update(admin_cred, tech_id, new_site_ids)
         return jsonify({
             'success': True,
             'message': f"Updated technician {tech_id} successfully",
@@ -237,7 +471,7 @@ def update_technician_sites():
     else:
         return jsonify({
             'success': False,
-            'error': response.get('error', 'Unknown error'),
+            'error': response_error(response),
             'response': response.get('data')
         }), 500
 
@@ -247,9 +481,13 @@ def update_technician_sites():
 def bulk_update_technician_sites():
     """
     Bulk update multiple technicians' sites
+    The change set is stored as a plan and applied with per-item checkpoints
+    (see bulk_engine.py); the response includes the plan ID for resume/rollback.
     """
     data = request.json
-    updates = data.get('updates', [])  # [{technician_id: 123, site_ids: [1,2,3]}, ...]
+    # [{technician_id: 123, site_ids: [1,2,3]}, ...]
+    # or [{technician_id: 123, add_site_ids: [4], remove_site_ids: [1]}, ...]
+    updates = data.get('updates', [])
 
     if not updates:
         return jsonify({
@@ -264,42 +502,293 @@ def bulk_update_technician_sites():
             'error': 'Admin API credential required'
         }), 403
 
-    results = {
-        'success': [],
-        'failed': [],
-        'total': len(updates)
-    }
+    snapshot, error = load_matrix_snapshot(admin_cred)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 500
 
-    for update in updates:
-        tech_id = update.get('technician_id')
-        site_ids = update.get('site_ids', [])
+    # Persist the change set first so an interrupted apply can be resumed
+    plan = create_plan(current_user.id, admin_cred, snapshot, updates,
+                       description=data.get('description'))
+    results = apply_plan(plan, admin_cred)
 
-        associated_sites = [{"id": str(site_id)} for site_id in site_ids]
-        update_data = {
-            "technician": {
-                "associated_sites": associated_sites
-            }
-        }
+    # Technicians that could not be planned are reported as failures
+    for item in plan.items.filter(BulkPlanItem.state == 'skipped', BulkPlanItem.error.isnot(None)):
+        results['failed'].append({
+            'technician_id': item.technician_id,
+            'error': item.error
+        })
+    results['total'] = len(updates)
 
-        response = api_call_with_credential(
-            admin_cred,
-            'PUT',
-            f'/technicians/{tech_id}',
-            data={'input_data': json.dumps(update_data)}
-        )
+    return jsonify({
+        'success': True,
+        'plan_id': plan.id,
+        'results': results
+    })
 
-        if response['success']:
-            results['success'].append({
-                'technician_id': tech_id,
-                'site_count': len(site_ids)
-            })
-        else:
-            results['failed'].append({
-                'technician_id': tech_id,
-                'error': response.get('error', 'Unknown error')
-            })
+
+RULE_TEXT_FILTERS = ('search', 'department', 'status')
+RULE_ID_FILTERS = ('technician_ids', 'member_of', 'not_member_of')
+
+
+def _id_list(value):
+    """IDs of a list of strings/integers as strings, or None if it isn't one"""
+    if not isinstance(value, list) or not all(isinstance(item, (str, int)) and not isinstance(item, bool)
+                                              for item in value):
+        return None
+    return [str(item) for item in value]
+
+
+def _parse_rule(data):
+    """
+    Validate a mass-assignment rule body
+
+    Body: {action: 'add'|'remove', site_ids: [...],
+           filter: {search, department, status, technician_ids, member_of, not_member_of}}
+
+    Returns:
+        (action, site_ids, filters, None) or (None, None, None, error message)
+    """
+    action = data.get('action')
+    site_ids = _id_list(data.get('site_ids') or [])
+    rule_filter = data.get('filter') or {}
+
+    if action not in ('add', 'remove'):
+        return None, None, None, "Action must be 'add' or 'remove'"
+    if site_ids is None:
+        return None, None, None, 'site_ids must be a list of site IDs'
+    if not site_ids:
+        return None, None, None, 'At least one site is required'
+    if not isinstance(rule_filter, dict):
+        return None, None, None, 'filter must be an object'
+
+    filters = {}
+    for key in RULE_TEXT_FILTERS:
+        value = rule_filter.get(key)
+        if value in (None, ''):
+            continue
+        if not isinstance(value, str):
+            return None, None, None, f"filter.{key} must be a string"
+        filters[key] = value
+    for key in RULE_ID_FILTERS:
+        if rule_filter.get(key) is None:
+            continue
+        ids = _id_list(rule_filter[key])
+        if ids is None:
+            return None, None, None, f"filter.{key} must be a list of IDs"
+        filters[key] = ids
+    return action, site_ids, filters, None
+
+
+def _unknown_sites(snapshot, site_ids):
+    """Error message for rule site IDs the matrix doesn't know, or None"""
+    known = {str(site['id']) for site in snapshot['sites']}
+    unknown = [site_id for site_id in site_ids if site_id not in known]
+    if unknown:
+        return f"Unknown site ID(s): {', '.join(unknown[:10])}"
+    return None
+
+
+def _describe_rule(action, site_ids, filters):
+    """Short human readable rule description (stored on the plan)"""
+    direction = 'to' if action == 'add' else 'from'
+    criteria = ', '.join(f"{key}={value}" for key, value in filters.items()) or 'all technicians'
+    return f"Rule: {action} {len(site_ids)} site(s) {direction} {criteria}"[:255]
+
+
+@app.route('/api/tools/site-matrix/rules/preview', methods=['POST'])
+@login_required
+def preview_site_rule():
+    """
+    Preview a mass assignment rule against the current snapshot
+    Returns how many technicians match and how many actually need a change
+    """
+    action, site_ids, filters, error = _parse_rule(request.json or {})
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+
+    admin_cred = get_appropriate_credential(current_user, 'admin')
+    if not admin_cred:
+        admin_cred = get_appropriate_credential(current_user, 'technician')
+
+    if not admin_cred:
+        return jsonify({
+            'success': False,
+            'error': 'No API credential configured'
+        }), 403
+
+    snapshot, error = load_matrix_snapshot(admin_cred)
+    if error:
+        return jsonify({'success': False, 'error': error}), 500
+    error = _unknown_sites(snapshot, site_ids)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+
+    matched, updates = plan_rule(snapshot, action, site_ids, filters)
+    names = {str(tech['id']): tech['name'] for tech in matched}
+
+    return jsonify({
+        'success': True,
+        'description': _describe_rule(action, site_ids, filters),
+        'matched': len(matched),
+        'affected': len(updates),
+        'unchanged': len(matched) - len(updates),
+        'sample': [
+            {'technician_id': update['technician_id'], 'name': names[update['technician_id']]}
+            for update in updates[:20]
+        ]
+    })
+
+
+@app.route('/api/tools/site-matrix/rules/apply', methods=['POST'])
+@login_required
+def apply_site_rule():
+    """
+    Apply a mass assignment rule
+    The affected set is recomputed from a freshly rebuilt snapshot and only
+    the technicians that need a change are PUT, through a bulk plan.
+    """
+    data = request.json or {}
+    action, site_ids, filters, error = _parse_rule(data)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+
+    admin_cred = get_appropriate_credential(current_user, 'admin')
+    if not admin_cred:
+        return jsonify({
+            'success': False,
+            'error': 'Admin API credential required'
+        }), 403
+
+    # Plan from the portal's current state, not a snapshot that may be minutes old
+    snapshot, error = load_matrix_snapshot(admin_cred, refresh=True)
+    if error:
+        return jsonify({'success': False, 'error': error}), 500
+    error = _unknown_sites(snapshot, site_ids)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+
+    matched, updates = plan_rule(snapshot, action, site_ids, filters)
+    if not updates:
+        return jsonify({
+            'success': True,
+            'plan_id': None,
+            'matched': len(matched),
+            'results': {'success': [], 'failed': [], 'total': 0}
+        })
+
+    plan = create_plan(current_user.id, admin_cred, snapshot, updates,
+                       description=_describe_rule(action, site_ids, filters))
+    results = apply_plan(plan, admin_cred)
+
+    return jsonify({
+        'success': True,
+        'plan_id': plan.id,
+        'matched': len(matched),
+        'results': results
+    })
+
+
+def _get_plan(plan_id):
+    """Load one of the current user's plans (or None)"""
+    return BulkPlan.query.filter_by(id=plan_id, user_id=current_user.id).first()
+
+
+def _plan_credential(plan):
+    """
+    Admin credential to apply a plan with
+    Must point at the same portal the plan was created for
+    """
+    admin_cred = get_appropriate_credential(current_user, 'admin')
+    if not admin_cred:
+        return None, ('Admin API credential required', 403)
+    if admin_cred.api_base_url != plan.api_base_url:
+        return None, (f'Plan was created for {plan.api_base_url}', 409)
+    return admin_cred, None
+
+
+@app.route('/api/tools/site-matrix/plans', methods=['GET'])
+@login_required
+def list_bulk_plans():
+    """List the current user's bulk plans (newest first)"""
+    limit = request.args.get('limit', 20, type=int)
+    plans = BulkPlan.query.filter_by(user_id=current_user.id)\
+        .order_by(BulkPlan.created_at.desc())\
+        .limit(limit)\
+        .all()
+
+    return jsonify({
+        'success': True,
+        'plans': [plan_summary(plan) for plan in plans]
+    })
+
+
+@app.route('/api/tools/site-matrix/plans/<int:plan_id>', methods=['GET'])
+@login_required
+def get_bulk_plan(plan_id):
+    """Get a bulk plan with per-item state"""
+    plan = _get_plan(plan_id)
+    if not plan:
+        return jsonify({'success': False, 'error': 'Plan not found'}), 404
+
+    return jsonify({
+        'success': True,
+        'plan': plan_summary(plan, include_items=True)
+    })
+
+
+@app.route('/api/tools/site-matrix/plans/<int:plan_id>/resume', methods=['POST'])
+@login_required
+def resume_bulk_plan(plan_id):
+    """
+    Resume an interrupted plan
+    Only items that have not been applied yet are sent; pass
+    {"retry_failed": true} to also retry failed items.
+    """
+    plan = _get_plan(plan_id)
+    if not plan:
+        return jsonify({'success': False, 'error': 'Plan not found'}), 404
+
+    admin_cred, error = _plan_credential(plan)
+    if error:
+        return jsonify({'success': False, 'error': error[0]}), error[1]
+
+    data = request.json or {}
+    results = apply_plan(plan, admin_cred, retry_failed=data.get('retry_failed', False))
+    if results is None:
+        return jsonify({'success': False, 'error': 'Plan is already being applied'}), 409
+
+    return jsonify({
+        'success': True,
+        'plan': plan_summary(plan),
+        'results': results
+    })
+
+
+@app.route('/api/tools/site-matrix/plans/<int:plan_id>/rollback', methods=['POST'])
+@login_required
+def rollback_bulk_plan(plan_id):
+    """
+    Build a rollback plan restoring the pre-change sites of every applied
+    item, and apply it unless {"apply": false} is passed
+    """
+    plan = _get_plan(plan_id)
+    if not plan:
+        return jsonify({'success': False, 'error': 'Plan not found'}), 404
+
+    admin_cred, error = _plan_credential(plan)
+    if error:
+        return jsonify({'success': False, 'error': error[0]}), error[1]
+
+    rollback = create_rollback_plan(plan)
+
+    data = request.json or {}
+    results = apply_plan(rollback, admin_cred) if data.get('apply', True) else None
 
     return jsonify({
         'success': True,
+        'plan': plan_summary(rollback),
         'results': results
     })
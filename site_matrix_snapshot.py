@@ -0,0 +1,395 @@
+"""
+Technician-Site matrix snapshot helpers
+Normalizes SDP technician/site lists, caches the resulting snapshot (and
+per-technician details) per credential, slices it for paging and encodes
+the association grid
+"""
+import base64
+import hashlib
+import json
+import time
+
+from config import SITE_MATRIX_SNAPSHOT_TTL, SITE_MATRIX_DETAIL_TTL
+from sdp_client import credential_key
+from shared_state import backend, shared_lock
+from live_events import publish
+
+# Snapshots live in the shared state backend:
+#   matrix:snapshot:<credential key> -> snapshot
+#   matrix:details:<credential key>:<generation>:<technician ID> -> technician
+# Versions come from one shared counter, so every worker agrees on them.
+# Read-modify-writes of a snapshot hold the shared lock matrix:<credential key>
+# so workers don't overwrite each other's changes.
+
+
+def _next_version():
+    """Next snapshot version"""
+    version = backend().incr('matrix:version')
+    if version == 1:
+        # The counter (re)started: earlier versions may come back, so start a new epoch
+        backend().set('matrix:epoch', f"{time.time():.6f}")
+    return version
+
+
+def _versions_epoch():
+    """Start of the current version sequence"""
+    store = backend()
+    store.add('matrix:epoch', f"{time.time():.6f}")
+    return store.get('matrix:epoch')
+
+
+def _snapshot_key(credential):
+    """Shared state key of a credential's snapshot"""
+    return f"matrix:snapshot:{credential_key(credential)}"
+
+
+def _snapshot_lock(credential):
+    """Shared lock over a credential's snapshot"""
+    return shared_lock(f"matrix:{credential_key(credential)}")
+
+
+def build_snapshot(technicians_data, sites_data):
+    """
+    Build the simplified matrix structure from raw SDP list data
+
+    Sites referenced by a technician but missing from the site list are
+    appended so no existing association is dropped on save.
+
+    Returns:
+        {"technicians": [...], "sites": [...]}
+    """
+    sites = []
+    known_site_ids = set()
+    for site in sites_data:
+        sites.append({
+            'id': site['id'],
+            'name': site.get('name', 'Unknown'),
+            'account': site.get('account', {}).get('name', '') if 'account' in site else ''
+        })
+        known_site_ids.add(site['id'])
+
+    technicians = []
+    for tech in technicians_data:
+        associated_sites = tech.get('associated_sites') or []
+        associated_site_ids = [site['id'] for site in associated_sites]
+
+        for site in associated_sites:
+            if site['id'] not in known_site_ids:
+                sites.append({
+                    'id': site['id'],
+                    'name': site.get('name', 'Unknown'),
+                    'account': ''
+                })
+                known_site_ids.add(site['id'])
+
+        technicians.append({
+            'id': tech['id'],
+            'name': tech.get('name', 'Unknown'),
+            'email': tech.get('email_id', ''),
+            'status': tech.get('status', 'ACTIVE'),
+            'department': (tech.get('department') or {}).get('name', ''),
+            'associated_sites': associated_sites,
+            'associated_site_ids': associated_site_ids
+        })
+
+    return {
+        'technicians': technicians,
+        'sites': sites,
+        'version': _next_version(),
+        'built_at': time.time()
+    }
+
+
+def get_cached_snapshot(credential, allow_stale=False):
+    """Return the cached snapshot for a credential if it is still fresh (or at all, with allow_stale)"""
+    snapshot = backend().get(_snapshot_key(credential))
+    if snapshot and (allow_stale or time.time() - snapshot['built_at'] < SITE_MATRIX_SNAPSHOT_TTL):
+        return snapshot
+    return None
+
+
+def matrix_channel(credential):
+    """Live event channel of a credential's matrix"""
+    return f"matrix:{credential_key(credential)}"
+
+
+def snapshot_fingerprint(snapshot):
+    """Hash of everything the matrix shows (used to detect real changes on rebuild)"""
+    content = [
+        [[t['id'], t['name'], t['status'], t['department'], sorted(str(s) for s in t['associated_site_ids'])]
+         for t in snapshot['technicians']],
+        [[s['id'], s['name'], s['account']] for s in snapshot['sites']]
+    ]
+    return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+
+def store_snapshot(credential, snapshot):
+    """Cache a freshly built snapshot, announcing it if the matrix changed"""
+    try:
+        with _snapshot_lock(credential):
+            previous = backend().get(_snapshot_key(credential))
+            if previous and snapshot_fingerprint(previous) == snapshot_fingerprint(snapshot):
+                # Same matrix: keep its version so cached copies stay valid
+                snapshot['version'] = previous['version']
+            backend().set(_snapshot_key(credential), snapshot)
+    except TimeoutError:
+        return  # another worker is busy with the snapshot; this build is only served to our caller
+
+    if previous and previous['version'] != snapshot['version']:
+        publish(matrix_channel(credential), 'reload', {'version': snapshot['version']})
+
+
+def snapshot_version(credential, snapshot):
+    """Validator for responses built from a snapshot (changes whenever the snapshot does)"""
+    return _versions_epoch(), credential_key(credential), snapshot['version']
+
+
+def invalidate_snapshot(credential):
+    """Drop the cached snapshot so the next read refetches from SDP"""
+    backend().delete(_snapshot_key(credential))
+
+
+def get_cached_details(credential, tech_ids):
+    """
+    Look up fresh GET /technicians/{id} payloads
+
+    Returns:
+        ({tech_id: technician} for cache hits, [tech_ids still to fetch])
+    """
+    prefix = _details_prefix(credential)
+    entries = backend().get_many([f"{prefix}{tech_id}" for tech_id in tech_ids])
+    found, missing = {}, []
+    for tech_id, technician in zip(tech_ids, entries):
+        if technician is not None:
+            found[str(tech_id)] = technician
+        else:
+            missing.append(tech_id)
+    return found, missing
+
+
+def _details_prefix(credential):
+    """Shared state key prefix of a credential's current technician details"""
+    key = credential_key(credential)
+    generation = backend().get(f"matrix:details:{key}:generation") or 0
+    return f"matrix:details:{key}:{generation}:"
+
+
+def store_details(credential, technicians):
+    """Cache GET /technicians/{id} payloads"""
+    prefix = _details_prefix(credential)
+    for technician in technicians:
+        backend().set(f"{prefix}{technician['id']}", technician, ttl=SITE_MATRIX_DETAIL_TTL)
+
+
+def invalidate_details(credential, tech_id=None):
+    """Drop one technician's cached details, or all of a credential's"""
+    if tech_id is not None:
+        backend().delete(f"{_details_prefix(credential)}{tech_id}")
+    else:
+        backend().incr(f"matrix:details:{credential_key(credential)}:generation")
+
+
+def find_technician(snapshot, tech_id):
+    """Find a technician in a snapshot by ID (string or int)"""
+    for tech in snapshot['technicians']:
+        if str(tech['id']) == str(tech_id):
+            return tech
+    return None
+
+
+def resolve_site_ids(current_site_ids, add_site_ids=None, remove_site_ids=None):
+    """Apply add/remove deltas to a technician's current site IDs"""
+    remove = {str(site_id) for site_id in (remove_site_ids or [])}
+    site_ids = [str(site_id) for site_id in current_site_ids if str(site_id) not in remove]
+    for site_id in add_site_ids or []:
+        if str(site_id) not in site_ids and str(site_id) not in remove:
+            site_ids.append(str(site_id))
+    return site_ids
+
+
+def apply_site_update(credential, tech_id, site_ids):
+    """Record a successful PUT in the cached snapshot (if any) and announce it"""
+    invalidate_details(credential, tech_id)
+
+    version = None
+    try:
+        with _snapshot_lock(credential):
+            snapshot = backend().get(_snapshot_key(credential))
+            tech = find_technician(snapshot, tech_id) if snapshot else None
+            if tech:
+                site_names = {str(site['id']): site['name'] for site in snapshot['sites']}
+                tech['associated_site_ids'] = [str(site_id) for site_id in site_ids]
+                tech['associated_sites'] = [
+                    {'id': str(site_id), 'name': site_names.get(str(site_id), 'Unknown')}
+                    for site_id in site_ids
+                ]
+                snapshot['version'] = _next_version()
+                version = snapshot['version']
+                backend().set(_snapshot_key(credential), snapshot)
+    except TimeoutError:
+        # Can't record the change: drop the snapshot rather than keep serving the old sites
+        invalidate_snapshot(credential)
+
+    publish(matrix_channel(credential), 'technician', {
+        'technician_id': str(tech_id),
+        'site_ids': [str(site_id) for site_id in site_ids],
+        'version': version
+    })
+
+
+def filter_technicians(technicians, search=None, department=None, status=None, technician_ids=None,
+                       member_of=None, not_member_of=None):
+    """
+    Filter snapshot technicians
+
+    Args:
+        search: name/email substring
+        department, status: exact matches
+        technician_ids: keep only these IDs
+        member_of: keep technicians associated with any of these site IDs
+        not_member_of: keep technicians associated with none of these site IDs
+    """
+    if search:
+        needle = search.lower()
+        technicians = [t for t in technicians
+                       if needle in t['name'].lower() or needle in t['email'].lower()]
+    if department:
+        technicians = [t for t in technicians if t['department'] == department]
+    if status:
+        technicians = [t for t in technicians if t['status'] == status]
+    if technician_ids is not None:
+        wanted = {str(tech_id) for tech_id in technician_ids}
+        technicians = [t for t in technicians if str(t['id']) in wanted]
+    if member_of:
+        wanted = {str(site_id) for site_id in member_of}
+        technicians = [t for t in technicians
+                       if wanted & {str(site_id) for site_id in t['associated_site_ids']}]
+    if not_member_of:
+        unwanted = {str(site_id) for site_id in not_member_of}
+        technicians = [t for t in technicians
+                       if not unwanted & {str(site_id) for site_id in t['associated_site_ids']}]
+    return technicians
+
+
+def plan_rule(snapshot, action, site_ids, filters):
+    """
+    Work out a mass assignment: add/remove `site_ids` to/from every
+    technician matching `filters` (keyword args of filter_technicians)
+
+    Returns:
+        (matched technicians, [{technician_id, site_ids}] for those that need a change)
+    """
+    site_ids = [str(site_id) for site_id in site_ids]
+    matched = filter_technicians(snapshot['technicians'], **filters)
+
+    updates = []
+    for tech in matched:
+        current = [str(site_id) for site_id in tech['associated_site_ids']]
+        if action == 'add':
+            target = resolve_site_ids(current, add_site_ids=site_ids)
+        else:
+            target = resolve_site_ids(current, remove_site_ids=site_ids)
+        if set(target) != set(current):
+            updates.append({'technician_id': str(tech['id']), 'site_ids': target})
+
+    return matched, updates
+
+
+def slice_snapshot(snapshot, search=None, department=None, status=None, technician_ids=None,
+                   site_ids=None, site_search=None, row_offset=0, row_limit=None,
+                   col_offset=0, col_limit=None):
+    """
+    Filter and page a snapshot by technicians (rows) and sites (columns)
+
+    Returns a snapshot-shaped dict holding only the requested window plus
+    the filtered totals and offsets.
+    """
+    technicians = filter_technicians(snapshot['technicians'], search=search, department=department,
+                                     status=status, technician_ids=technician_ids)
+
+    sites = snapshot['sites']
+    if site_ids is not None:
+        wanted = {str(site_id) for site_id in site_ids}
+        sites = [s for s in sites if str(s['id']) in wanted]
+    if site_search:
+        needle = site_search.lower()
+        sites = [s for s in sites
+                 if needle in s['name'].lower() or needle in s['account'].lower()]
+
+    row_end = row_offset + row_limit if row_limit is not None else None
+    col_end = col_offset + col_limit if col_limit is not None else None
+
+    return {
+        'technicians': technicians[row_offset:row_end],
+        'sites': sites[col_offset:col_end],
+        'version': snapshot['version'],
+        'total_technicians': len(technicians),
+        'total_sites': len(sites),
+        'row_offset': row_offset,
+        'col_offset': col_offset
+    }
+
+
+def list_departments(snapshot):
+    """Sorted distinct department names (for the matrix filter)"""
+    return sorted({t['department'] for t in snapshot['technicians'] if t['department']})
+
+
+def encode_bitset(site_ids, site_index, size):
+    """
+    Pack a technician's site IDs into a base64 bitset
+
+    Bit j (LSB first within each byte) is set when the technician is
+    associated with the j-th site of the ordered site list.
+    """
+    bits = bytearray((size + 7) // 8)
+    for site_id in site_ids:
+        j = site_index.get(str(site_id))
+        if j is not None:
+            bits[j >> 3] |= 1 << (j & 7)
+    return base64.b64encode(bytes(bits)).decode('ascii')
+
+
+def decode_bitset(encoded, site_ids):
+    """Unpack a base64 bitset back into the list of site IDs it covers"""
+    bits = base64.b64decode(encoded)
+    return [site_id for j, site_id in enumerate(site_ids) if bits[j >> 3] & (1 << (j & 7))]
+
+
+def encode_compact(snapshot):
+    """
+    Encode a snapshot in the compact wire format
+
+    Technicians and sites are sent as ordered ID arrays plus metadata
+    columns, and each technician's associations as a packed bitset.
+    """
+    site_ids = [site['id'] for site in snapshot['sites']]
+    site_index = {str(site_id): j for j, site_id in enumerate(site_ids)}
+
+    technicians = snapshot['technicians']
+    return {
+        'format': 'bitset',
+        'technician_ids': [tech['id'] for tech in technicians],
+        'site_ids': site_ids,
+        'technicians': [
+            {
+                'name': tech['name'],
+                'email': tech['email'],
+                'status': tech['status'],
+                'department': tech['department'],
+                'site_count': len(tech['associated_site_ids'])
+            }
+            for tech in technicians
+        ],
+        'sites': [
+            {'name': site['name'], 'account': site['account']}
+            for site in snapshot['sites']
+        ],
+        'associations': [
+            encode_bitset(tech['associated_site_ids'], site_index, len(site_ids))
+            for tech in technicians
+        ],
+        'version': snapshot['version'],
+        'total_technicians': snapshot.get('total_technicians', len(technicians)),
+        'total_sites': snapshot.get('total_sites', len(site_ids))
+    }
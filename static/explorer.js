@@ -12,6 +12,36 @@ let rowsPerPage = 20;
 let allRenderedItems = [];
 let searchFilterCount = 0;
 let discoveredFields = new Set();
+let fieldCatalog = {};  // path -> {types, null_rate, examples} learned server-side
+let spooledResult = null;  // response too large to send at once, paged through /api/spool/<handle>
+
+// Conditional GET: the last body of a URL is kept in sessionStorage with
+// its ETag and reused when the server answers 304 Not Modified
+const HTTP_CACHE_PREFIX = 'httpCache:';
+const HTTP_CACHE_MAX_CHARS = 2000000;
+
+async function fetchJsonCached(url) {
+    const key = HTTP_CACHE_PREFIX + url;
+    const cached = sessionStorage.getItem(key);
+    const separator = cached ? cached.indexOf('\n') : -1;
+    const headers = separator > 0 ? { 'If-None-Match': cached.slice(0, separator) } : {};
+
+    const response = await fetch(url, { headers });
+    if (response.status === 304 && separator > 0) {
+        return JSON.parse(cached.slice(separator + 1));
+    }
+
+    const text = await response.text();
+    const etag = response.headers.get('ETag');
+    if (response.ok && etag && text.length <= HTTP_CACHE_MAX_CHARS) {
+        try {
+            sessionStorage.setItem(key, `${etag}\n${text}`);
+        } catch (error) {
+            sessionStorage.removeItem(key);  // Quota exceeded: just don't cache
+        }
+    }
+    return JSON.parse(text);
+}
 
 // ============================================
 // TAB MANAGEMENT
@@ -49,6 +79,9 @@ function updateInputMode() {
     const placeholdersContainer = document.getElementById('placeholders-container');
     placeholdersContainer.innerHTML = '';
     
+    discoveredFields = new Set();
+    loadFieldCatalog(path);
+    
     const matches = path.match(/\{([^}]+)\}/g);
     if (matches) {
         matches.forEach(match => {
@@ -192,6 +225,35 @@ function buildInputDataFromForm() {
 // ============================================
 // FIELD DISCOVERY
 // ============================================
+async function loadFieldCatalog(endpoint) {
+    fieldCatalog = {};
+    if (!endpoint) {
+        displayDiscoveredFields();
+        return;
+    }
+    
+    try {
+        const result = await fetchJsonCached(`/api/fields?endpoint=${encodeURIComponent(endpoint)}`);
+        if (result.success) {
+            result.fields.forEach(field => {
+                fieldCatalog[field.path] = field;
+                discoveredFields.add(field.path);
+            });
+        }
+    } catch (error) {
+        console.error('Error loading field catalog:', error);
+    }
+    displayDiscoveredFields();
+}
+
+function describeField(field) {
+    const info = fieldCatalog[field];
+    if (!info) return field;
+    const nullRate = info.null_rate === null ? '' : `, ${Math.round(info.null_rate * 100)}% empty`;
+    const examples = info.examples.length ? `\ne.g. ${info.examples.map(String).join(', ')}` : '';
+    return `${field} (${info.types.join('/') || 'null'}${nullRate})${examples}`;
+}
+
 function discoverFilterableFields(data) {
     discoveredFields = new Set();
     
@@ -224,6 +286,8 @@ function extractFieldPaths(obj, prefix) {
     if (!obj || typeof obj !== 'object') return;
     
     for (const [key, value] of Object.entries(obj)) {
+        // Source tag added by all-portal queries, not an SDP field
+        if (!prefix && key === '_source') continue;
         const currentPath = prefix ? `${prefix}.${key}` : key;
         
         if (value === null || value === undefined) {
@@ -288,6 +352,7 @@ function displayDiscoveredFields() {
             chip.className = 'field-chip';
             chip.type = 'button';
             chip.textContent = field;
+            chip.title = describeField(field);
             chip.onclick = () => addSearchFilter(field);
             chipsContainer.appendChild(chip);
         });
@@ -334,11 +399,16 @@ async function executeApiCall() {
     const smartView = document.getElementById('response-smart-view');
     const jsonView = document.getElementById('response-json-view');
     const jsonContent = document.getElementById('response-json-content');
+    const allPortals = document.getElementById('all-portals').checked;
     
     if (!endpoint) {
         alert('Please select an endpoint');
         return;
     }
+    if (allPortals && method !== 'GET') {
+        alert('All-portal queries are GET only');
+        return;
+    }
     
     const placeholders = {};
     const matches = endpoint.match(/\{([^}]+)\}/g);
@@ -374,7 +444,7 @@ async function executeApiCall() {
     jsonContent.textContent = '';
     
     try {
-        const response = await fetch('/api/call', {
+        const response = await fetch(allPortals ? '/api/fanout' : '/api/call', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
@@ -386,21 +456,27 @@ async function executeApiCall() {
         });
         
         const result = await response.json();
+        // Fan-out results are the merged list itself, next to per-portal status
+        const { portals, ...merged } = result;
+        const data = allPortals ? merged : result.data;
         lastResponse = result;
-        lastResponseData = result.data;
+        lastResponseData = data;
+        spooledResult = data && data._spool ? data : null;
         
         if (result.success) {
-            discoverFilterableFields(result.data);
+            discoverFilterableFields(data);
+            if (!allPortals) loadFieldCatalog(endpoint);
             
             smartView.innerHTML = `
                 <p class="success">✅ Success</p>
-                <p>Status Code: <span class="status-badge status-200">${result.status_code}</span></p>
-                ${renderSmartView(result.data)}
+                ${allPortals ? renderPortalStatus(portals)
+                    : `<p>Status Code: <span class="status-badge status-200">${result.status_code}</span></p>`}
+                ${renderSmartView(data)}
             `;
             
-            jsonContent.textContent = JSON.stringify(result.data, null, 2);
+            jsonContent.textContent = JSON.stringify(data, null, 2);
             
-            updatePaginationControls(result.data);
+            updatePaginationControls(data);
         } else {
             smartView.innerHTML = `
                 <p class="error">❌ Failed</p>
@@ -414,6 +490,15 @@ async function executeApiCall() {
     }
 }
 
+function renderPortalStatus(portals) {
+    const failed = portals.filter(portal => !portal.success);
+    let html = `<div class="info-banner">🌐 ${portals.length - failed.length} of ${portals.length} portals answered</div>`;
+    failed.forEach(portal => {
+        html += `<p class="error">⚠️ ${escapeHtml(portal.name)} (${escapeHtml(portal.api_base_url)}): ${escapeHtml(portal.error)}</p>`;
+    });
+    return html;
+}
+
 async function quickView(type) {
     const resultDiv = document.getElementById('quick-result');
     resultDiv.innerHTML = '<p>Loading...</p>';
@@ -449,6 +534,404 @@ function displayQuickResponse(result) {
     }
 }
 
+// ============================================
+// BATCH CALLS & SAVED QUERIES
+// ============================================
+async function executeBatch(items) {
+    const response = await fetch('/api/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ items: items })
+    });
+    return response.json();
+}
+
+let savedQueries = [];
+let snapshotResults = {};
+let queryEvents = null;
+
+async function loadSavedQueries() {
+    const listDiv = document.getElementById('saved-queries-list');
+    listDiv.innerHTML = '<p>Loading...</p>';
+    
+    try {
+        savedQueries = await fetchJsonCached('/api/queries');
+        renderSavedQueries(snapshotResults);
+        loadQuerySnapshots();
+    } catch (error) {
+        listDiv.innerHTML = `<p class="error">Error loading saved queries: ${error.message}</p>`;
+    }
+}
+
+function storeSnapshotResult(result) {
+    // A scheduled run that failed upstream is shown like a failed call
+    snapshotResults[result.query_id] = result.error ? { ...result, success: false } : result;
+}
+
+// Auto-refreshed queries are run by the server scheduler; read its
+// snapshots instead of calling SDP, fetching only changed versions
+async function loadQuerySnapshots() {
+    try {
+        const response = await fetch('/api/queries/snapshots');
+        const data = await response.json();
+        if (!data.success) return;
+        
+        const changed = data.snapshots.filter(snapshot =>
+            !snapshotResults[snapshot.query_id] || snapshotResults[snapshot.query_id].version !== snapshot.version
+        );
+        const results = await Promise.all(changed.map(snapshot =>
+            fetch(`/api/queries/${snapshot.query_id}/snapshot`).then(r => r.json())
+        ));
+        results.filter(result => result.success).forEach(storeSnapshotResult);
+        if (changed.length > 0) {
+            renderSavedQueries(snapshotResults);
+        }
+        
+        subscribeQueryEvents(data.auto_refresh);
+    } catch (error) {
+        console.error('Error loading query snapshots:', error);
+    }
+}
+
+// Later changes are pushed over Server-Sent Events (the browser resumes
+// with Last-Event-ID after a reconnect)
+function subscribeQueryEvents(enabled) {
+    if (queryEvents) {
+        queryEvents.close();
+        queryEvents = null;
+    }
+    if (!enabled || !window.EventSource) return;
+    
+    queryEvents = new EventSource('/api/queries/events');
+    queryEvents.addEventListener('snapshot', (e) => applySnapshotEvent(JSON.parse(e.data)));
+    queryEvents.addEventListener('reset', () => loadQuerySnapshots());
+}
+
+async function applySnapshotEvent(event) {
+    for (const queryId of event.query_ids) {
+        const current = snapshotResults[queryId];
+        
+        if (event.diff && current && current.version === event.base_version && current.data) {
+            storeSnapshotResult({
+                ...current,
+                success: true,
+                query_id: queryId,
+                version: event.version,
+                status_code: event.status_code,
+                error: event.error,
+                fetched_at: event.fetched_at,
+                data: applyJsonDiff(current.data, event.diff)
+            });
+        } else {
+            const response = await fetch(`/api/queries/${queryId}/snapshot`);
+            const result = await response.json();
+            if (result.success) storeSnapshotResult(result);
+        }
+    }
+    renderSavedQueries(snapshotResults);
+}
+
+// Apply JSON Patch style operations (add/remove/replace) to a copy of doc
+function applyJsonDiff(doc, ops) {
+    let root = JSON.parse(JSON.stringify(doc));
+    
+    ops.forEach(op => {
+        if (op.path === '') {
+            root = op.value;
+            return;
+        }
+        const keys = op.path.split('/').slice(1).map(key => key.replace(/~1/g, '/').replace(/~0/g, '~'));
+        const last = keys.pop();
+        const parent = keys.reduce((node, key) => node[key], root);
+        
+        if (op.op === 'remove') {
+            Array.isArray(parent) ? parent.splice(Number(last), 1) : delete parent[last];
+        } else {
+            parent[last] = op.value;
+        }
+    });
+    return root;
+}
+
+function renderSavedQueries(resultsById) {
+    const listDiv = document.getElementById('saved-queries-list');
+    
+    if (savedQueries.length === 0) {
+        listDiv.innerHTML = '<p>No saved queries yet</p>';
+        return;
+    }
+    
+    let html = '';
+    savedQueries.forEach(query => {
+        const result = resultsById[query.id];
+        let resultHtml = '';
+        
+        if (result && result.success) {
+            resultHtml = `
+                <p>Status Code: <span class="status-badge status-200">${result.status_code}</span>
+                   ${result.fetched_at ? `<small>Auto-refreshed ${result.fetched_at} UTC (v${result.version})</small>` : ''}</p>
+                <details>
+                    <summary>View Result</summary>
+                    ${renderSmartView(result.data)}
+                </details>
+            `;
+        } else if (result) {
+            resultHtml = `<p class="error">❌ ${result.error}</p>`;
+        }
+        
+        html += `
+            <div class="card">
+                <div class="card-header">
+                    <strong>${query.is_favorite ? '⭐ ' : ''}${query.name}</strong>
+                    <span>${query.method} ${query.endpoint}</span>
+                </div>
+                <div class="card-body">
+                    ${query.description ? `<p>${query.description}</p>` : ''}
+                    ${resultHtml}
+                </div>
+            </div>
+        `;
+    });
+    listDiv.innerHTML = html;
+}
+
+async function runAllSavedQueries() {
+    if (savedQueries.length === 0) {
+        await loadSavedQueries();
+    }
+    if (savedQueries.length === 0) return;
+    
+    // Only GET queries are safe to re-run in bulk
+    const queries = savedQueries.filter(query => query.method === 'GET');
+    const listDiv = document.getElementById('saved-queries-list');
+    listDiv.insertAdjacentHTML('afterbegin', `<p id="batch-running">Running ${queries.length} queries...</p>`);
+    
+    try {
+        const batch = await executeBatch(queries.map(query => ({
+            method: query.method,
+            endpoint: query.endpoint,
+            placeholders: query.placeholders,
+            input_data: query.input_data
+        })));
+        
+        if (!batch.success) {
+            listDiv.insertAdjacentHTML('afterbegin', `<p class="error">❌ ${batch.error}</p>`);
+            return;
+        }
+        
+        const resultsById = {};
+        queries.forEach((query, index) => {
+            resultsById[query.id] = batch.results[index];
+        });
+        renderSavedQueries(resultsById);
+    } catch (error) {
+        listDiv.insertAdjacentHTML('afterbegin', `<p class="error">❌ Error: ${error.message}</p>`);
+    } finally {
+        document.getElementById('batch-running')?.remove();
+    }
+}
+
+// ============================================
+// REPORT RUNS (results stored locally per run)
+// ============================================
+let reportState = {
+    run: null,
+    filters: [],
+    sort: null,
+    order: 'asc',
+    page: 1,
+    perPage: 50
+};
+
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, c => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[c]);
+}
+
+async function loadReportRuns() {
+    const listDiv = document.getElementById('report-runs-list');
+    
+    try {
+        const response = await fetch('/api/reports/runs');
+        const data = await response.json();
+        
+        if (data.runs.length === 0) {
+            listDiv.innerHTML = '<p>No report runs yet</p>';
+            return;
+        }
+        
+        listDiv.innerHTML = data.runs.map(run => `
+            <div class="card card-clickable" onclick='openReportRun(${JSON.stringify(run).replace(/'/g, '&#39;')})'>
+                <div class="card-header">
+                    <strong>${escapeHtml(run.name)}</strong>
+                    <span>${escapeHtml(run.status)} • ${run.row_count} rows • ${run.created_at}</span>
+                </div>
+                ${run.error ? `<div class="card-body"><p class="error">❌ ${escapeHtml(run.error)}</p></div>` : ''}
+            </div>
+        `).join('');
+    } catch (error) {
+        listDiv.innerHTML = `<p class="error">Error loading report runs: ${error.message}</p>`;
+    }
+}
+
+async function runReport() {
+    const reportId = document.getElementById('report-id').value.trim();
+    const queryText = document.getElementById('report-query').value.trim();
+    const body = {};
+    
+    if (reportId) {
+        body.report_id = reportId;
+    } else if (queryText) {
+        try {
+            body.input_data = JSON.parse(queryText);
+        } catch (e) {
+            alert('Query input_data is not valid JSON');
+            return;
+        }
+    } else {
+        alert('Enter a report ID or query input_data');
+        return;
+    }
+    
+    const listDiv = document.getElementById('report-runs-list');
+    listDiv.insertAdjacentHTML('afterbegin', '<p id="report-running">Running report...</p>');
+    
+    try {
+        const response = await fetch('/api/reports/runs', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(body)
+        });
+        const data = await response.json();
+        await loadReportRuns();
+        if (data.success) {
+            openReportRun(data.run);
+        }
+    } catch (error) {
+        listDiv.insertAdjacentHTML('afterbegin', `<p class="error">❌ Error: ${error.message}</p>`);
+    } finally {
+        document.getElementById('report-running')?.remove();
+    }
+}
+
+function openReportRun(run) {
+    if (run.status !== 'completed') return;
+    
+    reportState = { run: run, filters: [], sort: null, order: 'asc', page: 1, perPage: 50 };
+    document.getElementById('report-view').style.display = 'block';
+    document.getElementById('report-view-title').textContent = `${run.name} (${run.row_count} rows)`;
+    
+    const columnOptions = run.columns.map(column =>
+        `<option value="${escapeHtml(column.name)}">${escapeHtml(column.name)}</option>`
+    ).join('');
+    const numericOptions = run.columns
+        .filter(column => column.type !== 'TEXT')
+        .flatMap(column => ['sum', 'avg', 'min', 'max'].map(func =>
+            `<option value="${func}:${escapeHtml(column.name)}">${func}(${escapeHtml(column.name)})</option>`
+        )).join('');
+    
+    document.getElementById('report-group-by').innerHTML = '<option value="">No grouping</option>' + columnOptions;
+    document.getElementById('report-agg').innerHTML = '<option value="count">Count</option>' + numericOptions;
+    document.getElementById('report-filter-column').innerHTML = columnOptions;
+    renderReportFilters();
+    loadReportRows();
+}
+
+function addReportFilter() {
+    reportState.filters.push({
+        column: document.getElementById('report-filter-column').value,
+        op: document.getElementById('report-filter-op').value,
+        value: document.getElementById('report-filter-value').value
+    });
+    reportState.page = 1;
+    renderReportFilters();
+    loadReportRows();
+}
+
+function removeReportFilter(index) {
+    reportState.filters.splice(index, 1);
+    reportState.page = 1;
+    renderReportFilters();
+    loadReportRows();
+}
+
+function renderReportFilters() {
+    document.getElementById('report-filters').innerHTML = reportState.filters.map((filter, index) => `
+        <button class="btn-small" onclick="removeReportFilter(${index})" title="Remove filter">
+            ${escapeHtml(filter.column)} ${escapeHtml(filter.op)} ${escapeHtml(filter.value)} ✕
+        </button>
+    `).join('');
+}
+
+function sortReportBy(column) {
+    if (reportState.sort === column) {
+        reportState.order = reportState.order === 'asc' ? 'desc' : 'asc';
+    } else {
+        reportState.sort = column;
+        reportState.order = 'asc';
+    }
+    loadReportRows();
+}
+
+function changeReportPage(delta) {
+    reportState.page = Math.max(1, reportState.page + delta);
+    loadReportRows();
+}
+
+async function loadReportRows() {
+    const rowsDiv = document.getElementById('report-rows');
+    const groupBy = document.getElementById('report-group-by').value;
+    const params = new URLSearchParams({
+        page: reportState.page,
+        per_page: reportState.perPage,
+        filter: JSON.stringify(reportState.filters)
+    });
+    
+    if (groupBy) {
+        params.append('group_by', groupBy);
+        params.append('agg', document.getElementById('report-agg').value);
+    }
+    if (reportState.sort) {
+        params.set('sort', reportState.sort);
+        params.set('order', reportState.order);
+    }
+    
+    try {
+        const response = await fetch(`/api/reports/runs/${reportState.run.id}/rows?${params}`);
+        const data = await response.json();
+        
+        if (!data.success) {
+            // e.g. the sort column disappeared after changing the grouping
+            if (reportState.sort) {
+                reportState.sort = null;
+                return loadReportRows();
+            }
+            rowsDiv.innerHTML = `<p class="error">❌ ${escapeHtml(data.error)}</p>`;
+            return;
+        }
+        
+        const header = data.columns.map(column => {
+            const arrow = reportState.sort === column ? (reportState.order === 'asc' ? ' ▲' : ' ▼') : '';
+            return `<th style="cursor: pointer;" onclick='sortReportBy(${JSON.stringify(column).replace(/'/g, '&#39;')})'>${escapeHtml(column)}${arrow}</th>`;
+        }).join('');
+        const body = data.rows.map(row =>
+            `<tr>${data.columns.map(column => `<td>${escapeHtml(row[column])}</td>`).join('')}</tr>`
+        ).join('');
+        
+        rowsDiv.innerHTML = `<table class="data-table"><thead><tr>${header}</tr></thead><tbody>${body}</tbody></table>`;
+        
+        const first = data.total === 0 ? 0 : (data.page - 1) * data.per_page + 1;
+        const last = Math.min(data.page * data.per_page, data.total);
+        document.getElementById('report-page-info').textContent = `${first} - ${last} of ${data.total}`;
+        if (data.page > 1 && first > data.total) {
+            changeReportPage(-1);
+        }
+    } catch (error) {
+        rowsDiv.innerHTML = `<p class="error">Error loading rows: ${error.message}</p>`;
+    }
+}
+
 // ============================================
 // SMART JSON RENDERER
 // ============================================
@@ -536,6 +1019,7 @@ function renderListItemCard(item, index) {
         <div class="card card-clickable" onclick="showDetailModal(${index})" data-index="${index}">
             <div class="card-header">
                 <strong>${identifier}</strong>
+                ${item._source ? `<small>🌐 ${escapeHtml(item._source.name)}</small>` : ''}
                 ${preview.badges}
             </div>
             <div class="card-body">
@@ -806,6 +1290,17 @@ function updatePaginationControls(data) {
     const controls = document.getElementById('pagination-controls');
     const listInfo = data.list_info;
     
+    if (data._spool) {
+        const spool = data._spool;
+        controls.style.display = 'block';
+        document.getElementById('pagination-info').textContent =
+            `Rows ${spool.start_index} - ${Math.min(spool.start_index + spool.row_count - 1, spool.total)} of ${spool.total}` +
+            ` (large response, ${(spool.bytes / 1048576).toFixed(1)} MB)`;
+        document.getElementById('btn-prev').disabled = spool.start_index <= 1;
+        document.getElementById('btn-next').disabled = spool.start_index + spool.row_count > spool.total;
+        return;
+    }
+    
     if (!listInfo || !listInfo.total_count) {
         controls.style.display = 'none';
         return;
@@ -822,6 +1317,11 @@ function updatePaginationControls(data) {
 }
 
 function previousPage() {
+    if (spooledResult) {
+        const spool = spooledResult._spool;
+        loadSpoolPage(Math.max(spool.start_index - spool.row_count, 1));
+        return;
+    }
     if (currentPage > rowsPerPage) {
         currentPage -= rowsPerPage;
     } else {
@@ -832,11 +1332,38 @@ function previousPage() {
 }
 
 function nextPage() {
+    if (spooledResult) {
+        const spool = spooledResult._spool;
+        loadSpoolPage(spool.start_index + spool.row_count);
+        return;
+    }
     currentPage += rowsPerPage;
     document.getElementById('form-start-index').value = currentPage;
     executeApiCall();
 }
 
+async function loadSpoolPage(startIndex) {
+    const smartView = document.getElementById('response-smart-view');
+    const spool = spooledResult._spool;
+    
+    try {
+        const response = await fetch(`/api/spool/${spool.handle}?start_index=${startIndex}&row_count=${spool.row_count}`);
+        const page = await response.json();
+        if (!page.success) {
+            smartView.innerHTML = `<p class="error">❌ ${escapeHtml(page.error)}</p>`;
+            return;
+        }
+        
+        spooledResult = { ...spooledResult, [spool.list_key]: page.items, _spool: { ...spool, start_index: startIndex } };
+        lastResponseData = spooledResult;
+        smartView.innerHTML = renderSmartView(spooledResult);
+        document.getElementById('response-json-content').textContent = JSON.stringify(spooledResult, null, 2);
+        updatePaginationControls(spooledResult);
+    } catch (error) {
+        smartView.innerHTML = `<p class="error">❌ Error: ${error.message}</p>`;
+    }
+}
+
 // ============================================
 // HISTORY MANAGEMENT
 // ============================================
@@ -845,8 +1372,7 @@ async function loadHistory() {
     historyDiv.innerHTML = '<p>Loading...</p>';
     
     try {
-        const response = await fetch('/api/history');
-        const history = await response.json();
+        const history = await fetchJsonCached('/api/history');
         
         if (history.length === 0) {
             historyDiv.innerHTML = '<p>No requests yet</p>';
@@ -0,0 +1,840 @@
+// Virtualized matrix: only visible cells are rendered, and the grid is
+// fetched from the server in ROW_BLOCK x COL_BLOCK slices on demand
+const ROW_HEIGHT = 64;
+const COL_WIDTH = 40;
+const TECH_WIDTH = 220;
+const ACTIONS_WIDTH = 100;
+const ROW_BLOCK = 100;
+const COL_BLOCK = 50;
+const OVERSCAN = 4;
+const RULE_SITE_LIMIT = 500;
+
+let matrixData = {
+    totalRows: 0,
+    totalCols: 0,
+    rows: [],            // Row index -> technician {id, name, email, status, department, site_count}
+    cols: [],            // Column index -> site {id, name, account}
+    rowIndexById: {},
+    colIndexById: {},
+    blocks: {},          // "rowBlock:colBlock" -> one bitset per row (bits relative to the block)
+    pending: {},         // Block keys currently being fetched
+    technicianInfo: {},  // Technician ID -> technician (kept across filter changes)
+    modifiedState: {},   // Technician ID -> {siteId: checked} for changed cells only
+    filters: {
+        search: '',
+        department: '',
+        status: '',
+        modifiedOnly: false,
+        siteSearch: ''
+    },
+    generation: 0        // Bumped on filter change so stale slices are dropped
+};
+
+let renderScheduled = false;
+
+// Conditional GET: the last body of a URL is kept in sessionStorage with
+// its ETag and reused when the server answers 304 Not Modified
+const HTTP_CACHE_PREFIX = 'httpCache:';
+const HTTP_CACHE_MAX_CHARS = 2000000;
+
+async function fetchJsonCached(url) {
+    const key = HTTP_CACHE_PREFIX + url;
+    const cached = sessionStorage.getItem(key);
+    const separator = cached ? cached.indexOf('\n') : -1;
+    const headers = separator > 0 ? { 'If-None-Match': cached.slice(0, separator) } : {};
+
+    const response = await fetch(url, { headers });
+    if (response.status === 304 && separator > 0) {
+        return JSON.parse(cached.slice(separator + 1));
+    }
+
+    const text = await response.text();
+    const etag = response.headers.get('ETag');
+    if (response.ok && etag && text.length <= HTTP_CACHE_MAX_CHARS) {
+        try {
+            sessionStorage.setItem(key, `${etag}\n${text}`);
+        } catch (error) {
+            sessionStorage.removeItem(key);  // Quota exceeded: just don't cache
+        }
+    }
+    return JSON.parse(text);
+}
+
+// Bitset helpers (bit j = column j of the block, LSB first in each byte)
+function decodeBitset(encoded) {
+    const binary = atob(encoded);
+    const bits = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bits[i] = binary.charCodeAt(i);
+    }
+    return bits;
+}
+
+function hasBit(bits, j) {
+    return (bits[j >> 3] & (1 << (j & 7))) !== 0;
+}
+
+function setBit(bits, j, on) {
+    if (on) {
+        bits[j >> 3] |= 1 << (j & 7);
+    } else {
+        bits[j >> 3] &= ~(1 << (j & 7));
+    }
+}
+
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, c => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[c]);
+}
+
+function blockKey(rowIndex, colIndex) {
+    return `${Math.floor(rowIndex / ROW_BLOCK)}:${Math.floor(colIndex / COL_BLOCK)}`;
+}
+
+// Original (saved) state of a cell, or null while its slice is not loaded
+function originalChecked(rowIndex, colIndex) {
+    const block = matrixData.blocks[blockKey(rowIndex, colIndex)];
+    if (!block) return null;
+    return hasBit(block[rowIndex % ROW_BLOCK], colIndex % COL_BLOCK);
+}
+
+function cellChecked(techId, siteId, rowIndex, colIndex) {
+    const changes = matrixData.modifiedState[techId];
+    if (changes && siteId in changes) return changes[siteId];
+    return originalChecked(rowIndex, colIndex);
+}
+
+function sliceParams(rowBlock, colBlock) {
+    const params = new URLSearchParams({
+        row_offset: rowBlock * ROW_BLOCK,
+        row_limit: ROW_BLOCK,
+        col_offset: colBlock * COL_BLOCK,
+        col_limit: COL_BLOCK
+    });
+    const filters = matrixData.filters;
+
+    if (filters.search) params.set('search', filters.search);
+    if (filters.department) params.set('department', filters.department);
+    if (filters.status) params.set('status', filters.status);
+    if (filters.siteSearch) params.set('site_search', filters.siteSearch);
+    if (filters.modifiedOnly) params.set('technician_ids', Object.keys(matrixData.modifiedState).join(','));
+
+    return params;
+}
+
+// Fetch one slice of the matrix
+async function fetchBlock(rowBlock, colBlock, refresh = false) {
+    const key = `${rowBlock}:${colBlock}`;
+    if (matrixData.blocks[key] || matrixData.pending[key]) return;
+
+    const generation = matrixData.generation;
+    matrixData.pending[key] = true;
+
+    try {
+        const params = sliceParams(rowBlock, colBlock);
+        if (refresh) params.set('refresh', '1');
+
+        const data = await fetchJsonCached(`/api/tools/site-matrix/data?${params}`);
+
+        if (generation !== matrixData.generation) return;
+
+        if (!data.success) {
+            showNotification(data.error || 'Failed to load data', 'error');
+            return;
+        }
+
+        matrixData.totalRows = data.total_technicians;
+        matrixData.totalCols = data.total_sites;
+
+        data.technician_ids.forEach((id, i) => {
+            const tech = {id, ...data.technicians[i]};
+            matrixData.rows[data.row_offset + i] = tech;
+            matrixData.rowIndexById[id] = data.row_offset + i;
+            matrixData.technicianInfo[id] = tech;
+        });
+
+        data.site_ids.forEach((id, j) => {
+            matrixData.cols[data.col_offset + j] = {id, ...data.sites[j]};
+            matrixData.colIndexById[id] = data.col_offset + j;
+        });
+
+        matrixData.blocks[key] = data.associations.map(decodeBitset);
+
+        updateDepartments(data.departments);
+        updateStats();
+        scheduleRender();
+    } catch (error) {
+        showNotification('Error loading data: ' + error.message, 'error');
+    } finally {
+        if (generation === matrixData.generation) {
+            delete matrixData.pending[key];
+        }
+    }
+}
+
+// (Re)load the matrix from the first slice, e.g. after a filter change
+function loadMatrixData(refresh = false) {
+    matrixData.generation++;
+    matrixData.totalRows = 0;
+    matrixData.totalCols = 0;
+    matrixData.rows = [];
+    matrixData.cols = [];
+    matrixData.rowIndexById = {};
+    matrixData.colIndexById = {};
+    matrixData.blocks = {};
+    matrixData.pending = {};
+
+    const wrapper = document.getElementById('matrixWrapper');
+    wrapper.scrollTop = 0;
+    wrapper.scrollLeft = 0;
+
+    fetchBlock(0, 0, refresh === true);
+}
+
+function updateStats() {
+    document.getElementById('totalTechs').textContent = matrixData.totalRows;
+    document.getElementById('totalSites').textContent = matrixData.totalCols;
+}
+
+function updateDepartments(departments) {
+    const select = document.getElementById('departmentFilter');
+    if (!departments || select.options.length > 1) return;
+
+    departments.forEach(department => {
+        const option = document.createElement('option');
+        option.value = department;
+        option.textContent = department;
+        select.appendChild(option);
+    });
+}
+
+function scheduleRender() {
+    if (renderScheduled) return;
+    renderScheduled = true;
+    requestAnimationFrame(renderMatrix);
+}
+
+// Render only the rows/columns inside the scroll viewport
+function renderMatrix() {
+    renderScheduled = false;
+
+    const wrapper = document.getElementById('matrixWrapper');
+    const table = document.getElementById('matrixTable');
+    const header = document.getElementById('tableHeader');
+    const tbody = document.getElementById('tableBody');
+    const totalRows = matrixData.totalRows;
+    const totalCols = matrixData.totalCols;
+
+    if (totalRows === 0) {
+        const message = Object.keys(matrixData.pending).length ? 'Loading data...' : 'No technicians match the current filters';
+        header.innerHTML = '<th class="tech-column">Technician</th><th class="actions-column">Actions</th>';
+        tbody.innerHTML = `<tr><td colspan="2" style="text-align: center; padding: 40px;">${message}</td></tr>`;
+        table.style.width = '';
+        return;
+    }
+
+    const firstRow = Math.max(0, Math.floor(wrapper.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    const lastRow = Math.min(totalRows, Math.ceil((wrapper.scrollTop + wrapper.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+    const firstCol = Math.max(0, Math.floor(wrapper.scrollLeft / COL_WIDTH) - OVERSCAN);
+    const lastCol = Math.min(totalCols, Math.ceil((wrapper.scrollLeft + wrapper.clientWidth) / COL_WIDTH) + OVERSCAN);
+
+    // Request any slices covering the visible window
+    for (let rb = Math.floor(firstRow / ROW_BLOCK); rb <= Math.floor(Math.max(lastRow - 1, 0) / ROW_BLOCK); rb++) {
+        for (let cb = Math.floor(firstCol / COL_BLOCK); cb <= Math.floor(Math.max(lastCol - 1, 0) / COL_BLOCK); cb++) {
+            fetchBlock(rb, cb);
+        }
+    }
+
+    table.style.width = `${TECH_WIDTH + totalCols * COL_WIDTH + ACTIONS_WIDTH}px`;
+
+    const leftSpacer = firstCol * COL_WIDTH;
+    const rightSpacer = (totalCols - lastCol) * COL_WIDTH;
+    const leftSpacerCell = leftSpacer ? '<td class="spacer-cell"></td>' : '';
+    const rightSpacerCell = rightSpacer ? '<td class="spacer-cell"></td>' : '';
+    const columnCount = 2 + (lastCol - firstCol) + (leftSpacer ? 1 : 0) + (rightSpacer ? 1 : 0);
+
+    // Header
+    let headerHtml = `<th class="tech-column" style="width: ${TECH_WIDTH}px">Technician</th>`;
+    if (leftSpacer) headerHtml += `<th class="spacer-cell" style="width: ${leftSpacer}px"></th>`;
+    for (let j = firstCol; j < lastCol; j++) {
+        const site = matrixData.cols[j];
+        const title = site ? site.name + (site.account ? ` (${site.account})` : '') : '';
+        headerHtml += `<th class="site-column" style="width: ${COL_WIDTH}px" title="${escapeHtml(title)}">${escapeHtml(site ? site.name : '')}</th>`;
+    }
+    if (rightSpacer) headerHtml += `<th class="spacer-cell" style="width: ${rightSpacer}px"></th>`;
+    headerHtml += `<th class="actions-column" style="width: ${ACTIONS_WIDTH}px">Actions</th>`;
+    header.innerHTML = headerHtml;
+
+    // Body
+    let bodyHtml = '';
+    if (firstRow > 0) {
+        bodyHtml += `<tr class="spacer-row" style="height: ${firstRow * ROW_HEIGHT}px"><td colspan="${columnCount}"></td></tr>`;
+    }
+
+    for (let i = firstRow; i < lastRow; i++) {
+        const tech = matrixData.rows[i];
+
+        if (!tech) {
+            bodyHtml += `<tr><td class="tech-info"><span class="tech-meta">Loading...</span></td>${leftSpacerCell}`;
+            bodyHtml += '<td class="site-checkbox"></td>'.repeat(lastCol - firstCol);
+            bodyHtml += `${rightSpacerCell}<td class="actions-column"></td></tr>`;
+            continue;
+        }
+
+        const isModified = matrixData.modifiedState[tech.id] !== undefined;
+        bodyHtml += `<tr data-tech-id="${escapeHtml(tech.id)}" class="${isModified ? 'modified' : ''}">`;
+        bodyHtml += `
+            <td class="tech-info">
+                <span class="tech-name">${escapeHtml(tech.name)}</span>
+                <span class="tech-email">${escapeHtml(tech.email)}</span>
+                <span class="tech-meta">${escapeHtml(tech.department || '')} • ${escapeHtml(tech.status)}</span>
+            </td>`;
+        bodyHtml += leftSpacerCell;
+
+        for (let j = firstCol; j < lastCol; j++) {
+            const site = matrixData.cols[j];
+            const checked = site ? cellChecked(tech.id, site.id, i, j) : null;
+
+            if (checked === null) {
+                bodyHtml += '<td class="site-checkbox"><input type="checkbox" disabled></td>';
+            } else {
+                bodyHtml += `<td class="site-checkbox"><input type="checkbox" data-site-id="${escapeHtml(site.id)}" data-row="${i}" data-col="${j}"${checked ? ' checked' : ''}></td>`;
+            }
+        }
+
+        bodyHtml += rightSpacerCell;
+        bodyHtml += `<td class="actions-column"><button class="btn-save-row" data-save="${escapeHtml(tech.id)}">Save</button></td>`;
+        bodyHtml += '</tr>';
+    }
+
+    if (lastRow < totalRows) {
+        bodyHtml += `<tr class="spacer-row" style="height: ${(totalRows - lastRow) * ROW_HEIGHT}px"><td colspan="${columnCount}"></td></tr>`;
+    }
+
+    tbody.innerHTML = bodyHtml;
+}
+
+// Handle checkbox change
+function handleCheckboxChange(techId, siteId, rowIndex, colIndex, isChecked) {
+    const changes = matrixData.modifiedState[techId] || {};
+
+    if (isChecked === originalChecked(rowIndex, colIndex)) {
+        delete changes[siteId];
+    } else {
+        changes[siteId] = isChecked;
+    }
+
+    const isModified = Object.keys(changes).length > 0;
+    if (isModified) {
+        matrixData.modifiedState[techId] = changes;
+    } else {
+        delete matrixData.modifiedState[techId];
+    }
+
+    // Update row styling
+    const row = document.querySelector(`tr[data-tech-id="${CSS.escape(String(techId))}"]`);
+    if (row) {
+        row.classList.toggle('modified', isModified);
+    }
+
+    updateModifiedCount();
+}
+
+// Split a technician's pending changes into add/remove lists
+function pendingDelta(techId) {
+    const changes = matrixData.modifiedState[techId] || {};
+    const delta = {add_site_ids: [], remove_site_ids: []};
+
+    Object.entries(changes).forEach(([siteId, checked]) => {
+        (checked ? delta.add_site_ids : delta.remove_site_ids).push(siteId);
+    });
+
+    return delta;
+}
+
+// Fold saved changes into the loaded slices so no refetch is needed
+function commitChanges(techId, siteCount) {
+    const changes = matrixData.modifiedState[techId] || {};
+    const rowIndex = matrixData.rowIndexById[techId];
+
+    if (rowIndex !== undefined) {
+        Object.entries(changes).forEach(([siteId, checked]) => {
+            const colIndex = matrixData.colIndexById[siteId];
+            if (colIndex === undefined) return;
+
+            const block = matrixData.blocks[blockKey(rowIndex, colIndex)];
+            if (block) {
+                setBit(block[rowIndex % ROW_BLOCK], colIndex % COL_BLOCK, checked);
+            }
+        });
+    }
+
+    const tech = matrixData.technicianInfo[techId];
+    if (tech && siteCount !== undefined) {
+        tech.site_count = siteCount;
+    }
+
+    delete matrixData.modifiedState[techId];
+}
+
+// Update modified count
+function updateModifiedCount() {
+    const count = Object.keys(matrixData.modifiedState).length;
+    document.getElementById('modifiedCount').textContent = count;
+    document.getElementById('saveAllBtn').style.display = count > 0 ? 'block' : 'none';
+
+    if (count > 0) {
+        document.getElementById('bulkActions').classList.add('show');
+        updateChangesSummary();
+    } else {
+        document.getElementById('bulkActions').classList.remove('show');
+    }
+}
+
+// Update changes summary
+function updateChangesSummary() {
+    const summary = document.getElementById('changesSummary');
+    let html = '<ul style="margin: 0; padding-left: 20px;">';
+
+    Object.keys(matrixData.modifiedState).forEach(techId => {
+        const tech = matrixData.technicianInfo[techId];
+        const delta = pendingDelta(techId);
+        const originalCount = tech?.site_count || 0;
+        const newCount = originalCount + delta.add_site_ids.length - delta.remove_site_ids.length;
+
+        html += `<li><strong>${escapeHtml(tech ? tech.name : techId)}</strong>: ${originalCount} → ${newCount} sites</li>`;
+    });
+
+    html += '</ul>';
+    summary.innerHTML = html;
+}
+
+// Save individual row
+async function saveRow(techId) {
+    if (!matrixData.modifiedState[techId]) {
+        showNotification('No changes to save', 'error');
+        return;
+    }
+
+    showLoading(true);
+
+    try {
+        const response = await fetch('/api/tools/site-matrix/update', {
+            method: 'PUT',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                technician_id: techId,
+                ...pendingDelta(techId)
+            })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            commitChanges(techId, data.site_count);
+            updateModifiedCount();
+            scheduleRender();
+            showNotification('Saved successfully!', 'success');
+        } else {
+            showNotification(data.error || 'Failed to save', 'error');
+        }
+    } catch (error) {
+        showNotification('Error: ' + error.message, 'error');
+    } finally {
+        showLoading(false);
+    }
+}
+
+// Save all changes
+async function saveAllChanges() {
+    const updates = Object.keys(matrixData.modifiedState).map(techId => ({
+        technician_id: techId,
+        ...pendingDelta(techId)
+    }));
+
+    if (updates.length === 0) {
+        showNotification('No changes to save', 'error');
+        return;
+    }
+
+    if (!confirm(`Save changes for ${updates.length} technician(s)?`)) {
+        return;
+    }
+
+    showLoading(true);
+
+    try {
+        const response = await fetch('/api/tools/site-matrix/bulk-update', {
+            method: 'PUT',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({updates})
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            const results = data.results;
+            showNotification(
+                `Saved ${results.success.length} of ${results.total} technicians`,
+                results.failed.length > 0 ? 'error' : 'success'
+            );
+
+            // Update original state for successful saves
+            results.success.forEach(item => {
+                commitChanges(item.technician_id, item.site_count);
+            });
+
+            updateModifiedCount();
+            scheduleRender();
+            loadPlans();
+        } else {
+            showNotification('Failed to save changes', 'error');
+        }
+    } catch (error) {
+        showNotification('Error: ' + error.message, 'error');
+    } finally {
+        showLoading(false);
+    }
+}
+
+// Cancel all changes
+function cancelAllChanges() {
+    if (!confirm('Cancel all pending changes?')) {
+        return;
+    }
+
+    matrixData.modifiedState = {};
+    updateModifiedCount();
+    if (matrixData.filters.modifiedOnly) {
+        loadMatrixData();
+    } else {
+        scheduleRender();
+    }
+    showNotification('Changes canceled', 'success');
+}
+
+// Bulk plans (durable change sets that can be resumed or rolled back)
+async function loadPlans() {
+    const list = document.getElementById('plansList');
+
+    try {
+        const response = await fetch('/api/tools/site-matrix/plans');
+        const data = await response.json();
+
+        if (!data.success || data.plans.length === 0) {
+            list.innerHTML = 'No bulk plans yet';
+            return;
+        }
+
+        list.innerHTML = data.plans.map(plan => {
+            const counts = plan.counts;
+            const unfinished = counts.pending + counts.failed > 0;
+            return `
+                <div class="plan-row">
+                    <span>
+                        <strong>#${plan.id}</strong> ${escapeHtml(plan.description || plan.kind)} —
+                        ${escapeHtml(plan.status)} (${counts.done} done, ${counts.pending} pending,
+                        ${counts.failed} failed, ${counts.skipped} skipped) • ${escapeHtml(plan.created_at)}
+                    </span>
+                    <span>
+                        ${unfinished ? `<button class="btn-small" data-plan-resume="${plan.id}">Resume</button>` : ''}
+                        ${counts.done > 0 ? `<button class="btn-small" data-plan-rollback="${plan.id}">Rollback</button>` : ''}
+                    </span>
+                </div>
+            `;
+        }).join('');
+    } catch (error) {
+        list.innerHTML = `Error loading plans: ${escapeHtml(error.message)}`;
+    }
+}
+
+async function planAction(planId, action) {
+    const prompt = action === 'resume'
+        ? `Resume plan #${planId} (including failed items)?`
+        : `Roll back every applied change of plan #${planId}?`;
+    if (!confirm(prompt)) return;
+
+    showLoading(true);
+
+    try {
+        const response = await fetch(`/api/tools/site-matrix/plans/${planId}/${action}`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(action === 'resume' ? {retry_failed: true} : {})
+        });
+        const data = await response.json();
+
+        if (data.success) {
+            const results = data.results;
+            showNotification(
+                `Plan #${data.plan.id}: ${results.success.length} of ${results.total} applied`,
+                results.failed.length > 0 ? 'error' : 'success'
+            );
+            loadMatrixData();
+        } else {
+            showNotification(data.error || 'Plan action failed', 'error');
+        }
+    } catch (error) {
+        showNotification('Error: ' + error.message, 'error');
+    } finally {
+        showLoading(false);
+        loadPlans();
+    }
+}
+
+document.getElementById('plansList').addEventListener('click', (e) => {
+    const resume = e.target.closest('[data-plan-resume]');
+    const rollback = e.target.closest('[data-plan-rollback]');
+    if (resume) planAction(resume.dataset.planResume, 'resume');
+    if (rollback) planAction(rollback.dataset.planRollback, 'rollback');
+});
+
+document.getElementById('plansPanel').addEventListener('toggle', (e) => {
+    if (e.target.open) loadPlans();
+});
+
+// Rule-based mass assignment (add/remove sites for every matching technician)
+async function loadRuleSites() {
+    const data = await fetchJsonCached('/api/tools/site-matrix/data?row_limit=0&col_limit=' + RULE_SITE_LIMIT);
+    if (!data.success) throw new Error(data.error || 'Failed to load sites');
+
+    const options = data.site_ids.map((siteId, j) =>
+        `<option value="${escapeHtml(siteId)}">${escapeHtml(data.sites[j].name)}</option>`
+    ).join('');
+
+    document.getElementById('ruleSites').innerHTML = options;
+    document.getElementById('ruleMemberOf').innerHTML =
+        '<option value="">that are in any site</option>' + options;
+    document.getElementById('ruleNotMemberOf').innerHTML =
+        '<option value="">and not excluded by site</option>' + options;
+}
+
+function ruleBody() {
+    const siteIds = Array.from(document.getElementById('ruleSites').selectedOptions, option => option.value);
+    const memberOf = document.getElementById('ruleMemberOf').value;
+    const notMemberOf = document.getElementById('ruleNotMemberOf').value;
+
+    return {
+        action: document.getElementById('ruleAction').value,
+        site_ids: siteIds,
+        filter: {
+            search: matrixData.filters.search,
+            department: matrixData.filters.department,
+            status: matrixData.filters.status,
+            member_of: memberOf ? [memberOf] : null,
+            not_member_of: notMemberOf ? [notMemberOf] : null
+        }
+    };
+}
+
+async function previewRule() {
+    const preview = document.getElementById('rulePreview');
+
+    try {
+        const response = await fetch('/api/tools/site-matrix/rules/preview', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(ruleBody())
+        });
+        const data = await response.json();
+
+        if (!data.success) {
+            preview.innerHTML = escapeHtml(data.error || 'Preview failed');
+            return null;
+        }
+
+        const names = data.sample.map(tech => escapeHtml(tech.name)).join(', ');
+        preview.innerHTML = `
+            <strong>${escapeHtml(data.description)}</strong><br>
+            ${data.matched} technicians match, ${data.affected} will change, ${data.unchanged} already up to date
+            ${names ? `<br>${names}${data.affected > data.sample.length ? ', …' : ''}` : ''}
+        `;
+        return data;
+    } catch (error) {
+        preview.innerHTML = `Error: ${escapeHtml(error.message)}`;
+        return null;
+    }
+}
+
+async function applyRule() {
+    const preview = await previewRule();
+    if (!preview) return;
+    if (preview.affected === 0) {
+        showNotification('No technicians need a change', 'success');
+        return;
+    }
+    if (!confirm(`${preview.description}\n\nUpdate ${preview.affected} technicians?`)) return;
+
+    showLoading(true);
+
+    try {
+        const response = await fetch('/api/tools/site-matrix/rules/apply', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(ruleBody())
+        });
+        const data = await response.json();
+
+        if (data.success) {
+            const results = data.results;
+            showNotification(
+                `Plan #${data.plan_id}: ${results.success.length} of ${results.total} technicians updated`,
+                results.failed.length > 0 ? 'error' : 'success'
+            );
+            loadMatrixData();
+            loadPlans();
+            previewRule();
+        } else {
+            showNotification(data.error || 'Rule failed', 'error');
+        }
+    } catch (error) {
+        showNotification('Error: ' + error.message, 'error');
+    } finally {
+        showLoading(false);
+    }
+}
+
+document.getElementById('rulePanel').addEventListener('toggle', (e) => {
+    if (e.target.open && !document.getElementById('ruleSites').options.length) {
+        loadRuleSites().catch(error => showNotification('Error: ' + error.message, 'error'));
+    }
+});
+document.getElementById('rulePreviewBtn').addEventListener('click', previewRule);
+document.getElementById('ruleApplyBtn').addEventListener('click', applyRule);
+
+// Search functionality (server-side, debounced)
+let searchTimer = null;
+function debounced(callback) {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(callback, 300);
+}
+
+document.getElementById('searchBox').addEventListener('input', (e) => {
+    debounced(() => {
+        matrixData.filters.search = e.target.value.trim();
+        loadMatrixData();
+    });
+});
+
+document.getElementById('siteSearchBox').addEventListener('input', (e) => {
+    debounced(() => {
+        matrixData.filters.siteSearch = e.target.value.trim();
+        loadMatrixData();
+    });
+});
+
+document.getElementById('departmentFilter').addEventListener('change', (e) => {
+    matrixData.filters.department = e.target.value;
+    loadMatrixData();
+});
+
+// Filter functionality
+document.querySelectorAll('.filter-btn').forEach(btn => {
+    btn.addEventListener('click', () => {
+        document.querySelectorAll('.filter-btn').forEach(b => b.classList.remove('active'));
+        btn.classList.add('active');
+
+        const filter = btn.dataset.filter;
+        matrixData.filters.status = filter === 'active' ? 'ACTIVE' : '';
+        matrixData.filters.modifiedOnly = filter === 'modified';
+        loadMatrixData();
+    });
+});
+
+// Cell and row events (delegated, rows are re-rendered on scroll)
+document.getElementById('tableBody').addEventListener('change', (e) => {
+    const checkbox = e.target;
+    if (!checkbox.dataset.siteId) return;
+
+    const techId = checkbox.closest('tr').dataset.techId;
+    handleCheckboxChange(techId, checkbox.dataset.siteId,
+                         parseInt(checkbox.dataset.row), parseInt(checkbox.dataset.col), checkbox.checked);
+});
+
+document.getElementById('tableBody').addEventListener('click', (e) => {
+    const button = e.target.closest('[data-save]');
+    if (button) {
+        saveRow(button.dataset.save);
+    }
+});
+
+// Live updates pushed by the server (saves from other tabs or admins)
+function applyRemoteUpdate(techId, siteIds) {
+    const assigned = new Set(siteIds.map(String));
+    const rowIndex = matrixData.rowIndexById[techId];
+    const tech = matrixData.technicianInfo[techId];
+    if (tech) tech.site_count = siteIds.length;
+
+    if (rowIndex !== undefined) {
+        matrixData.cols.forEach((site, colIndex) => {
+            const block = matrixData.blocks[blockKey(rowIndex, colIndex)];
+            if (block) {
+                setBit(block[rowIndex % ROW_BLOCK], colIndex % COL_BLOCK, assigned.has(String(site.id)));
+            }
+        });
+    }
+
+    // Local edits the remote change already made are no longer pending
+    const changes = matrixData.modifiedState[techId];
+    if (changes) {
+        Object.keys(changes).forEach(siteId => {
+            if (changes[siteId] === assigned.has(siteId)) delete changes[siteId];
+        });
+        if (Object.keys(changes).length === 0) delete matrixData.modifiedState[techId];
+        updateModifiedCount();
+    }
+
+    scheduleRender();
+}
+
+// Refetch the loaded slices in place (keeps scroll position and local edits)
+function reloadBlocks() {
+    matrixData.generation++;
+    matrixData.blocks = {};
+    matrixData.pending = {};
+    scheduleRender();
+}
+
+function subscribeMatrixEvents() {
+    if (!window.EventSource) return;
+
+    const events = new EventSource('/api/tools/site-matrix/events');
+    events.addEventListener('technician', (e) => {
+        const event = JSON.parse(e.data);
+        applyRemoteUpdate(event.technician_id, event.site_ids);
+    });
+    events.addEventListener('reload', () => {
+        reloadBlocks();
+        showNotification('Matrix updated from ServiceDesk Plus', 'success');
+    });
+    events.addEventListener('reset', reloadBlocks);
+}
+
+// Event listeners
+document.getElementById('matrixWrapper').addEventListener('scroll', scheduleRender);
+window.addEventListener('resize', scheduleRender);
+document.getElementById('refreshBtn').addEventListener('click', () => loadMatrixData(true));
+document.getElementById('saveAllBtn').addEventListener('click', saveAllChanges);
+document.getElementById('saveAllChanges').addEventListener('click', saveAllChanges);
+document.getElementById('cancelAllChanges').addEventListener('click', cancelAllChanges);
+
+// Utility functions
+function showLoading(show) {
+    document.getElementById('loadingOverlay').classList.toggle('active', show);
+}
+
+function showNotification(message, type = 'success') {
+    const notification = document.getElementById('notification');
+    notification.textContent = message;
+    notification.className = `notification ${type}`;
+    notification.classList.add('show');
+
+    setTimeout(() => {
+        notification.classList.remove('show');
+    }, 3000);
+}
+
+// Initialize
+loadMatrixData();
+subscribeMatrixEvents();
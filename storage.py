@@ -0,0 +1,136 @@
+"""
+Database engines
+The main database keeps auth and user data (users, credentials, saved
+queries, preferences). High-volume history/audit tables are bound to
+HISTORY_BIND, a separate database, so their writes never wait for (or
+hold) the main file's write lock. Each SQLite engine gets its own pragmas
+from SQLITE_PRAGMAS.
+"""
+import os
+
+from sqlalchemy import event, inspect, select, text, update
+
+from models import db, RequestHistory
+from history_blobs import add_bodies, body_hash, vacuum
+from config import HISTORY_BIND, SQLITE_PRAGMAS, HISTORY_MIGRATION_BATCH
+
+# History-bind tables that may still exist in the main database. Their
+# content is derived from SDP traffic (scheduler snapshots, field catalog)
+# and rebuilds itself, so old copies are dropped rather than moved.
+DERIVED_TABLES = ('query_snapshots', 'catalog_fields', 'field_catalogs')
+
+
+def _pragma_listener(pragmas):
+    """Engine connect hook applying SQLite pragmas"""
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return set_pragmas
+
+
+def upgrade_history_schema():
+    """
+    Bring history tables created by older versions up to date: add
+    request_history.response_hash, drop history_blobs.refs (reference
+    counts are no longer kept)
+    """
+    history = db.engines[HISTORY_BIND]
+    if history.dialect.name == 'sqlite' and not os.path.exists(history.url.database or ''):
+        return  # not created yet (and inspecting would create an empty file)
+    tables = inspect(history).get_table_names()
+    if 'request_history' in tables:
+        present = {column['name'] for column in inspect(history).get_columns('request_history')}
+        if 'response_hash' not in present:
+            with history.begin() as conn:
+                conn.execute(text('ALTER TABLE request_history ADD COLUMN response_hash VARCHAR(64)'))
+                conn.execute(text('CREATE INDEX IF NOT EXISTS ix_request_history_response_hash '
+                                  'ON request_history (response_hash)'))
+    if 'history_blobs' in tables:
+        present = {column['name'] for column in inspect(history).get_columns('history_blobs')}
+        if 'refs' in present:
+            with history.begin() as conn:
+                conn.execute(text('ALTER TABLE history_blobs DROP COLUMN refs'))
+
+
+def init_storage(app):
+    """Register each bind's SQLite pragmas on its engine and bring old history tables up to date"""
+    with app.app_context():
+        for bind_key, pragmas in SQLITE_PRAGMAS.items():
+            engine = db.engines.get(bind_key)
+            if engine is not None and engine.dialect.name == 'sqlite' and pragmas:
+                event.listen(engine, 'connect', _pragma_listener(pragmas))
+        upgrade_history_schema()
+
+
+def migrate_history():
+    """
+    Move request_history rows left in the main database (written before the
+    history bind existed) into the history database, then drop the old
+    table and the old copies of DERIVED_TABLES
+
+    Rows get new IDs in the history database; /api/history orders by
+    timestamp. Nothing is dropped unless the copy committed.
+
+    Returns:
+        number of rows moved
+    """
+    main = db.engines[None]
+    history = db.engines[HISTORY_BIND]
+    if main.url == history.url:
+        return 0
+
+    existing = inspect(main).get_table_names()
+    with main.begin() as conn:
+        for name in DERIVED_TABLES:
+            if name in existing:
+                conn.execute(text(f'DROP TABLE {name}'))
+    if 'request_history' not in existing:
+        return 0
+
+    table = RequestHistory.__table__
+    present = {column['name'] for column in inspect(main).get_columns('request_history')}
+    columns = [column for column in table.columns if column.name != 'id' and column.name in present]
+    moved = 0
+    with main.connect() as source, history.begin() as target:
+        result = source.execute(select(*columns).order_by(table.c.id))
+        for rows in result.partitions(HISTORY_MIGRATION_BATCH):
+            target.execute(table.insert(), [dict(row._mapping) for row in rows])
+            moved += len(rows)
+
+    with main.begin() as conn:
+        conn.execute(text('DROP TABLE request_history'))
+    return moved
+
+
+def migrate_history_blobs():
+    """
+    Move response bodies stored on request_history rows (written before
+    history_blobs existed) into the blob store; the file is vacuumed after
+    a move so the space comes back
+
+    Returns:
+        number of rows moved
+    """
+    upgrade_history_schema()
+    moved = 0
+    while True:
+        rows = db.session.execute(
+            select(RequestHistory.id, RequestHistory.response)
+            .where(RequestHistory.response.isnot(None), RequestHistory.response_hash.is_(None))
+            .limit(HISTORY_MIGRATION_BATCH)
+        ).all()
+        if not rows:
+            break
+        hashes = {row.id: body_hash(row.response) for row in rows}
+        add_bodies({hashes[row.id]: row.response for row in rows})
+        for row_id, digest in hashes.items():
+            db.session.execute(update(RequestHistory).where(RequestHistory.id == row_id)
+                               .values(response_hash=digest, response=None))
+        db.session.commit()
+        moved += len(rows)
+
+    if moved:
+        vacuum()
+    return moved
@@ -3,11 +3,12 @@ Test script for ME SDP Accounts API endpoints
 
 This script helps you test the accounts endpoints and see example requests/responses.
 Run this after logging into the SDP Explorer web interface.
+For timings of the same calls, run: python sdp_probe.py --scenario accounts
 """
 
 import requests
 import json
-from config import API_BASE_URL, API_KEY
+from config import API_BASE_URL, API_KEY, UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_CALL_TIMEOUT
 
 # Disable SSL warnings
 import urllib3
@@ -17,6 +18,7 @@ def api_call(method, endpoint, data=None):
     """Make API call to ME SDP"""
     url = f"{API_BASE_URL}{endpoint}"
     headers = {"authtoken": API_KEY}
+    timeout = (UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_CALL_TIMEOUT)
 
     print(f"\n{'='*60}")
     print(f"{method} {endpoint}")
@@ -24,13 +26,13 @@ def api_call(method, endpoint, data=None):
 
     try:
         if method == "GET":
-            response = requests.get(url, headers=headers, params=data, verify=False)
+            response = requests.get(url, headers=headers, params=data, verify=False, timeout=timeout)
         elif method == "POST":
-            response = requests.post(url, headers=headers, data=data, verify=False)
+            response = requests.post(url, headers=headers, data=data, verify=False, timeout=timeout)
         elif method == "PUT":
-            response = requests.put(url, headers=headers, data=data, verify=False)
+            response = requests.put(url, headers=headers, data=data, verify=False, timeout=timeout)
         elif method == "DELETE":
-            response = requests.delete(url, headers=headers, verify=False)
+            response = requests.delete(url, headers=headers, verify=False, timeout=timeout)
 
         print(f"Status Code: {response.status_code}")
 
@@ -0,0 +1,243 @@
+"""
+Deadlines and circuit breaking for SDP calls
+Every app request gets a deadline budget (ROUTE_DEADLINES, by view name)
+that caps the timeout of each upstream call it makes. Each portal has a
+circuit breaker: after CIRCUIT_FAILURE_THRESHOLD consecutive failures
+(errors, timeouts, 5xx) calls fail fast for CIRCUIT_RESET_TIMEOUT seconds,
+then one trial call decides whether it closes again. GET results are kept
+so a failing or open portal can still be answered with stale data.
+Calls to a portal can also be held to UPSTREAM_RATE_LIMIT per window,
+counted across workers.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+import requests
+from flask import g, has_request_context, request
+
+import cassette
+from shared_state import backend, rate_limit_wait
+from config import (UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_CALL_TIMEOUT, ROUTE_DEADLINE_DEFAULT, ROUTE_DEADLINES,
+                    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, STALE_CACHE_TTL, STALE_CACHE_MAX_BYTES,
+                    UPSTREAM_RATE_LIMIT, UPSTREAM_RATE_WINDOW)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream call was not attempted (circuit open or deadline spent)"""
+
+
+# Deadlines
+
+def start_deadline():
+    """before_request hook: start the current route's deadline budget"""
+    g.upstream_deadline = time.monotonic() + ROUTE_DEADLINES.get(request.endpoint, ROUTE_DEADLINE_DEFAULT)
+
+
+def remaining_budget():
+    """Seconds left for upstream calls in this request (None outside a request)"""
+    if not has_request_context() or 'upstream_deadline' not in g:
+        return None
+    return g.upstream_deadline - time.monotonic()
+
+
+def call_timeout():
+    """
+    Timeout for the next upstream call: UPSTREAM_CALL_TIMEOUT capped by
+    what is left of the route's budget
+
+    aiohttp applies it to the whole call. For requests it is the connect
+    and per-read timeout only; api_call streams the body and holds it to
+    the remaining budget in spool_if_oversized.
+
+    Raises:
+        UpstreamUnavailable if the budget is already spent
+    """
+    remaining = remaining_budget()
+    if remaining is None:
+        return UPSTREAM_CALL_TIMEOUT
+    if remaining <= 0:
+        raise UpstreamUnavailable('Request deadline exceeded before the SDP call could start')
+    return min(UPSTREAM_CALL_TIMEOUT, remaining)
+
+
+# Circuit breakers
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one portal"""
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Reserve a call
+
+        Raises:
+            UpstreamUnavailable while open (or while a half-open trial is running)
+        """
+        with self._lock:
+            if self.state == OPEN:
+                wait = CIRCUIT_RESET_TIMEOUT - (time.monotonic() - self.opened_at)
+                if wait > 0:
+                    raise UpstreamUnavailable(
+                        f"SDP portal {self.name} is unavailable after repeated failures "
+                        f"(retrying in {int(wait) + 1}s)"
+                    )
+                self.state = HALF_OPEN
+                self.trial_running = False
+
+            if self.state == HALF_OPEN:
+                if self.trial_running:
+                    raise UpstreamUnavailable(f"SDP portal {self.name} is being re-checked, try again shortly")
+                self.trial_running = True
+
+    def record(self, ok):
+        """Record the outcome of a reserved call"""
+        with self._lock:
+            if ok:
+                self.state = CLOSED
+                self.failures = 0
+            else:
+                self.failures += 1
+                if self.state == HALF_OPEN or self.failures >= CIRCUIT_FAILURE_THRESHOLD:
+                    self.state = OPEN
+                    self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def status(self):
+        """Serializable state"""
+        with self._lock:
+            return {'portal': self.name, 'state': self.state, 'failures': self.failures}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(api_base_url):
+    """Circuit breaker of a portal (created on first use)"""
+    with _breakers_lock:
+        if api_base_url not in _breakers:
+            _breakers[api_base_url] = CircuitBreaker(api_base_url)
+        return _breakers[api_base_url]
+
+
+def breaker_states():
+    """State of every portal's breaker"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker.status() for breaker in breakers]
+
+
+def is_failure(status_code):
+    """Whether a response means the portal itself is in trouble"""
+    return status_code >= 500
+
+
+# Rate limit
+
+def throttle_wait(api_base_url):
+    """
+    Seconds to wait before the next call to a portal fits its rate limit
+    (0: go ahead, the call has been counted)
+
+    Raises:
+        UpstreamUnavailable if the wait would outlast the route's deadline
+    """
+    if not UPSTREAM_RATE_LIMIT:
+        return 0
+    wait = rate_limit_wait(f"upstream:{api_base_url}", UPSTREAM_RATE_LIMIT, UPSTREAM_RATE_WINDOW)
+    remaining = remaining_budget()
+    if wait and remaining is not None and wait >= remaining:
+        raise UpstreamUnavailable(f"SDP portal {api_base_url} rate limit reached (next slot in {int(wait) + 1}s)")
+    return wait
+
+
+def throttle(api_base_url):
+    """Block until the portal's rate limit lets one more call through"""
+    while True:
+        wait = throttle_wait(api_base_url)
+        if not wait:
+            return
+        time.sleep(wait)
+
+
+async def async_throttle(api_base_url):
+    """throttle() for coroutines"""
+    while True:
+        wait = throttle_wait(api_base_url)
+        if not wait:
+            return
+        await asyncio.sleep(wait)
+
+
+# Stale GET results (kept in the shared state backend)
+
+def _stale_key(key):
+    """Shared state key of a stale result"""
+    return 'stale:' + hashlib.sha1(json.dumps(key, default=str).encode()).hexdigest()
+
+
+def remember_result(key, result):
+    """Keep a successful GET result for stale fallback (size capped)"""
+    if len(result.get('raw') or '') > STALE_CACHE_MAX_BYTES:
+        return
+    backend().set(_stale_key(key), (time.time(), result), ttl=STALE_CACHE_TTL)
+
+
+def stale_result(key, error):
+    """Last known result for `key` marked as stale, or None"""
+    entry = backend().get(_stale_key(key))
+    if not entry:
+        return None
+    stored_at, result = entry
+    return {**result, 'stale': True, 'stale_age': int(time.time() - stored_at), 'upstream_error': error}
+
+
+# Guarded synchronous calls
+
+def guarded_request(method, url, api_base_url, **kwargs):
+    """
+    requests.request() under the portal's breaker and the route's deadline
+    (or from the cassette, see SDP_TRANSPORT)
+
+    Raises:
+        UpstreamUnavailable when the call is not attempted,
+        CassetteMiss when playback has no recording for it,
+        requests exceptions when it fails (already recorded on the breaker)
+    """
+    if cassette.playing():
+        return cassette.play_response(method, url, kwargs.get('params'), kwargs.get('data'))
+
+    breaker = breaker_for(api_base_url)
+    throttle(api_base_url)
+    timeout = call_timeout()
+    breaker.before_call()
+    try:
+        response = requests.request(method, url, timeout=(min(UPSTREAM_CONNECT_TIMEOUT, timeout), timeout),
+                                    verify=False, **kwargs)
+    except Exception:
+        breaker.record(False)
+        raise
+    breaker.record(not is_failure(response.status_code))
+    if cassette.recording():
+        cassette.record(method, url, kwargs.get('params'), kwargs.get('data'), response.status_code,
+                        response.content)
+    return response
+
+
+def init_upstream_guard(app):
+    """Register the deadline hook"""
+    app.before_request(start_deadline)
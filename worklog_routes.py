@@ -0,0 +1,54 @@
+"""
+Routes for bulk worklog summaries
+Totals /requests/{id}/worklogs/summary over every request matching a
+filter or a saved /requests query (worklog_summary)
+"""
+import json
+
+from flask import jsonify, request
+from flask_login import login_required, current_user
+from app import app, get_user_api_config, new_log_entry, record_history
+from models import SavedQuery
+from sdp_client import PortalCredential
+from worklog_summary import summarize_worklogs
+from config import ENDPOINTS, WORKLOG_SUMMARY_MAX_REQUESTS
+
+
+@app.route('/api/worklogs/summary', methods=['POST'])
+@login_required
+def bulk_worklog_summary():
+    """
+    Worklog totals across many requests, grouped by technician and site
+
+    Body: {list_info?: {search_criteria, ...}, max_requests?} or
+          {query_id, max_requests?} to use a saved GET /requests query's filter
+    """
+    data = request.json or {}
+    list_info = data.get('list_info') or {}
+
+    if data.get('query_id'):
+        query = SavedQuery.query.filter_by(id=data['query_id'], user_id=current_user.id).first()
+        if not query:
+            return jsonify({'success': False, 'error': 'Query not found'}), 404
+        if query.method != 'GET' or query.endpoint != ENDPOINTS['Requests']['list']:
+            return jsonify({'success': False, 'error': 'Saved query must be a GET /requests list'}), 400
+        list_info = (json.loads(query.input_data) if query.input_data else {}).get('list_info') or {}
+
+    if not isinstance(list_info, dict):
+        return jsonify({'success': False, 'error': 'list_info must be an object'}), 400
+
+    max_requests = min(data.get('max_requests') or WORKLOG_SUMMARY_MAX_REQUESTS, WORKLOG_SUMMARY_MAX_REQUESTS)
+    api_base_url, api_key = get_user_api_config()
+    result = summarize_worklogs(PortalCredential(api_key, api_base_url), list_info, max_requests)
+
+    # History keeps a summary of the fan-out, not every per-request call
+    log_entry = new_log_entry('GET', f"{api_base_url}{ENDPOINTS['Worklogs']['request_summary']}",
+                              data={'list_info': list_info})
+    if result['success']:
+        log_entry['status_code'] = 200
+        log_entry['response'] = json.dumps({key: result[key] for key in ('requests', 'cached', 'fetched')})
+    else:
+        log_entry['error'] = result['error']
+    record_history(log_entry)
+
+    return jsonify(result), (200 if result['success'] else 502)
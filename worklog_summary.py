@@ -0,0 +1,245 @@
+"""
+Worklog summaries across many requests
+Fans out over /requests/{id}/worklogs/summary for every request matching
+a filter, caching each summary until the request changes, and totals the
+results by technician and site
+"""
+import re
+
+from sdp_client import (run_async, client_session, async_api_call_with_credential, gather_bounded,
+                        fetch_all_pages, credential_key)
+from shared_state import backend
+from config import ENDPOINTS, WORKLOG_SUMMARY_TTL, WORKLOG_SUMMARY_MAX_REQUESTS
+
+REQUEST_PATH = re.compile(r'^/requests/(\d+)(/|$)')
+
+
+# Per-request summary cache (shared state):
+# worklogs:<credential key>:<generation>:<request ID> -> (last_updated_time, totals)
+# Bumping a credential's generation drops all of its summaries at once.
+
+def _summary_prefix(credential):
+    """Shared state key prefix of a credential's current summaries"""
+    key = credential_key(credential)
+    generation = backend().get(f"worklogs:{key}:generation") or 0
+    return f"worklogs:{key}:{generation}:"
+
+
+def _summary_key(credential, request_id):
+    """Shared state key of a request's cached summary"""
+    return f"{_summary_prefix(credential)}{request_id}"
+
+
+def get_cached_summaries(credential, requests):
+    """
+    Cached totals of several requests, in one backend round trip
+
+    Args:
+        requests: [(request ID, last_updated_time)]
+    Returns:
+        {request ID: totals} for requests cached as of their last_updated_time
+    """
+    prefix = _summary_prefix(credential)
+    entries = backend().get_many([f"{prefix}{request_id}" for request_id, _ in requests])
+    return {
+        str(request_id): entry[1]
+        for (request_id, last_updated_time), entry in zip(requests, entries)
+        if entry and entry[0] == last_updated_time
+    }
+
+
+def store_summary(credential, request_id, last_updated_time, totals):
+    """Cache the totals of a request as of its last_updated_time"""
+    backend().set(_summary_key(credential, request_id), (last_updated_time, totals), ttl=WORKLOG_SUMMARY_TTL)
+
+
+def invalidate_summary(credential, request_id=None):
+    """Drop one request's cached summary, or every summary of the credential"""
+    if request_id is not None:
+        backend().delete(_summary_key(credential, request_id))
+    else:
+        backend().incr(f"worklogs:{credential_key(credential)}:generation")
+
+
+def invalidate_for_call(credential, method, endpoint):
+    """Invalidate the summary of a request changed by a write call (PUT/POST/DELETE under /requests/{id})"""
+    if method.upper() == 'GET':
+        return
+    match = REQUEST_PATH.match(endpoint)
+    if match:
+        invalidate_summary(credential, match.group(1))
+
+
+def _number(value):
+    """Numeric value of an SDP field (plain, numeric string or {"value": ...}), else None"""
+    if isinstance(value, dict):
+        value = value.get('value')
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value) if '.' in value else int(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _numeric_fields(data):
+    """{field: number} for the numeric fields of an object"""
+    totals = {}
+    for key, value in data.items():
+        number = _number(value)
+        if number is not None and key != 'id':
+            totals[key] = number
+    return totals
+
+
+def _owner_name(entry):
+    """Technician an entry of a per-technician breakdown belongs to"""
+    for key in ('technician', 'owner', 'created_by'):
+        owner = entry.get(key)
+        if isinstance(owner, dict):
+            return owner.get('name') or owner.get('email_id')
+        if isinstance(owner, str):
+            return owner
+    return None
+
+
+def summary_totals(data):
+    """
+    Reduce a worklog summary response to numbers
+
+    Returns:
+        {'totals': {field: number}, 'by_technician': {name: {field: number}}}
+        by_technician is only filled when the summary breaks time down per
+        technician; otherwise the request's own technician gets the totals
+    """
+    summary = {}
+    for key, value in data.items():
+        if key != 'response_status' and isinstance(value, dict):
+            summary = value
+            break
+
+    by_technician = {}
+    for value in summary.values():
+        if isinstance(value, list):
+            for entry in value:
+                if isinstance(entry, dict) and _owner_name(entry):
+                    _add(by_technician.setdefault(_owner_name(entry), {}), _numeric_fields(entry))
+
+    return {'totals': _numeric_fields(summary), 'by_technician': by_technician}
+
+
+def _add(target, numbers):
+    """Add numbers into a running {field: total} dict"""
+    for key, value in numbers.items():
+        target[key] = target.get(key, 0) + value
+
+
+def _name(field):
+    """Name of an SDP reference field"""
+    return field.get('name') if isinstance(field, dict) else None
+
+
+def _updated(request_data):
+    """last_updated_time of a request list entry (ms), if present"""
+    return _number(request_data.get('last_updated_time'))
+
+
+async def _collect(credential, list_info, max_requests):
+    """
+    Matching requests, their cached summaries and fresh responses for the rest
+
+    Returns:
+        (listing, {request ID: cached totals}, {request ID: summary response})
+    """
+    async with client_session() as session:
+        listing = await fetch_all_pages(session, credential, ENDPOINTS['Requests']['list'], 'requests',
+                                        list_info=list_info, max_rows=max_requests)
+        if not listing['success']:
+            return listing, {}, {}
+
+        cached = get_cached_summaries(credential, [(entry['id'], _updated(entry)) for entry in listing['items']])
+        missing = [entry for entry in listing['items'] if str(entry['id']) not in cached]
+
+        responses = await gather_bounded(
+            async_api_call_with_credential(
+                session, credential, 'GET',
+                ENDPOINTS['Worklogs']['request_summary'].replace('{request_id}', str(entry['id']))
+            )
+            for entry in missing
+        )
+        return listing, cached, dict(zip((str(entry['id']) for entry in missing), responses))
+
+
+def _group_rows(groups):
+    """Sorted output rows for a {name: {'requests', 'totals'}} grouping"""
+    return sorted(
+        ({'name': name or '(none)', 'requests': group['requests'], 'totals': group['totals']}
+         for name, group in groups.items()),
+        key=lambda row: (-row['requests'], row['name'])
+    )
+
+
+def summarize_worklogs(credential, list_info=None, max_requests=WORKLOG_SUMMARY_MAX_REQUESTS):
+    """
+    Worklog totals for every request matching `list_info`
+
+    Returns:
+        {'success': True, 'requests', 'cached', 'fetched', 'truncated',
+         'totals', 'by_technician', 'by_site', 'failed': [{request_id, error}]}
+        or {'success': False, 'error'} if the request list can't be read
+    """
+    list_info = dict(list_info or {})
+    for key in ('row_count', 'start_index', 'get_total_count'):
+        list_info.pop(key, None)
+
+    listing, cached, responses = run_async(_collect(credential, list_info, max_requests))
+    if not listing['success']:
+        return {'success': False, 'error': listing['error']}
+
+    totals = {}
+    by_technician = {}
+    by_site = {}
+    failed = []
+
+    for entry in listing['items']:
+        request_id = str(entry['id'])
+        if request_id in responses:
+            response = responses[request_id]
+            if not response['success'] or response['status_code'] >= 400:
+                failed.append({
+                    'request_id': request_id,
+                    'error': response.get('error') or f"HTTP {response['status_code']}"
+                })
+                continue
+            summary = summary_totals(response['data'])
+            store_summary(credential, request_id, _updated(entry), summary)
+        else:
+            summary = cached[request_id]
+
+        _add(totals, summary['totals'])
+
+        site = by_site.setdefault(_name(entry.get('site')), {'requests': 0, 'totals': {}})
+        site['requests'] += 1
+        _add(site['totals'], summary['totals'])
+
+        technicians = summary['by_technician'] or {_name(entry.get('technician')): summary['totals']}
+        for name, numbers in technicians.items():
+            technician = by_technician.setdefault(name, {'requests': 0, 'totals': {}})
+            technician['requests'] += 1
+            _add(technician['totals'], numbers)
+
+    return {
+        'success': True,
+        'requests': len(listing['items']),
+        'cached': len(cached),
+        'fetched': len(responses) - len(failed),
+        'truncated': listing['total_count'] > len(listing['items']),
+        'totals': totals,
+        'by_technician': _group_rows(by_technician),
+        'by_site': _group_rows(by_site),
+        'failed': failed
+    }